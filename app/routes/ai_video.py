@@ -17,6 +17,7 @@ import pickle
 
 from ..utils.path import get_download_path, get_relative_path
 from ..services.storage import save_media_metadata
+from tasks.media_probe import probe_media
 
 # Configure logging
 logging.basicConfig(
@@ -284,8 +285,9 @@ def detect_faces():
             min_detection_confidence=0.6  # Confidence threshold to filter weak detections
         )
 
-        # Open the video
+        # Open the video; its frame rate comes from the cached probe
         cap = cv2.VideoCapture(video_path)
+        fps = probe_media(video_path).fps
 
         # Sample frames for face detection (every 15 frames for better tracking)
         faces_data = []
@@ -363,7 +365,7 @@ def detect_faces():
                     if frame_faces:
                         faces_data.append({
                             'frame': frame_count,
-                            'timestamp': frame_count / cap.get(cv2.CAP_PROP_FPS),
+                            'timestamp': frame_count / fps if fps > 0 else 0,
                             'faces': frame_faces
                         })
 
@@ -395,7 +397,7 @@ def detect_faces():
             (user_id, filename, 'ai_video', 'video', f"/static/processed/{filename}", '', json.dumps({
                 'faces_detected': len(unique_faces),
                 'frame_count': frame_count,
-                'duration': frame_count / cap.get(cv2.CAP_PROP_FPS) if cap.get(cv2.CAP_PROP_FPS) > 0 else 0,
+                'duration': frame_count / fps if fps > 0 else 0,
                 'thumbnails': generated_thumbnails  # Store thumbnail paths for future cleanup
             }), 'processing')
         )
@@ -428,7 +430,7 @@ def detect_faces():
             'metadata': {
                 'faces_detected': len(unique_faces),
                 'frame_count': frame_count,
-                'duration': frame_count / cap.get(cv2.CAP_PROP_FPS) if cap.get(cv2.CAP_PROP_FPS) > 0 else 0,
+                'duration': frame_count / fps if fps > 0 else 0,
                 'thumbnails': generated_thumbnails
             }
         }
@@ -510,11 +512,12 @@ def generate_highlight():
         output_filename = f"highlight_{video_id}_{face_id}_{int(time.time())}.mp4"
         output_path = os.path.join(PROCESSED_DIR, output_filename)
 
-        # Open the original video
+        # Open the original video; its properties come from the cached probe
+        media_info = probe_media(full_video_path)
         cap = cv2.VideoCapture(full_video_path)
-        fps = cap.get(cv2.CAP_PROP_FPS)
-        width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
-        height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+        fps = media_info.fps
+        width = media_info.width
+        height = media_info.height
 
         # Create temporary video file for frames
         temp_output = os.path.join(PROCESSED_DIR, f"temp_{output_filename}")
@@ -523,7 +526,7 @@ def generate_highlight():
 
         # Extract segments with the selected face - optimized approach
         frame_count = 0
-        total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+        total_frames = media_info.frame_count
         segment_length = int(fps * 3)  # 3 seconds before and after face appearance
 
         # Pre-compute all frames to include in the highlight
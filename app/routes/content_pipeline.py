@@ -28,7 +28,8 @@ sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__f
 
 # Import content pipeline components
 from content_pipeline.upload import upload_video, validate_video
-from content_pipeline.splitter import split_video
+from content_pipeline.splitter import split_video, plan_split
+from content_pipeline.splitter.splitter import SPLIT_MODES
 
 # Try to import text generator components
 try:
@@ -59,6 +60,39 @@ from app.auth import login_required
 # Create blueprint
 content_pipeline_bp = Blueprint('content_pipeline', __name__, url_prefix='/content-pipeline')
 
+def _form_float(form, name, default):
+    value = form.get(name, default)
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        raise ValueError(f"{name} must be a number, got {value!r}")
+
+def get_split_options(form):
+    """
+    Read the splitting parameters shared by the split and plan routes from a form.
+
+    Raises:
+        ValueError: If a parameter is out of range or not a number, with a message for the user
+    """
+    options = {
+        'max_clip_duration': _form_float(form, 'max_clip_duration', 60),
+        'min_clip_duration': _form_float(form, 'min_clip_duration', 5),
+        'split_on_silence': 'split_on_silence' in form,
+        'silence_threshold': _form_float(form, 'silence_threshold', 0.03),
+        'silence_duration': _form_float(form, 'silence_duration', 0.5),
+        'split_on_scenes': 'split_on_scenes' in form,
+        'mode': form.get('split_mode', 'encode')
+    }
+    if options['mode'] not in SPLIT_MODES:
+        raise ValueError(f"split_mode must be one of {', '.join(SPLIT_MODES)}, got {options['mode']!r}")
+    if not 0 < options['min_clip_duration'] <= options['max_clip_duration']:
+        raise ValueError("min_clip_duration must be positive and no longer than max_clip_duration")
+    if not 0 <= options['silence_threshold'] <= 1:
+        raise ValueError("silence_threshold must be between 0 and 1")
+    if not options['silence_duration'] > 0:
+        raise ValueError("silence_duration must be positive")
+    return options
+
 # Define routes
 @content_pipeline_bp.route('/', methods=['GET'])
 @login_required
@@ -145,17 +179,20 @@ def split():
         return redirect(url_for('content_pipeline.upload'))
 
     if request.method == 'POST':
+        # Get splitting parameters
         try:
-            # Get splitting parameters
-            max_clip_duration = float(request.form.get('max_clip_duration', 60))
-            min_clip_duration = float(request.form.get('min_clip_duration', 5))
-            split_on_silence = 'split_on_silence' in request.form
-            silence_threshold = float(request.form.get('silence_threshold', 0.03))
-            silence_duration = float(request.form.get('silence_duration', 0.5))
+            options = get_split_options(request.form)
+        except ValueError as e:
+            if request.headers.get('X-Requested-With') == 'XMLHttpRequest':
+                return jsonify({
+                    'success': False,
+                    'error': f'Invalid split parameters: {str(e)}'
+                }), 400
+            flash(f'Invalid split parameters: {str(e)}', 'error')
+            return redirect(request.url)
 
-            logger.info(f"Split parameters: max_duration={max_clip_duration}, min_duration={min_clip_duration}, "
-                       f"split_on_silence={split_on_silence}, threshold={silence_threshold}, "
-                       f"silence_duration={silence_duration}")
+        try:
+            logger.info(f"Split parameters: {options}")
 
             # Create output directory
             output_dir = Path(current_app.config['DOWNLOAD_FOLDER']) / 'clips' / user_id
@@ -165,11 +202,7 @@ def split():
             result = split_video(
                 video_path=video_path,
                 output_dir=str(output_dir),
-                max_clip_duration=max_clip_duration,
-                min_clip_duration=min_clip_duration,
-                split_on_silence=split_on_silence,
-                silence_threshold=silence_threshold,
-                silence_duration=silence_duration
+                **options
             )
 
             # Store the clips in the session
@@ -204,6 +237,34 @@ def split():
 
     return render_template('content_pipeline/split.html', video_path=video_path)
 
+@content_pipeline_bp.route('/split/plan', methods=['POST'])
+@login_required
+def split_plan():
+    """Preview where the uploaded video would be split, without writing any clips."""
+    video_path = session.get('uploaded_video_path')
+    if not video_path:
+        return jsonify({
+            'success': False,
+            'error': 'Please upload a video first'
+        }), 400
+    if not os.path.exists(video_path):
+        return jsonify({
+            'success': False,
+            'error': 'Video file not found'
+        }), 404
+
+    try:
+        options = get_split_options(request.form)
+    except ValueError as e:
+        return jsonify({
+            'success': False,
+            'error': f'Invalid split parameters: {str(e)}'
+        }), 400
+
+    result = plan_split(video_path=video_path, **options)
+
+    return jsonify(result), (200 if result["success"] else 500)
+
 @content_pipeline_bp.route('/generate-text', methods=['GET', 'POST'])
 @login_required
 def generate_text():
@@ -13,6 +13,8 @@ from pathlib import Path
 
 from ..utils.path import get_download_path, get_relative_path
 from ..services.storage import save_media_metadata
+from tasks.media_probe import probe_media
+from tasks.result_cache import get_file_hash
 
 # Configure logging
 logging.basicConfig(
@@ -393,10 +395,22 @@ def save_media_metadata(user_id, platform, media_type, file_path, title, origina
     try:
         # Get file size and dimensions if available
         file_size = os.path.getsize(file_path) if os.path.exists(file_path) else None
+
+        # Hash the content once at ingest; processing tasks reuse it for their result cache keys
+        if file_size is not None:
+            try:
+                metadata = dict(metadata or {}, content_hash=get_file_hash(file_path))
+            except Exception as e:
+                logger.error(f"Error hashing media file: {str(e)}")
         width = height = None
         if media_type == 'video':
-            # TODO: Add video dimension extraction
-            pass
+            try:
+                info = probe_media(file_path)
+                width, height = info.display_size
+                if duration is None:
+                    duration = int(round(info.duration))
+            except Exception as e:
+                logger.error(f"Error probing video: {str(e)}")
         elif media_type == 'image':
             try:
                 with Image.open(file_path) as img:
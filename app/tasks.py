@@ -1,6 +1,9 @@
 import logging
 from celery import shared_task
 from celery.utils.log import get_task_logger
+from typing import Dict, List, Optional, Union
+
+from tasks.image_watermark import DEFAULT_IMAGE_WORKERS, remove_image_watermarks
 
 logger = get_task_logger(__name__)
 file_handler = logging.FileHandler('logs/celery/tasks.log')
@@ -13,32 +16,52 @@ logger.addHandler(file_handler)
     retry_backoff=True,
     retry_kwargs={'max_retries': 3}
 )
-def process_watermark_removal(self, image_path: str) -> dict:
+def process_watermark_removal(self, image_paths: Union[str, List[str]],
+                              regions: Optional[List[Dict]] = None,
+                              platform: Optional[str] = None,
+                              output_dir: Optional[str] = None,
+                              workers: int = DEFAULT_IMAGE_WORKERS) -> dict:
     """
-    Sample task that simulates watermark removal processing.
-    
+    Remove watermarks from a batch of images.
+
+    Same-size images share their regions and inpainting masks; images are
+    decoded, inpainted and encoded on a thread pool, and EXIF data is kept.
+
     Args:
-        image_path (str): Path to the image file
-        
+        image_paths (Union[str, List[str]]): Path of one image, or a list of paths
+        regions (List[Dict], optional): Regions (x, y, width, height) shared by every image;
+            detected automatically per image size when omitted
+        platform (str, optional): Source platform, used to pick logo templates for detection
+        output_dir (str, optional): Directory for the processed images (defaults to next to each input)
+        workers (int): Threads used for decoding, inpainting and encoding
+
     Returns:
-        dict: Processing result with status and output path
+        dict: Processing result with status, per-image outputs, failures and batch throughput
     """
+    if isinstance(image_paths, str):
+        image_paths = [image_paths]
+
     try:
-        logger.info(f"Starting watermark removal for image: {image_path}")
-        
-        # Your watermark removal logic here
-        # This is just a placeholder
-        result = {
-            'status': 'success',
-            'input_path': image_path,
-            'output_path': image_path.replace('.jpg', '_processed.jpg')
+        logger.info(f"Starting watermark removal for {len(image_paths)} images")
+
+        result = remove_image_watermarks(
+            image_paths,
+            regions=regions,
+            platform=platform,
+            output_dir=output_dir,
+            workers=workers
+        )
+
+        throughput = result['throughput']
+        logger.info(f"Processed {throughput['images']} images in {throughput['seconds']}s "
+                    f"({throughput['images_per_second']} images/s), {len(result['failed'])} failed")
+        return {
+            'status': 'success' if result['images'] or not image_paths else 'error',
+            **result
         }
-        
-        logger.info(f"Successfully processed image: {image_path}")
-        return result
-        
+
     except Exception as e:
-        logger.error(f"Error processing image {image_path}: {str(e)}")
+        logger.error(f"Error processing image batch: {str(e)}")
         raise  # This will trigger the autoretry
 
 @shared_task
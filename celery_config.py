@@ -1,4 +1,5 @@
 from celery import Celery
+from celery.signals import worker_process_init
 from celery.schedules import crontab
 import os
 
@@ -77,6 +78,14 @@ def create_celery_app(app=None):
     celery.Task = ContextTask
     return celery
 
+@worker_process_init.connect
+def warm_up_models(**kwargs):
+    """Load the models listed in WARM_UP_MODELS (e.g. "blip") in each new worker process."""
+    names = [name.strip() for name in os.getenv('WARM_UP_MODELS', '').split(',') if name.strip()]
+    if names:
+        from content_pipeline.text_generator.model_registry import model_registry
+        model_registry.warm_up(*names)
+
 # Create default celery app
 app = create_celery_app()
 
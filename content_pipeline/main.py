@@ -9,18 +9,22 @@ This script ties together all the components of the pipeline:
 """
 
 import os
+import sys
 import json
 import logging
 import argparse
 from typing import Dict, List, Any, Optional
 from pathlib import Path
 
+# Add the repo root to the path; the splitter uses the shared tasks package
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
 from dotenv import load_dotenv
 from tqdm import tqdm
 
 # Import components
 from upload import upload_video, upload_from_url
-from splitter import split_video
+from splitter import split_video, plan_split, score_segments, select_top_clips
 from text_generator import process_clip
 from poster import post_to_platform, post_to_all_platforms
 
@@ -47,6 +51,8 @@ def process_video(
     split_on_silence: bool = False,
     silence_threshold: float = 0.03,
     silence_duration: float = 0.5,
+    top_k: Optional[int] = None,
+    score_weights: Optional[Dict[str, float]] = None,
     num_caption_variations: int = 3,
     num_hashtags: int = 10,
     post_to_platforms: bool = False,
@@ -65,6 +71,8 @@ def process_video(
         split_on_silence: Whether to split on silent sections
         silence_threshold: Threshold for silence detection (0.0 to 1.0)
         silence_duration: Minimum duration of silence to consider (in seconds)
+        top_k: Only encode and generate text for the top_k highest scoring clips (default: all clips)
+        score_weights: Weights of the clip scoring signals (see splitter.scoring.DEFAULT_SCORE_WEIGHTS)
         num_caption_variations: Number of caption variations to generate
         num_hashtags: Number of hashtags to generate
         post_to_platforms: Whether to post the clips to the platforms
@@ -103,16 +111,34 @@ def process_video(
     processed_video_path = upload_result["file_path"]
     logger.info(f"Video uploaded to: {processed_video_path}")
 
+    split_options = {
+        "max_clip_duration": max_clip_duration,
+        "min_clip_duration": min_clip_duration,
+        "split_on_silence": split_on_silence,
+        "silence_threshold": silence_threshold,
+        "silence_duration": silence_duration
+    }
+
+    # Score the planned clips so that only the best ones are encoded and captioned
+    clip_scores = {}
+    clip_indices = None
+    if top_k is not None:
+        logger.info(f"Scoring planned clips to keep the top {top_k}...")
+        plan = plan_split(video_path=processed_video_path, **split_options)
+        if plan["success"]:
+            scored = score_segments(processed_video_path, plan["clips"], weights=score_weights)
+            clip_scores = {clip["index"]: clip for clip in scored}
+            clip_indices = [clip["index"] for clip in select_top_clips(scored, top_k)]
+        else:
+            logger.error(f"Clip scoring failed, keeping all clips: {plan['error']}")
+
     # Step 2: Split the video
     logger.info("Step 2: Splitting video...")
     split_result = split_video(
         video_path=processed_video_path,
         output_dir=os.path.join(output_dir, "clips"),
-        max_clip_duration=max_clip_duration,
-        min_clip_duration=min_clip_duration,
-        split_on_silence=split_on_silence,
-        silence_threshold=silence_threshold,
-        silence_duration=silence_duration
+        clip_indices=clip_indices,
+        **split_options
     )
 
     if not split_result["success"]:
@@ -127,6 +153,10 @@ def process_video(
         }
 
     clips = split_result["clips"]
+    for clip in clips:
+        if clip["index"] in clip_scores:
+            clip["score"] = clip_scores[clip["index"]]["score"]
+            clip["signals"] = clip_scores[clip["index"]]["signals"]
     logger.info(f"Created {len(clips)} clips")
 
     # Step 3: Generate text for each clip
@@ -222,6 +252,7 @@ def main():
     parser.add_argument("--split-on-silence", action="store_true", help="Split on silent sections")
     parser.add_argument("--silence-threshold", type=float, default=0.03, help="Threshold for silence detection")
     parser.add_argument("--silence-duration", type=float, default=0.5, help="Minimum silence duration in seconds")
+    parser.add_argument("--top-k", type=int, help="Only keep the K highest scoring clips")
 
     # Text generation options
     parser.add_argument("--caption-variations", type=int, default=3, help="Number of caption variations to generate")
@@ -265,6 +296,7 @@ def main():
         split_on_silence=args.split_on_silence,
         silence_threshold=args.silence_threshold,
         silence_duration=args.silence_duration,
+        top_k=args.top_k,
         num_caption_variations=args.caption_variations,
         num_hashtags=args.hashtags,
         post_to_platforms=args.post
@@ -1,10 +1,11 @@
 """
 Splitter Module for Content Repurposing Pipeline.
 
-This module handles video splitting using MoviePy, automatically detecting
+This module handles video splitting using ffmpeg, automatically detecting
 logical splits based on duration thresholds or silent sections.
 """
 
-from .splitter import split_video, detect_silence, get_video_info
+from .splitter import split_video, detect_silence, get_video_info, plan_split
+from .scoring import score_segments, select_top_clips
 
-__all__ = ['split_video', 'detect_silence', 'get_video_info']
\ No newline at end of file
+__all__ = ['split_video', 'detect_silence', 'get_video_info', 'plan_split', 'score_segments', 'select_top_clips']
\ No newline at end of file
@@ -6,8 +6,13 @@ based on duration thresholds or silent sections.
 """
 
 import os
+import sys
 import json
 import logging
+
+# Add the repo root to the path; the splitter uses the shared tasks package
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
+
 from dotenv import load_dotenv
 from splitter import split_video, get_video_info
 
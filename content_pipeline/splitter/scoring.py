@@ -0,0 +1,162 @@
+"""
+Highlight scoring for planned clips.
+
+Ranks the segments of a split plan on cheap signals read from the same
+low-res analysis the splitter already persists per source: audio energy
+(the RMS envelope), scene-change density (the scene scores) and face
+presence (a 1 fps proxy). Only the best segments then need to be encoded
+and captioned.
+"""
+
+import logging
+import cv2
+import numpy as np
+from typing import Any, Dict, Iterable, List, Optional
+
+from tasks.media_probe import probe_media
+
+from .splitter import (DEFAULT_SCENE_THRESHOLD, ENVELOPE_RATE, SCENE_ANALYSIS_FPS, load_analysis,
+                       load_audio_envelope, load_scene_scores, read_proxy_frames)
+
+# Configure logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+# Define constants
+FACE_ANALYSIS_FPS = 1  # Proxy frames per second checked for faces
+FACE_ANALYSIS_SIZE = (320, 180)  # Proxy frame size (width, height)
+FACE_CASCADE_PATH = cv2.data.haarcascades + 'haarcascade_frontalface_default.xml'
+DEFAULT_SCORE_WEIGHTS = {
+    "audio_energy": 1.0,
+    "scene_density": 0.5,
+    "face_presence": 1.0
+}
+
+
+def compute_face_presence(batches: Iterable[np.ndarray]) -> np.ndarray:
+    """
+    Detect whether each proxy frame shows at least one face.
+
+    Args:
+        batches: Batches of RGB frames with shape (n, height, width, 3)
+
+    Returns:
+        1.0 for frames with a face and 0.0 otherwise, one value per frame
+    """
+    face_cascade = cv2.CascadeClassifier(FACE_CASCADE_PATH)
+    presence = []
+    for batch in batches:
+        for frame in batch:
+            gray = cv2.cvtColor(frame, cv2.COLOR_RGB2GRAY)
+            faces = face_cascade.detectMultiScale(gray, 1.2, 4, minSize=(16, 16))
+            presence.append(1.0 if len(faces) else 0.0)
+    return np.asarray(presence, dtype=np.float32)
+
+
+def load_face_presence(video_path: str, use_cache: bool = True) -> np.ndarray:
+    """
+    Get the per-second face presence of a video, computing it at most once per source.
+
+    Persisted in the analysis cache like the audio envelope and scene scores.
+
+    Args:
+        video_path: Path to the video file
+        use_cache: Whether to read and write the persisted values
+
+    Returns:
+        Face presence at FACE_ANALYSIS_FPS values per second (see compute_face_presence)
+    """
+    return load_analysis(
+        video_path,
+        "faces",
+        lambda: compute_face_presence(read_proxy_frames(video_path, fps=FACE_ANALYSIS_FPS, size=FACE_ANALYSIS_SIZE)),
+        use_cache
+    )
+
+
+def _segment_values(values: np.ndarray, rate: float, start_time: float, end_time: float) -> np.ndarray:
+    # Values of a per-frame signal that fall inside [start_time, end_time)
+    start = int(start_time * rate)
+    end = max(start + 1, int(np.ceil(end_time * rate)))
+    return np.asarray(values[start:end], dtype=np.float32)
+
+
+def score_segments(video_path: str,
+                   segments: List[Dict[str, Any]],
+                   weights: Optional[Dict[str, float]] = None,
+                   scene_threshold: float = DEFAULT_SCENE_THRESHOLD) -> List[Dict[str, Any]]:
+    """
+    Score planned clips on audio energy, scene-change density and face presence.
+
+    Each signal is scaled by its largest value over the segments, so the
+    score says how a clip compares to the rest of the same video. Signals
+    with a weight of 0 are not computed.
+
+    Args:
+        video_path: Path to the source video
+        segments: Clips with start_time and end_time, e.g. the clips of plan_split
+        weights: Weight of each signal (default: DEFAULT_SCORE_WEIGHTS)
+        scene_threshold: Histogram change (0.0 to 1.0) that counts as a scene cut
+
+    Returns:
+        Copies of the segments with added "signals" (raw values) and "score" (0.0 to 1.0)
+    """
+    weights = {**DEFAULT_SCORE_WEIGHTS, **(weights or {})}
+    signals = {name: np.zeros(len(segments), dtype=np.float64) for name in DEFAULT_SCORE_WEIGHTS}
+
+    if segments and weights["audio_energy"] > 0 and probe_media(video_path).has_audio:
+        envelope = load_audio_envelope(video_path)
+        for i, segment in enumerate(segments):
+            values = _segment_values(envelope, ENVELOPE_RATE, segment["start_time"], segment["end_time"])
+            signals["audio_energy"][i] = values.mean() if len(values) else 0.0
+
+    if segments and weights["scene_density"] > 0:
+        scene_scores = load_scene_scores(video_path)
+        for i, segment in enumerate(segments):
+            values = _segment_values(scene_scores, SCENE_ANALYSIS_FPS, segment["start_time"], segment["end_time"])
+            duration = max(segment["end_time"] - segment["start_time"], 1e-6)
+            signals["scene_density"][i] = np.count_nonzero(values >= scene_threshold) / duration
+
+    if segments and weights["face_presence"] > 0:
+        presence = load_face_presence(video_path)
+        for i, segment in enumerate(segments):
+            values = _segment_values(presence, FACE_ANALYSIS_FPS, segment["start_time"], segment["end_time"])
+            signals["face_presence"][i] = values.mean() if len(values) else 0.0
+
+    total_weight = sum(weight for weight in weights.values() if weight > 0) or 1.0
+    scores = np.zeros(len(segments), dtype=np.float64)
+    for name, values in signals.items():
+        peak = values.max() if len(values) else 0.0
+        if weights[name] > 0 and peak > 0:
+            scores += weights[name] * values / peak
+    scores /= total_weight
+
+    scored = []
+    for i, segment in enumerate(segments):
+        scored.append({
+            **segment,
+            "signals": {name: float(values[i]) for name, values in signals.items()},
+            "score": float(scores[i])
+        })
+    return scored
+
+
+def select_top_clips(scored_segments: List[Dict[str, Any]], top_k: int) -> List[Dict[str, Any]]:
+    """
+    Keep the top_k highest scoring segments.
+
+    Args:
+        scored_segments: Segments returned by score_segments
+        top_k: Number of segments to keep
+
+    Returns:
+        The selected segments, in timeline order
+    """
+    # Stable sort, so ties go to the earlier segment
+    ranked = sorted(range(len(scored_segments)), key=lambda i: -scored_segments[i]["score"])
+    keep = sorted(ranked[:max(0, top_k)])
+    logger.info(f"Selected {len(keep)} of {len(scored_segments)} clips by score")
+    return [scored_segments[i] for i in keep]
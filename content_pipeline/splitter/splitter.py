@@ -1,21 +1,31 @@
 """
 Splitter Module for Content Repurposing Pipeline.
 
-This module provides functions to split videos using MoviePy, automatically
+This module provides functions to split videos using ffmpeg, automatically
 detecting logical splits based on duration thresholds or silent sections.
 """
 
 import os
 import logging
+import multiprocessing
+import shutil
+import subprocess
 import tempfile
+from contextlib import nullcontext
+import cv2
 import numpy as np
-from typing import Dict, List, Any, Optional, Tuple, Union
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Callable, Dict, Iterable, Iterator, List, Any, Optional, Tuple, Union
 from pathlib import Path
 
 import moviepy.editor as mp
-from moviepy.video.io.VideoFileClip import VideoFileClip
+from moviepy.config import get_setting
 from tqdm import tqdm
 
+from tasks.media_probe import probe_media
+from tasks.result_cache import get_file_hash
+from tasks.thread_budget import DEFAULT_JOB_THREADS, thread_budget
+
 # Configure logging
 logging.basicConfig(
     level=logging.INFO,
@@ -28,6 +38,24 @@ DEFAULT_MAX_CLIP_DURATION = 60  # 60 seconds (for TikTok, Instagram Reels, etc.)
 DEFAULT_MIN_CLIP_DURATION = 5   # 5 seconds
 DEFAULT_SILENCE_THRESHOLD = 0.03  # Threshold for silence detection
 DEFAULT_SILENCE_DURATION = 0.5   # Minimum duration of silence to consider for splitting
+ANALYSIS_SAMPLE_RATE = 8000  # Audio is resampled to this rate (Hz) for silence analysis
+ENVELOPE_RATE = 100  # RMS windows per second
+AUDIO_BLOCK_SECONDS = 10  # Seconds of audio decoded per block
+ENVELOPE_DTYPE = np.float16  # Storage type of persisted envelopes
+ANALYSIS_CACHE_DIR = Path(os.getenv('ANALYSIS_CACHE_DIR',
+                                    Path(tempfile.gettempdir()) / 'watermark_remover_cache' / 'analysis'))
+ANALYSIS_CACHE_MAX_BYTES = int(float(os.getenv('ANALYSIS_CACHE_MAX_MB', '512')) * 1024 ** 2)
+SPLIT_MODES = ("encode", "copy")
+DEFAULT_SCENE_THRESHOLD = 0.35  # Histogram change (0.0 to 1.0) that counts as a scene cut
+SCENE_ANALYSIS_FPS = 5  # Proxy frames per second analysed for scene changes
+SCENE_ANALYSIS_SIZE = (160, 90)  # Proxy frame size (width, height)
+SCENE_BATCH_FRAMES = 250  # Proxy frames scored per batch
+SCENE_HISTOGRAM_BINS = (16, 4, 4)  # Hue, saturation and value bins
+DEFAULT_KEYFRAME_TOLERANCE = 2.0  # Max seconds a split point may move to reach a keyframe
+KEYFRAME_EPSILON = 0.001  # Split points this close to a keyframe count as on it
+MP4_COPY_VIDEO_CODECS = ("h264", "hevc", "mpeg4", "av1", "vp9")  # Video codecs stream-copied into MP4
+
+FFMPEG_BINARY = get_setting("FFMPEG_BINARY")
 
 
 def get_video_info(video_path: str) -> Dict[str, Any]:
@@ -47,30 +75,464 @@ def get_video_info(video_path: str) -> Dict[str, Any]:
     logger.info(f"Getting video info for: {video_path}")
 
     try:
-        with VideoFileClip(video_path) as clip:
-            has_audio = clip.audio is not None
-
-            return {
-                "duration": clip.duration,
-                "fps": clip.fps,
-                "size": clip.size,
-                "audio": has_audio
-            }
+        info = probe_media(video_path)
+        if not info.has_video:
+            raise ValueError(f"No video stream in {video_path}")
+
+        return {
+            "duration": info.duration,
+            "fps": info.fps,
+            "size": info.display_size,
+            "audio": info.has_audio
+        }
     except Exception as e:
         logger.error(f"Error getting video info: {str(e)}")
         raise
 
 
+def read_audio_blocks(video_path: str,
+                      sample_rate: int = ANALYSIS_SAMPLE_RATE,
+                      block_seconds: float = AUDIO_BLOCK_SECONDS) -> Iterator[np.ndarray]:
+    """
+    Stream the first audio track of a video as mono float32 blocks.
+
+    ffmpeg decodes and resamples the audio to a low analysis rate and pipes
+    it as 16-bit PCM, so memory use stays bounded by the block size.
+
+    Args:
+        video_path: Path to the video file
+        sample_rate: Analysis sample rate in Hz
+        block_seconds: Seconds of audio per block
+
+    Yields:
+        Arrays of samples in the range -1.0 to 1.0; nothing if there is no audio
+    """
+    if not os.path.exists(video_path):
+        raise FileNotFoundError(f"Video file not found: {video_path}")
+
+    command = [
+        FFMPEG_BINARY, '-nostdin', '-v', 'error',
+        '-i', video_path,
+        '-map', '0:a:0?', '-vn',
+        '-ac', '1', '-ar', str(sample_rate),
+        '-f', 's16le', '-'
+    ]
+    process = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    block_bytes = int(sample_rate * block_seconds) * 2
+    received = 0
+    finished = False
+    try:
+        while True:
+            data = process.stdout.read(block_bytes)
+            if not data:
+                break
+            received += len(data)
+            yield np.frombuffer(data[:len(data) // 2 * 2], dtype=np.int16).astype(np.float32) / 32768.0
+        finished = True
+    finally:
+        # Stop ffmpeg if the caller abandoned the stream early
+        if not finished:
+            process.kill()
+        process.stdout.close()
+        stderr = process.stderr.read().decode('utf-8', errors='replace').strip()
+        process.stderr.close()
+        process.wait()
+
+    # A file without audio produces no samples and an error about the empty output
+    if process.returncode not in (0, None) and received:
+        raise RuntimeError(f"ffmpeg failed reading audio from {video_path}: {stderr}")
+
+
+def compute_rms_envelope(blocks: Iterable[np.ndarray],
+                         sample_rate: int = ANALYSIS_SAMPLE_RATE,
+                         envelope_rate: int = ENVELOPE_RATE) -> np.ndarray:
+    """
+    Reduce streamed audio to a windowed RMS envelope normalised to the peak sample.
+
+    Args:
+        blocks: Mono sample blocks, e.g. from read_audio_blocks()
+        sample_rate: Sample rate of the blocks in Hz
+        envelope_rate: RMS windows per second
+
+    Returns:
+        float32 array with one RMS value (0.0 to 1.0) per window
+    """
+    window = max(1, sample_rate // envelope_rate)
+    carry = np.empty(0, dtype=np.float32)
+    chunks = []
+    peak = 0.0
+
+    for block in blocks:
+        if not len(block):
+            continue
+        peak = max(peak, float(np.abs(block).max()))
+        data = np.concatenate((carry, block)) if len(carry) else block
+        whole = len(data) // window * window
+        frames = data[:whole].reshape(-1, window)
+        chunks.append(np.sqrt(np.mean(np.square(frames), axis=1, dtype=np.float32)))
+        carry = data[whole:]
+
+    if len(carry):
+        chunks.append(np.sqrt(np.mean(np.square(carry), dtype=np.float32, keepdims=True)))
+
+    if not chunks:
+        return np.empty(0, dtype=np.float32)
+
+    envelope = np.concatenate(chunks).astype(np.float32)
+    if peak > 0:
+        envelope /= peak
+    return envelope
+
+
+def find_silent_runs(envelope: np.ndarray,
+                     threshold: float = DEFAULT_SILENCE_THRESHOLD,
+                     min_silence_duration: float = DEFAULT_SILENCE_DURATION,
+                     envelope_rate: int = ENVELOPE_RATE) -> List[Tuple[float, float]]:
+    """
+    Find runs of the envelope below a threshold.
+
+    Args:
+        envelope: Normalised RMS envelope
+        threshold: Level below which a window counts as silent (0.0 to 1.0)
+        min_silence_duration: Minimum duration of silence to report (in seconds)
+        envelope_rate: Windows per second of the envelope
+
+    Returns:
+        List of tuples containing (start_time, end_time) of silent sections
+    """
+    # Pad with non-silence so every run has a rising and a falling edge
+    silent = np.concatenate(([False], np.asarray(envelope) < threshold, [False]))
+    edges = np.flatnonzero(np.diff(silent.astype(np.int8)))
+    starts, ends = edges[0::2], edges[1::2]
+
+    keep = (ends - starts) >= min_silence_duration * envelope_rate
+    return [(start / envelope_rate, end / envelope_rate)
+            for start, end in zip(starts[keep].tolist(), ends[keep].tolist())]
+
+
+def read_proxy_frames(video_path: str,
+                      fps: float = SCENE_ANALYSIS_FPS,
+                      size: Tuple[int, int] = SCENE_ANALYSIS_SIZE,
+                      batch_frames: int = SCENE_BATCH_FRAMES) -> Iterator[np.ndarray]:
+    """
+    Stream a small, low frame rate proxy of a video as batches of RGB frames.
+
+    ffmpeg drops frames and downscales before piping, so the cost is
+    dominated by decoding and stays independent of the source resolution
+    on the Python side.
+
+    Args:
+        video_path: Path to the video file
+        fps: Proxy frames per second
+        size: Proxy frame size (width, height)
+        batch_frames: Frames per batch
+
+    Yields:
+        uint8 arrays of shape (frames, height, width, 3)
+    """
+    if not os.path.exists(video_path):
+        raise FileNotFoundError(f"Video file not found: {video_path}")
+
+    width, height = size
+    command = [
+        FFMPEG_BINARY, '-nostdin', '-v', 'error',
+        '-i', video_path,
+        '-map', '0:v:0', '-an', '-sn',
+        '-vf', f"fps={fps},scale={width}:{height}:flags=area",
+        '-pix_fmt', 'rgb24', '-f', 'rawvideo', '-'
+    ]
+    process = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    frame_bytes = width * height * 3
+    finished = False
+    try:
+        while True:
+            data = process.stdout.read(frame_bytes * batch_frames)
+            count = len(data) // frame_bytes
+            if count:
+                yield np.frombuffer(data[:count * frame_bytes], dtype=np.uint8).reshape(count, height, width, 3)
+            if len(data) < frame_bytes * batch_frames:
+                break
+        finished = True
+    finally:
+        # Stop ffmpeg if the caller abandoned the stream early
+        if not finished:
+            process.kill()
+        process.stdout.close()
+        stderr = process.stderr.read().decode('utf-8', errors='replace').strip()
+        process.stderr.close()
+        process.wait()
+
+    if process.returncode not in (0, None):
+        raise RuntimeError(f"ffmpeg failed reading frames from {video_path}: {stderr}")
+
+
+def compute_scene_scores(batches: Iterable[np.ndarray],
+                         bins: Tuple[int, int, int] = SCENE_HISTOGRAM_BINS) -> np.ndarray:
+    """
+    Score how much each frame differs from the previous one.
+
+    Frames are reduced to normalised HSV histograms; the score is half the
+    L1 distance between consecutive histograms.
+
+    Args:
+        batches: Batches of RGB frames, e.g. from read_proxy_frames()
+        bins: Number of hue, saturation and value bins
+
+    Returns:
+        float32 array with one score (0.0 to 1.0) per frame; the first frame scores 0
+    """
+    hue_bins, sat_bins, val_bins = bins
+    total_bins = hue_bins * sat_bins * val_bins
+    previous = None
+    chunks = []
+
+    for frames in batches:
+        count, height, width, _ = frames.shape
+        # One conversion call for the whole batch, stacked as a tall image
+        hsv = cv2.cvtColor(frames.reshape(count * height, width, 3), cv2.COLOR_RGB2HSV)
+        hsv = hsv.reshape(count, height * width, 3).astype(np.int32)
+        index = ((hsv[..., 0] * hue_bins // 180) * sat_bins + hsv[..., 1] * sat_bins // 256) * val_bins \
+            + hsv[..., 2] * val_bins // 256
+        index += np.arange(count, dtype=np.int32)[:, None] * total_bins
+        histograms = np.bincount(index.ravel(), minlength=count * total_bins).reshape(count, total_bins)
+        histograms = histograms.astype(np.float32) / (height * width)
+
+        reference = np.concatenate(([histograms[0] if previous is None else previous], histograms[:-1]))
+        chunks.append(0.5 * np.abs(histograms - reference).sum(axis=1))
+        previous = histograms[-1]
+
+    if not chunks:
+        return np.empty(0, dtype=np.float32)
+    return np.concatenate(chunks).astype(np.float32)
+
+
+def select_scene_cuts(scores: np.ndarray,
+                      duration: float,
+                      fps: float = SCENE_ANALYSIS_FPS,
+                      threshold: float = DEFAULT_SCENE_THRESHOLD,
+                      min_clip_duration: float = DEFAULT_MIN_CLIP_DURATION,
+                      max_clip_duration: float = DEFAULT_MAX_CLIP_DURATION) -> List[float]:
+    """
+    Choose split points at scene changes within the clip duration limits.
+
+    From each split point the next one is the first scene change that leaves
+    at least min_clip_duration on both sides. When no scene change falls
+    within max_clip_duration, the clip is cut at the largest change in
+    reach, or at max_clip_duration if there is none.
+
+    Args:
+        scores: Per-frame scene change scores, e.g. from compute_scene_scores()
+        duration: Duration of the video in seconds
+        fps: Frames per second of the scores
+        threshold: Score at which a frame counts as a scene change
+        min_clip_duration: Minimum duration of each clip in seconds
+        max_clip_duration: Maximum duration of each clip in seconds
+
+    Returns:
+        Sorted split points in seconds, including start and end
+    """
+    scores = np.asarray(scores, dtype=np.float32)
+    times = np.arange(len(scores)) / fps
+    step = max(min_clip_duration, 1.0 / fps)
+    points = [0.0]
+
+    while True:
+        last = points[-1]
+        remaining = duration - last
+        window = (times >= last + step) & (times <= duration - min_clip_duration)
+        if remaining > max_clip_duration:
+            window &= times <= last + max_clip_duration
+
+        strong = np.flatnonzero(window & (scores >= threshold))
+        if len(strong):
+            cut = float(times[strong[0]])
+        elif remaining > max_clip_duration:
+            # Ties go to the latest frame, so clips without any change run to the maximum
+            candidates = np.flatnonzero(window)[::-1]
+            if len(candidates):
+                cut = float(times[candidates[np.argmax(scores[candidates])]])
+            else:
+                cut = last + max_clip_duration
+        else:
+            break
+        points.append(cut)
+
+    points.append(duration)
+    return points
+
+
+def detect_scene_cuts(video_path: str,
+                      duration: float,
+                      threshold: float = DEFAULT_SCENE_THRESHOLD,
+                      min_clip_duration: float = DEFAULT_MIN_CLIP_DURATION,
+                      max_clip_duration: float = DEFAULT_MAX_CLIP_DURATION) -> List[float]:
+    """
+    Find split points at scene changes in a video.
+
+    Args:
+        video_path: Path to the video file
+        duration: Duration of the video in seconds
+        threshold: Histogram change (0.0 to 1.0) that counts as a scene cut
+        min_clip_duration: Minimum duration of each clip in seconds
+        max_clip_duration: Maximum duration of each clip in seconds
+
+    Returns:
+        Sorted split points in seconds, including start and end
+    """
+    logger.info(f"Detecting scene changes in video: {video_path}")
+
+    scores = load_scene_scores(video_path)
+    cuts = select_scene_cuts(scores, duration, SCENE_ANALYSIS_FPS, threshold,
+                             min_clip_duration, max_clip_duration)
+
+    logger.info(f"Found {int(np.count_nonzero(scores >= threshold))} scene changes, "
+                f"using {len(cuts) - 2} as split points")
+    return cuts
+
+
+def get_analysis_path(content_hash: str, kind: str = "envelope") -> Path:
+    """Path of a persisted analysis array, addressed by the content hash of its source."""
+    return ANALYSIS_CACHE_DIR / f"{content_hash}.{kind}.npy"
+
+
+def prune_analysis_cache(max_bytes: int = ANALYSIS_CACHE_MAX_BYTES) -> int:
+    """
+    Delete the least recently used analysis arrays until the cache fits in max_bytes.
+
+    Args:
+        max_bytes: Disk budget of the analysis cache
+
+    Returns:
+        Number of files deleted
+    """
+    entries = []
+    for path in ANALYSIS_CACHE_DIR.glob("*.npy"):
+        try:
+            stat = path.stat()
+        except FileNotFoundError:
+            continue
+        entries.append((stat.st_mtime, stat.st_size, path))
+
+    total = sum(size for _, size, _ in entries)
+    removed = 0
+    for _, size, path in sorted(entries, key=lambda entry: entry[0]):
+        if total <= max_bytes:
+            break
+        try:
+            path.unlink()
+        except FileNotFoundError:
+            pass
+        total -= size
+        removed += 1
+    if removed:
+        logger.info(f"Evicted {removed} analysis cache files")
+    return removed
+
+
+def load_analysis(video_path: str, kind: str, compute: Callable[[], np.ndarray],
+                  use_cache: bool = True) -> np.ndarray:
+    """
+    Get a per-source analysis array, computing it at most once per content hash.
+
+    The array is stored as float16 in the analysis cache and memory-mapped
+    on later calls.
+
+    Args:
+        video_path: Path to the video file
+        kind: Name of the analysis, part of the cache file name (e.g. "envelope")
+        compute: Function computing the array when it is not cached
+        use_cache: Whether to read and write the persisted array
+
+    Returns:
+        The analysis array
+    """
+    cache_path = None
+    if use_cache:
+        try:
+            cache_path = get_analysis_path(get_file_hash(video_path), kind)
+            if cache_path.exists():
+                logger.info(f"Using cached {kind}: {cache_path}")
+                # Mark the file as recently used for the LRU eviction
+                os.utime(cache_path)
+                return np.load(cache_path, mmap_mode='r')
+        except (OSError, ValueError) as e:
+            logger.warning(f"Failed to read cached {kind}: {str(e)}")
+            cache_path = None
+
+    data = compute().astype(ENVELOPE_DTYPE)
+
+    if cache_path:
+        # Write to a temporary file first so readers never see a partial array
+        temp_path = f"{cache_path}.{os.getpid()}.tmp"
+        try:
+            ANALYSIS_CACHE_DIR.mkdir(parents=True, exist_ok=True)
+            with open(temp_path, 'wb') as f:
+                np.save(f, data)
+            os.replace(temp_path, cache_path)
+            prune_analysis_cache()
+        except OSError as e:
+            logger.warning(f"Failed to save {kind}: {str(e)}")
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+    return data
+
+
+def load_audio_envelope(video_path: str, use_cache: bool = True) -> np.ndarray:
+    """
+    Get the RMS energy envelope of a video's audio, computing it at most once per source.
+
+    The envelope (float16, ENVELOPE_RATE values per second) is saved in the
+    analysis cache, keyed by the video's content hash, and memory-mapped on
+    later calls, so re-running silence detection with other settings does
+    not decode the audio again.
+
+    Args:
+        video_path: Path to the video file
+        use_cache: Whether to read and write the persisted envelope
+
+    Returns:
+        Normalised RMS envelope; empty if the video has no audio
+    """
+    return load_analysis(video_path, "envelope",
+                          lambda: compute_rms_envelope(read_audio_blocks(video_path)), use_cache)
+
+
+def load_scene_scores(video_path: str, use_cache: bool = True) -> np.ndarray:
+    """
+    Get the scene change scores of a video, computing them at most once per source.
+
+    Scores (float16, SCENE_ANALYSIS_FPS values per second) are persisted like
+    the audio envelope, so trying other thresholds or clip limits does not
+    decode the video again.
+
+    Args:
+        video_path: Path to the video file
+        use_cache: Whether to read and write the persisted scores
+
+    Returns:
+        Per-frame scene change scores (see compute_scene_scores)
+    """
+    return load_analysis(video_path, "scenes",
+                          lambda: compute_scene_scores(read_proxy_frames(video_path)), use_cache)
+
+
 def detect_silence(video_path: str,
                   threshold: float = DEFAULT_SILENCE_THRESHOLD,
-                  min_silence_duration: float = DEFAULT_SILENCE_DURATION) -> List[Tuple[float, float]]:
+                  min_silence_duration: float = DEFAULT_SILENCE_DURATION,
+                  use_cache: bool = True) -> List[Tuple[float, float]]:
     """
     Detect silent sections in a video.
 
+    The audio is streamed at a low sample rate and reduced to a 100 Hz RMS
+    envelope, relative to the loudest sample, which is then thresholded.
+    The envelope is persisted per source (see load_audio_envelope), so
+    repeated calls with different settings only re-run the threshold.
+
     Args:
         video_path: Path to the video file
         threshold: Threshold for silence detection (0.0 to 1.0)
         min_silence_duration: Minimum duration of silence to consider (in seconds)
+        use_cache: Whether to reuse and persist the audio envelope
 
     Returns:
         List of tuples containing (start_time, end_time) of silent sections
@@ -78,74 +540,425 @@ def detect_silence(video_path: str,
     logger.info(f"Detecting silence in video: {video_path}")
 
     try:
-        with VideoFileClip(video_path) as clip:
-            # Check if the video has audio
-            if clip.audio is None:
-                logger.warning(f"Video has no audio: {video_path}")
-                return []
-
-            # Extract the audio as a numpy array
-            audio = clip.audio.to_soundarray(fps=22000, nbytes=2)
-
-            # If audio has multiple channels, take the mean
-            if audio.ndim > 1:
-                audio = audio.mean(axis=1)
-
-            # Calculate the absolute amplitude
-            abs_audio = np.abs(audio)
-
-            # Normalize to 0-1 range
-            if abs_audio.max() > 0:
-                abs_audio = abs_audio / abs_audio.max()
-
-            # Find segments below the threshold
-            is_silence = abs_audio < threshold
-
-            # Convert to time segments
-            silence_segments = []
-            in_silence = False
-            silence_start = 0
-
-            for i, silent in enumerate(is_silence):
-                time = i / 22000  # Convert sample index to time
-
-                if silent and not in_silence:
-                    # Start of a silent segment
-                    in_silence = True
-                    silence_start = time
-                elif not silent and in_silence:
-                    # End of a silent segment
-                    in_silence = False
-                    silence_duration = time - silence_start
-
-                    # Only consider segments longer than min_silence_duration
-                    if silence_duration >= min_silence_duration:
-                        silence_segments.append((silence_start, time))
-
-            # Handle the case where the video ends during a silent segment
-            if in_silence:
-                silence_duration = clip.duration - silence_start
-                if silence_duration >= min_silence_duration:
-                    silence_segments.append((silence_start, clip.duration))
-
-            logger.info(f"Found {len(silence_segments)} silent segments")
-            return silence_segments
+        # Check if the video has audio
+        if not probe_media(video_path).has_audio:
+            logger.warning(f"Video has no audio: {video_path}")
+            return []
+
+        envelope = load_audio_envelope(video_path, use_cache=use_cache)
+        if not len(envelope):
+            logger.warning(f"No audio could be decoded from: {video_path}")
+            return []
+
+        silence_segments = find_silent_runs(envelope, threshold, min_silence_duration)
+
+        logger.info(f"Found {len(silence_segments)} silent segments")
+        return silence_segments
 
     except Exception as e:
         logger.error(f"Error detecting silence: {str(e)}")
         return []
 
 
+def snap_to_keyframes(split_points: List[float],
+                      keyframe_times: List[float],
+                      tolerance: float = DEFAULT_KEYFRAME_TOLERANCE) -> List[float]:
+    """
+    Move inner split points onto the nearest keyframe within a tolerance.
+
+    Points without a keyframe in reach are kept as they are; the first and
+    last points (the start and end of the video) are never moved.
+
+    Args:
+        split_points: Sorted split points in seconds, including start and end
+        keyframe_times: Sorted keyframe timestamps in seconds
+        tolerance: Maximum distance a point may move (in seconds)
+
+    Returns:
+        Sorted split points without duplicates
+    """
+    if len(split_points) < 3 or not len(keyframe_times):
+        return list(split_points)
+
+    keyframes = np.asarray(keyframe_times, dtype=np.float64)
+    inner = np.asarray(split_points[1:-1], dtype=np.float64)
+
+    # Nearest keyframe on either side of each point
+    right = np.clip(np.searchsorted(keyframes, inner), 0, len(keyframes) - 1)
+    left = np.clip(right - 1, 0, len(keyframes) - 1)
+    nearest = np.where(np.abs(keyframes[left] - inner) <= np.abs(keyframes[right] - inner),
+                       keyframes[left], keyframes[right])
+    snapped = np.where(np.abs(nearest - inner) <= tolerance, nearest, inner)
+
+    points = [split_points[0]]
+    for point in snapped.tolist():
+        if split_points[0] < point < split_points[-1] and point - points[-1] > KEYFRAME_EPSILON:
+            points.append(point)
+    points.append(split_points[-1])
+    return points
+
+
+def _run_ffmpeg(args: List[str]) -> None:
+    command = [FFMPEG_BINARY, '-nostdin', '-v', 'error', '-y'] + [str(arg) for arg in args]
+    result = subprocess.run(command, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+    if result.returncode != 0:
+        raise RuntimeError(f"ffmpeg exited with {result.returncode}: "
+                           f"{result.stderr.decode('utf-8', errors='replace').strip()}")
+
+
+def encode_clip(video_path: str,
+                output_path: str,
+                start_time: float,
+                end_time: float,
+                threads: Optional[int] = None) -> None:
+    """
+    Encode one clip, decoding only its own range of the source.
+
+    Args:
+        video_path: Path to the source video
+        output_path: Path of the clip to write
+        start_time: Start of the clip in seconds
+        end_time: End of the clip in seconds
+        threads: Encoder threads (default: leased from the node's thread budget)
+    """
+    with (thread_budget.lease() if threads is None else nullcontext(threads)) as threads:
+        # -ss before -i seeks in the input instead of decoding up to the start
+        _run_ffmpeg(['-ss', f"{start_time:.6f}", '-i', video_path, '-t', f"{end_time - start_time:.6f}",
+                     '-map', '0:v:0', '-map', '0:a:0?', '-c:v', 'libx264', '-c:a', 'aac',
+                     '-threads', threads, '-movflags', '+faststart', output_path])
+
+
+def cut_clip_copy(video_path: str,
+                  output_path: str,
+                  start_time: float,
+                  end_time: float,
+                  keyframe_times: List[float],
+                  video_codec: Optional[str] = None,
+                  audio_codec: Optional[str] = None,
+                  threads: Optional[int] = None) -> None:
+    """
+    Cut a clip without re-encoding the video where possible.
+
+    A clip starting and ending on keyframes (or at the end of the video) is
+    stream-copied if MP4 can carry its video codec. Other clips cannot be
+    copied cleanly and, like clips in other codecs, are re-encoded (see
+    encode_clip).
+
+    Args:
+        video_path: Path to the source video
+        output_path: Path of the clip to write
+        start_time: Start of the clip in seconds
+        end_time: End of the clip in seconds
+        keyframe_times: Sorted keyframe timestamps of the source
+        video_codec: Codec name of the source video stream
+        audio_codec: Codec name of the source audio stream (None if there is no audio)
+        threads: Encoder threads for re-encoded clips (default: leased from the node's thread budget)
+    """
+    # AAC is carried over; other audio codecs are converted for MP4 players
+    audio_args = ['-c:a', 'copy' if audio_codec in (None, 'aac') else 'aac']
+    maps = ['-map', '0:v:0', '-map', '0:a:0?']
+
+    keyframes = np.asarray(keyframe_times, dtype=np.float64)
+
+    def on_keyframe(t):
+        return len(keyframes) and np.min(np.abs(keyframes - t)) <= KEYFRAME_EPSILON
+
+    # A copy cannot end cleanly between keyframes either, except at the end of the video
+    copyable = (video_codec in MP4_COPY_VIDEO_CODECS
+                and (start_time <= KEYFRAME_EPSILON or on_keyframe(start_time))
+                and (on_keyframe(end_time) or end_time >= probe_media(video_path).duration - KEYFRAME_EPSILON))
+
+    if copyable:
+        # -t alone cuts copied packets by decode time and keeps the frames
+        # reordered past the end; the segment muxer splits on presentation
+        # time at the next keyframe, so only the first segment is kept
+        duration = end_time - start_time
+        work_dir = tempfile.mkdtemp(prefix="clip_copy_", dir=os.path.dirname(os.path.abspath(output_path)))
+        try:
+            _run_ffmpeg(['-ss', f"{start_time:.6f}", '-i', video_path, '-t', f"{duration:.6f}",
+                         *maps, '-c:v', 'copy', *audio_args, '-avoid_negative_ts', 'make_zero',
+                         '-f', 'segment', '-segment_times', f"{duration - KEYFRAME_EPSILON:.6f}",
+                         '-reset_timestamps', '1',
+                         '-segment_format', 'mp4', '-segment_format_options', 'movflags=+faststart',
+                         os.path.join(work_dir, "part_%03d.mp4")])
+            os.replace(os.path.join(work_dir, "part_000.mp4"), output_path)
+        finally:
+            shutil.rmtree(work_dir, ignore_errors=True)
+        return
+
+    logger.info(f"Clip {start_time:.3f}-{end_time:.3f}s cannot be stream-copied, re-encoding it")
+    encode_clip(video_path, output_path, start_time, end_time, threads)
+
+
+def export_segments(video_path: str,
+                    output_dir: str,
+                    base_filename: str,
+                    split_points: List[float],
+                    threads: Optional[int] = None) -> List[str]:
+    """
+    Encode all clips of a video in a single ffmpeg pass.
+
+    The source is decoded and encoded once; keyframes are forced at the split
+    points and the segment muxer starts a new file on each of them.
+
+    Args:
+        video_path: Path to the source video
+        output_dir: Directory to write the clips to
+        base_filename: Clip names are <base_filename>_clip_<index>.mp4
+        split_points: Sorted split points in seconds, including start and end
+        threads: Encoder threads (default: leased from the node's thread budget)
+
+    Returns:
+        Paths of the clips in order
+    """
+    inner = ",".join(f"{point:.6f}" for point in split_points[1:-1])
+    # The segment muxer expands % sequences in the name
+    pattern = os.path.join(output_dir, f"{base_filename.replace('%', '%%')}_clip_%03d.mp4")
+
+    with (thread_budget.lease() if threads is None else nullcontext(threads)) as threads:
+        args = ['-ss', f"{split_points[0]:.6f}", '-i', video_path, '-t', f"{split_points[-1] - split_points[0]:.6f}",
+                '-map', '0:v:0', '-map', '0:a:0?', '-c:v', 'libx264', '-c:a', 'aac', '-threads', threads]
+        if inner:
+            args += ['-force_key_frames', inner, '-segment_times', inner]
+        args += ['-f', 'segment', '-segment_start_number', '1', '-reset_timestamps', '1',
+                 '-segment_format', 'mp4', '-segment_format_options', 'movflags=+faststart', pattern]
+        _run_ffmpeg(args)
+
+    paths = [os.path.join(output_dir, f"{base_filename}_clip_{i+1:03d}.mp4") for i in range(len(split_points) - 1)]
+    missing = [path for path in paths if not os.path.exists(path)]
+    if missing:
+        raise RuntimeError(f"ffmpeg produced {len(paths) - len(missing)} of {len(paths)} clips")
+    return paths
+
+
+def export_clips_parallel(video_path: str,
+                          output_paths: List[str],
+                          clip_ranges: List[Tuple[float, float]],
+                          workers: int,
+                          mode: str = "encode",
+                          keyframe_times: Optional[List[float]] = None,
+                          codecs: Optional[Dict[str, str]] = None) -> List[str]:
+    """
+    Export clips concurrently, one ffmpeg process per clip in a process pool.
+
+    Each worker seeks straight to its clip. The job leases CPU threads from
+    the node's thread budget and divides them between the workers, so
+    concurrent jobs do not oversubscribe the machine.
+
+    Args:
+        video_path: Path to the source video
+        output_paths: Path of each clip, in order
+        clip_ranges: (start, end) of each clip in seconds
+        workers: Number of clips exported at the same time
+        mode: "encode" to re-encode clips or "copy" to stream-copy them
+        keyframe_times: Keyframe timestamps of the source (copy mode)
+        codecs: Codec names of the source by stream type (copy mode)
+
+    Returns:
+        Paths of the clips in order
+    """
+    codecs = codecs or {}
+    workers = max(1, min(workers, len(output_paths)))
+
+    with thread_budget.lease(workers * DEFAULT_JOB_THREADS) as cpu_threads:
+        # A smaller grant than asked for also means fewer concurrent clips
+        workers = min(workers, cpu_threads)
+        threads = max(1, cpu_threads // workers)
+        logger.info(f"Exporting {len(output_paths)} clips with {workers} workers, {threads} threads each")
+
+        with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn')) as pool:
+            futures = []
+            for output_path, (start_time, end_time) in zip(output_paths, clip_ranges):
+                if mode == "copy":
+                    futures.append(pool.submit(cut_clip_copy, video_path, output_path, start_time, end_time,
+                                               keyframe_times or [], codecs.get('video'), codecs.get('audio'),
+                                               threads))
+                else:
+                    futures.append(pool.submit(encode_clip, video_path, output_path, start_time, end_time,
+                                               threads))
+
+            # Create a progress bar
+            progress_bar = tqdm(total=len(futures), desc="Creating clips")
+            for future in as_completed(futures):
+                future.result()
+                progress_bar.update(1)
+            progress_bar.close()
+
+    return list(output_paths)
+
+
+def _plan_split_points(video_path: str,
+                       max_clip_duration: float,
+                       min_clip_duration: float,
+                       split_on_silence: bool,
+                       silence_threshold: float,
+                       silence_duration: float,
+                       split_on_scenes: bool,
+                       scene_threshold: float,
+                       mode: str,
+                       keyframe_tolerance: float,
+                       exact_cuts: bool) -> Tuple[float, List[float], List[str]]:
+    # Returns the video duration, the split points (start and end included)
+    # and the reason for each point
+    if mode not in SPLIT_MODES:
+        raise ValueError(f"Unsupported split mode: {mode}. Use one of {', '.join(SPLIT_MODES)}")
+
+    # Get video info
+    video_info = get_video_info(video_path)
+    video_duration = video_info["duration"]
+    logger.info(f"Video duration: {video_duration:.2f} seconds")
+
+    # Determine split points
+    split_points = []
+
+    if split_on_scenes:
+        # Split on scene changes, within the clip duration limits
+        logger.info("Detecting scene changes for splitting...")
+        scores = load_scene_scores(video_path)
+        split_points = select_scene_cuts(scores, video_duration, SCENE_ANALYSIS_FPS, scene_threshold,
+                                         min_clip_duration, max_clip_duration)
+        # Cuts forced by the maximum duration fall on frames below the threshold
+        frames = [min(int(round(point * SCENE_ANALYSIS_FPS)), len(scores) - 1) for point in split_points]
+        reasons = ["start"] + ["scene" if len(scores) and scores[frame] >= scene_threshold else "max_duration"
+                               for frame in frames[1:-1]] + ["end"]
+    elif split_on_silence and video_info["audio"]:
+        # Split on silent sections
+        logger.info("Detecting silent sections for splitting...")
+        silence_segments = detect_silence(
+            video_path,
+            threshold=silence_threshold,
+            min_silence_duration=silence_duration
+        )
+
+        # Use the middle of each silent segment as a split point
+        for start, end in silence_segments:
+            split_point = (start + end) / 2
+            split_points.append(split_point)
+
+        # Add start and end points
+        split_points = [0] + sorted(split_points) + [video_duration]
+        reasons = ["start"] + ["silence"] * len(silence_segments) + ["end"]
+    else:
+        # Split based on max_clip_duration
+        logger.info(f"Splitting based on max clip duration: {max_clip_duration} seconds")
+        num_clips = int(np.ceil(video_duration / max_clip_duration))
+        split_points = np.linspace(0, video_duration, num_clips + 1).tolist()
+        reasons = ["start"] + ["max_duration"] * (num_clips - 1) + ["end"]
+
+    if mode == "copy" and not exact_cuts:
+        # Stream copies can only start cleanly on keyframes
+        keyframe_times = probe_media(video_path, keyframes=True).keyframe_times
+        snapped = snap_to_keyframes(list(split_points), keyframe_times, keyframe_tolerance)
+        originals = np.asarray(split_points, dtype=np.float64)
+        reasons = [reasons[int(np.argmin(np.abs(originals - point)))] for point in snapped]
+        split_points = snapped
+
+    # Filter out split points that would create clips shorter than min_clip_duration
+    filtered_split_points = [split_points[0]]
+    filtered_reasons = [reasons[0]]
+    for i in range(1, len(split_points)):
+        if split_points[i] - filtered_split_points[-1] >= min_clip_duration:
+            filtered_split_points.append(split_points[i])
+            filtered_reasons.append(reasons[i])
+
+    logger.info(f"Split points: {filtered_split_points}")
+    return video_duration, filtered_split_points, filtered_reasons
+
+
+def plan_split(video_path: str,
+               max_clip_duration: float = DEFAULT_MAX_CLIP_DURATION,
+               min_clip_duration: float = DEFAULT_MIN_CLIP_DURATION,
+               split_on_silence: bool = False,
+               silence_threshold: float = DEFAULT_SILENCE_THRESHOLD,
+               silence_duration: float = DEFAULT_SILENCE_DURATION,
+               split_on_scenes: bool = False,
+               scene_threshold: float = DEFAULT_SCENE_THRESHOLD,
+               mode: str = "encode",
+               keyframe_tolerance: float = DEFAULT_KEYFRAME_TOLERANCE,
+               exact_cuts: bool = False) -> Dict[str, Any]:
+    """
+    Work out where split_video would cut a video, without writing any files.
+
+    Only the cached probe and the persisted audio envelope or scene scores
+    are read once they exist, so trying different settings is cheap.
+    Arguments are the same as for split_video.
+
+    Returns:
+        Dictionary containing:
+            - success: Boolean indicating if planning was successful
+            - clips: List of dictionaries containing clip information:
+                - index: Clip number, starting at 1
+                - start_time: Start time of the clip in the original video
+                - end_time: End time of the clip in the original video
+                - duration: Duration of the clip in seconds
+                - reason: Why the clip ends there ("silence", "scene", "max_duration" or "end")
+            - error: Error message (if any)
+    """
+    logger.info(f"Planning split for video: {video_path}")
+
+    try:
+        video_duration, split_points, reasons = _plan_split_points(
+            video_path, max_clip_duration, min_clip_duration, split_on_silence, silence_threshold,
+            silence_duration, split_on_scenes, scene_threshold, mode, keyframe_tolerance, exact_cuts
+        )
+
+        clips = [{
+            "index": i + 1,
+            "start_time": split_points[i],
+            "end_time": split_points[i + 1],
+            "duration": split_points[i + 1] - split_points[i],
+            "reason": reasons[i + 1]
+        } for i in range(len(split_points) - 1)]
+
+        return {
+            "success": True,
+            "clips": clips,
+            "error": None,
+            "metadata": {
+                "original_video": video_path,
+                "total_duration": video_duration,
+                "num_clips": len(clips),
+                "mode": mode
+            }
+        }
+
+    except Exception as e:
+        logger.error(f"Error planning split: {str(e)}")
+        return {
+            "success": False,
+            "clips": [],
+            "error": str(e),
+            "metadata": {}
+        }
+
+
 def split_video(video_path: str,
                output_dir: Optional[str] = None,
                max_clip_duration: float = DEFAULT_MAX_CLIP_DURATION,
                min_clip_duration: float = DEFAULT_MIN_CLIP_DURATION,
                split_on_silence: bool = False,
                silence_threshold: float = DEFAULT_SILENCE_THRESHOLD,
-               silence_duration: float = DEFAULT_SILENCE_DURATION) -> Dict[str, Any]:
+               silence_duration: float = DEFAULT_SILENCE_DURATION,
+               mode: str = "encode",
+               keyframe_tolerance: float = DEFAULT_KEYFRAME_TOLERANCE,
+               exact_cuts: bool = False,
+               workers: int = 1,
+               split_on_scenes: bool = False,
+               scene_threshold: float = DEFAULT_SCENE_THRESHOLD,
+               clip_indices: Optional[List[int]] = None) -> Dict[str, Any]:
     """
     Split a video into multiple clips based on duration thresholds and optionally silent sections.
 
+    In "encode" mode all clips are encoded with libx264 in one ffmpeg pass
+    over the source (see export_segments). In "copy" mode
+    split points are moved to the nearest keyframe within keyframe_tolerance
+    and the clips are cut without re-encoding, which is many times faster;
+    clips starting at points with no keyframe in reach, or at any point when
+    exact_cuts is set, are re-encoded so they start exactly there. With workers
+    above 1, clips are exported concurrently, each decoding only its range.
+    With clip_indices, only those clips of the plan are exported, each
+    seeking straight to its range.
+
     Args:
         video_path: Path to the video file
         output_dir: Directory to save the clips (optional, will create a temp dir if not provided)
@@ -154,6 +967,13 @@ def split_video(video_path: str,
         split_on_silence: Whether to split on silent sections
         silence_threshold: Threshold for silence detection (0.0 to 1.0)
         silence_duration: Minimum duration of silence to consider (in seconds)
+        mode: "encode" to re-encode clips or "copy" to stream-copy them
+        keyframe_tolerance: Maximum distance a split point may move to a keyframe in copy mode (in seconds)
+        exact_cuts: Keep split points where they are in copy mode instead of snapping them
+        workers: Number of clips to export at the same time
+        split_on_scenes: Whether to split on scene changes (takes precedence over split_on_silence)
+        scene_threshold: Histogram change (0.0 to 1.0) that counts as a scene cut
+        clip_indices: 1-based indices of the planned clips to export (default: all of them)
 
     Returns:
         Dictionary containing:
@@ -168,6 +988,9 @@ def split_video(video_path: str,
     logger.info(f"Splitting video: {video_path}")
 
     try:
+        if mode not in SPLIT_MODES:
+            raise ValueError(f"Unsupported split mode: {mode}. Use one of {', '.join(SPLIT_MODES)}")
+
         # Create output directory if not provided
         if output_dir is None:
             output_dir = tempfile.mkdtemp(prefix="video_clips_")
@@ -176,89 +999,78 @@ def split_video(video_path: str,
             os.makedirs(output_dir, exist_ok=True)
             logger.info(f"Using output directory: {output_dir}")
 
-        # Get video info
-        video_info = get_video_info(video_path)
-        video_duration = video_info["duration"]
-        logger.info(f"Video duration: {video_duration:.2f} seconds")
-
-        # Determine split points
-        split_points = []
-
-        if split_on_silence and video_info["audio"]:
-            # Split on silent sections
-            logger.info("Detecting silent sections for splitting...")
-            silence_segments = detect_silence(
-                video_path,
-                threshold=silence_threshold,
-                min_silence_duration=silence_duration
-            )
+        video_duration, split_points, _ = _plan_split_points(
+            video_path, max_clip_duration, min_clip_duration, split_on_silence, silence_threshold,
+            silence_duration, split_on_scenes, scene_threshold, mode, keyframe_tolerance, exact_cuts
+        )
 
-            # Use the middle of each silent segment as a split point
-            for start, end in silence_segments:
-                split_point = (start + end) / 2
-                split_points.append(split_point)
+        if mode == "copy":
+            # Stream copies can only start cleanly on keyframes
+            media_info = probe_media(video_path, keyframes=True)
+            codecs = {'video': media_info.video_codec, 'audio': media_info.audio_codec}
+            keyframe_times = media_info.keyframe_times
 
-            # Add start and end points
-            split_points = [0] + sorted(split_points) + [video_duration]
+        # Get the base filename without extension
+        base_filename = os.path.splitext(os.path.basename(video_path))[0]
+        num_planned = len(split_points) - 1
+        if clip_indices is None:
+            selected = list(range(num_planned))
         else:
-            # Split based on max_clip_duration
-            logger.info(f"Splitting based on max clip duration: {max_clip_duration} seconds")
-            num_clips = int(np.ceil(video_duration / max_clip_duration))
-            split_points = np.linspace(0, video_duration, num_clips + 1)
-
-        # Filter out split points that would create clips shorter than min_clip_duration
-        filtered_split_points = [split_points[0]]
-        for i in range(1, len(split_points)):
-            if split_points[i] - filtered_split_points[-1] >= min_clip_duration:
-                filtered_split_points.append(split_points[i])
-
-        split_points = filtered_split_points
-        logger.info(f"Split points: {split_points}")
+            selected = sorted({index - 1 for index in clip_indices if 1 <= index <= num_planned})
+            logger.info(f"Exporting {len(selected)} of {num_planned} planned clips")
+        output_paths = [os.path.join(output_dir, f"{base_filename}_clip_{i+1:03d}.mp4") for i in selected]
+        clip_ranges = [(split_points[i], split_points[i + 1]) for i in selected]
 
         # Create clips
-        clips = []
-        with VideoFileClip(video_path) as video:
-            # Get the base filename without extension
-            base_filename = os.path.splitext(os.path.basename(video_path))[0]
-
+        if workers > 1 and len(output_paths) > 1:
+            export_clips_parallel(
+                video_path,
+                output_paths,
+                clip_ranges,
+                workers,
+                mode=mode,
+                keyframe_times=keyframe_times if mode == "copy" else None,
+                codecs=codecs if mode == "copy" else None
+            )
+        elif mode == "copy" or len(selected) < num_planned:
             # Create a progress bar
-            progress_bar = tqdm(total=len(split_points) - 1, desc="Creating clips")
-
-            for i in range(len(split_points) - 1):
-                start_time = split_points[i]
-                end_time = split_points[i + 1]
-
-                # Create the subclip
-                subclip = video.subclip(start_time, end_time)
-
-                # Generate the output filename
-                output_filename = f"{base_filename}_clip_{i+1:03d}.mp4"
-                output_path = os.path.join(output_dir, output_filename)
-
-                # Write the clip to file
-                subclip.write_videofile(
-                    output_path,
-                    codec="libx264",
-                    audio_codec="aac",
-                    temp_audiofile=os.path.join(output_dir, f"temp_audio_{i+1}.m4a"),
-                    remove_temp=True,
-                    logger=None  # Disable moviepy's logger to avoid cluttering the output
-                )
-
-                # Add clip info to the list
-                clips.append({
-                    "path": output_path,
-                    "duration": end_time - start_time,
-                    "start_time": start_time,
-                    "end_time": end_time,
-                    "index": i + 1
-                })
+            progress_bar = tqdm(total=len(output_paths), desc="Creating clips")
+
+            for output_path, (start_time, end_time) in zip(output_paths, clip_ranges):
+                if mode == "copy":
+                    cut_clip_copy(
+                        video_path,
+                        output_path,
+                        start_time,
+                        end_time,
+                        keyframe_times,
+                        video_codec=codecs.get('video'),
+                        audio_codec=codecs.get('audio')
+                    )
+                else:
+                    encode_clip(video_path, output_path, start_time, end_time)
 
                 # Update the progress bar
                 progress_bar.update(1)
 
             # Close the progress bar
             progress_bar.close()
+        else:
+            export_segments(video_path, output_dir, base_filename, split_points)
+
+        clips = []
+        for i, output_path in zip(selected, output_paths):
+            start_time = split_points[i]
+            end_time = split_points[i + 1]
+
+            # Add clip info to the list
+            clips.append({
+                "path": output_path,
+                "duration": end_time - start_time,
+                "start_time": start_time,
+                "end_time": end_time,
+                "index": i + 1
+            })
 
         logger.info(f"Created {len(clips)} clips")
 
@@ -270,7 +1082,8 @@ def split_video(video_path: str,
                 "original_video": video_path,
                 "output_dir": output_dir,
                 "total_duration": video_duration,
-                "num_clips": len(clips)
+                "num_clips": len(clips),
+                "mode": mode
             }
         }
 
@@ -11,6 +11,7 @@ from typing import Dict, List, Any, Optional
 
 from .factory import TextGeneratorFactory
 from .text_generator import TextGenerator
+from .model_registry import model_registry
 import cv2
 import numpy as np
 import base64
@@ -44,10 +45,10 @@ def advanced_frame_caption(image_bytes):
         logger.warning("BLIP not available: skipping local frame captioning.")
         return ""
     try:
-        from transformers import pipeline
-        blip = pipeline('image-to-text', model='Salesforce/blip-image-captioning-base')
         img = Image.open(io.BytesIO(image_bytes)).convert('RGB')
-        result = blip(img)
+        # The model is loaded once per process and shared between clips
+        with model_registry.use('blip') as blip:
+            result = blip(img)
         caption = result[0]['generated_text'] if result and 'generated_text' in result[0] else ''
         logger.info(f"BLIP caption: {caption}")
         return caption
@@ -331,7 +332,7 @@ def process_clip(
 
         # After hashtags are generated, ensure they all start with #
         if hashtags:
-            hashtags = [tag if tag.startswith('#') else f'#{tag.lstrip('#')}' for tag in hashtags]
+            hashtags = [tag if tag.startswith('#') else '#' + tag.lstrip('#') for tag in hashtags]
 
         # Filter similar captions
         captions = filter_similar_captions(captions)
@@ -0,0 +1,198 @@
+"""
+Process-wide registry of local models used by the text generator.
+
+Models are loaded the first time they are used and then shared by every
+caller in the process, so a worker pays the load cost once instead of on
+each frame. A background sweeper unloads models that have been idle for
+MODEL_IDLE_SECONDS, and least recently used models early when available
+memory drops below MODEL_MIN_AVAILABLE_MB. A model that is in use is never
+unloaded.
+"""
+
+import gc
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, Optional
+
+import psutil
+
+# Configure logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+# Define constants
+MODEL_IDLE_SECONDS = float(os.getenv('MODEL_IDLE_SECONDS', 900))  # Unload models unused for this long
+MODEL_MIN_AVAILABLE_MB = float(os.getenv('MODEL_MIN_AVAILABLE_MB', 1024))  # Unload early below this free memory
+MODEL_SWEEP_INTERVAL = 60  # Seconds between eviction checks
+BLIP_MODEL_NAME = os.getenv('BLIP_MODEL_NAME', 'Salesforce/blip-image-captioning-base')
+
+
+class _Entry:
+    """A registered model and its usage state."""
+
+    def __init__(self, loader: Callable[[], Any]):
+        self.loader = loader
+        self.model = None
+        self.in_use = 0
+        self.last_used = 0.0
+        self.lock = threading.Lock()
+
+
+class ModelRegistry:
+    """Lazily loaded models shared by all threads of one process."""
+
+    def __init__(self,
+                 idle_seconds: float = MODEL_IDLE_SECONDS,
+                 min_available_mb: float = MODEL_MIN_AVAILABLE_MB,
+                 sweep_interval: float = MODEL_SWEEP_INTERVAL):
+        self.idle_seconds = idle_seconds
+        self.min_available_bytes = min_available_mb * 1024 ** 2
+        self.sweep_interval = sweep_interval
+        self._entries: Dict[str, _Entry] = {}
+        self._lock = threading.Lock()
+        self._sweeper_pid = None
+
+    def register(self, name: str, loader: Callable[[], Any]) -> None:
+        """
+        Register how to load a model. Nothing is loaded until the model is used.
+
+        Args:
+            name: Name the model is requested by
+            loader: Function returning the loaded model
+        """
+        with self._lock:
+            self._entries[name] = _Entry(loader)
+
+    def _entry(self, name: str) -> _Entry:
+        with self._lock:
+            if name not in self._entries:
+                raise KeyError(f"Unknown model: {name}")
+            return self._entries[name]
+
+    def is_loaded(self, name: str) -> bool:
+        return self._entry(name).model is not None
+
+    @contextmanager
+    def use(self, name: str) -> Iterator[Any]:
+        """
+        Borrow a model, loading it on first use. The model is not unloaded while borrowed.
+
+        Args:
+            name: Name of a registered model
+
+        Yields:
+            The loaded model
+        """
+        entry = self._entry(name)
+        with entry.lock:
+            if entry.model is None:
+                start = time.time()
+                entry.model = entry.loader()
+                logger.info(f"Loaded model {name} in {time.time() - start:.1f}s")
+                self._start_sweeper()
+            entry.in_use += 1
+        try:
+            yield entry.model
+        finally:
+            with entry.lock:
+                entry.in_use -= 1
+                entry.last_used = time.monotonic()
+
+    def warm_up(self, *names: str) -> None:
+        """
+        Load models ahead of their first use, e.g. when a worker process starts.
+
+        Args:
+            names: Names of registered models to load
+        """
+        for name in names:
+            try:
+                with self.use(name):
+                    pass
+            except Exception as e:
+                logger.error(f"Failed to warm up model {name}: {e}")
+
+    def evict(self, name: str) -> bool:
+        """
+        Unload a model unless it is in use.
+
+        Args:
+            name: Name of a registered model
+
+        Returns:
+            True if the model was unloaded
+        """
+        entry = self._entry(name)
+        with entry.lock:
+            if entry.model is None or entry.in_use:
+                return False
+            entry.model = None
+        self._release_memory()
+        logger.info(f"Unloaded model {name}")
+        return True
+
+    def evict_idle(self, now: Optional[float] = None) -> int:
+        """
+        Unload models idle for longer than idle_seconds, then, while available
+        memory is below the minimum, the least recently used of the rest.
+
+        Args:
+            now: Current time.monotonic() value (default: now)
+
+        Returns:
+            Number of models unloaded
+        """
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            loaded = sorted(((entry.last_used, name) for name, entry in self._entries.items()
+                             if entry.model is not None))
+
+        evicted = 0
+        for last_used, name in loaded:
+            if now - last_used >= self.idle_seconds and self.evict(name):
+                evicted += 1
+            elif psutil.virtual_memory().available < self.min_available_bytes and self.evict(name):
+                logger.warning(f"Unloaded model {name} early: available memory is low")
+                evicted += 1
+        return evicted
+
+    def _release_memory(self) -> None:
+        gc.collect()
+        try:
+            import torch
+            if torch.cuda.is_available():
+                torch.cuda.empty_cache()
+        except ImportError:
+            pass
+
+    def _start_sweeper(self) -> None:
+        # One sweeper thread per process; a forked child starts its own
+        with self._lock:
+            if self._sweeper_pid == os.getpid():
+                return
+            self._sweeper_pid = os.getpid()
+        thread = threading.Thread(target=self._sweep, name="model-registry-sweeper", daemon=True)
+        thread.start()
+
+    def _sweep(self) -> None:
+        while True:
+            time.sleep(self.sweep_interval)
+            try:
+                self.evict_idle()
+            except Exception as e:
+                logger.error(f"Model eviction failed: {e}")
+
+
+def _load_blip():
+    from transformers import pipeline
+    return pipeline('image-to-text', model=BLIP_MODEL_NAME)
+
+
+model_registry = ModelRegistry()
+model_registry.register('blip', _load_blip)
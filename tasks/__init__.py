@@ -9,9 +9,11 @@ __version__ = '1.0.0'
 # All available tasks
 __all__ = [
     # Video Processing Tasks
+    'detect_watermarks',
     'remove_watermark',
     'enhance_video',
     'compress_video',
+    'transcode_ladder',
     'cleanup_processed_files',
 
     # Social Media Tasks
@@ -0,0 +1,114 @@
+"""
+Segment-level checkpoints for long-running video jobs.
+
+A job split into keyframe-aligned segments keeps each encoded segment on disk
+next to a small JSON manifest. When the job is retried or re-submitted with
+the same parameters, segments recorded as complete are reused, so a failure
+late in a long video only costs the segment that was in progress.
+"""
+
+import json
+import os
+import shutil
+from typing import Dict, List, Optional, Tuple
+
+from celery.utils.log import get_task_logger
+
+logger = get_task_logger(__name__)
+
+MANIFEST_NAME = 'manifest.json'
+
+
+def get_checkpoint_dir(output_path: str) -> str:
+    """Checkpoint directory for a job, derived from its output path."""
+    directory, filename = os.path.split(os.path.abspath(output_path))
+    return os.path.join(directory, f".{filename}.checkpoint")
+
+
+class JobCheckpoint:
+    """Tracks the completed segments of one job in a JSON manifest."""
+
+    def __init__(self, checkpoint_dir: str, params: Dict):
+        self.checkpoint_dir = checkpoint_dir
+        self.manifest_path = os.path.join(checkpoint_dir, MANIFEST_NAME)
+        # Round-trip through JSON so the comparison with a loaded manifest is exact
+        self.params = json.loads(json.dumps(params, sort_keys=True))
+        self.segments: List[Tuple[int, int]] = []
+        self.completed = set()
+        self.resumed = False
+
+    def start(self, segments: List[Tuple[int, int]]) -> List[Tuple[int, int]]:
+        """
+        Resume from an existing manifest for the same job, or start afresh.
+
+        Args:
+            segments: Segment plan to use when there is nothing to resume
+
+        Returns:
+            The segment plan in effect (the stored one when resuming)
+        """
+        manifest = self._load_manifest()
+        if manifest and manifest.get('params') == self.params:
+            self.segments = [tuple(segment) for segment in manifest['segments']]
+            self.completed = {
+                index for index in manifest.get('completed', [])
+                if os.path.exists(self.segment_path(index))
+            }
+            self.resumed = bool(self.completed)
+            if self.resumed:
+                logger.info(f"Resuming from checkpoint: {len(self.completed)}/{len(self.segments)} "
+                            f"segments done, last completed frame {self.last_completed_frame}")
+        else:
+            # Different job or no manifest: anything left over is stale
+            shutil.rmtree(self.checkpoint_dir, ignore_errors=True)
+            self.segments = list(segments)
+            self.completed = set()
+
+        os.makedirs(self.checkpoint_dir, exist_ok=True)
+        self._save_manifest()
+        return self.segments
+
+    def segment_path(self, index: int) -> str:
+        return os.path.join(self.checkpoint_dir, f"segment_{index:04d}.mp4")
+
+    def is_complete(self, index: int) -> bool:
+        return index in self.completed
+
+    def mark_complete(self, index: int) -> None:
+        """Record a segment whose file has been fully written."""
+        self.completed.add(index)
+        self._save_manifest()
+
+    @property
+    def last_completed_frame(self) -> int:
+        """End frame of the longest run of completed segments from the start."""
+        last_frame = 0
+        for index, (_, end_frame) in enumerate(self.segments):
+            if index not in self.completed:
+                break
+            last_frame = end_frame
+        return last_frame
+
+    def cleanup(self) -> None:
+        """Remove the checkpoint once the job's output is complete."""
+        shutil.rmtree(self.checkpoint_dir, ignore_errors=True)
+
+    def _load_manifest(self) -> Optional[Dict]:
+        try:
+            with open(self.manifest_path, 'r') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _save_manifest(self) -> None:
+        manifest = {
+            'params': self.params,
+            'segments': [list(segment) for segment in self.segments],
+            'completed': sorted(self.completed),
+            'last_completed_frame': self.last_completed_frame
+        }
+        # Write-then-rename so a crash never leaves a truncated manifest
+        temp_path = f"{self.manifest_path}.tmp"
+        with open(temp_path, 'w') as f:
+            json.dump(manifest, f, indent=2)
+        os.replace(temp_path, self.manifest_path)
@@ -0,0 +1,463 @@
+"""
+ffmpeg helpers shared by the video processing tasks.
+"""
+
+import os
+import re
+import shutil
+import tempfile
+import ffmpeg
+import numpy as np
+from celery.utils.log import get_task_logger
+from typing import Dict, List, Optional, Tuple
+
+from .media_probe import probe_media
+
+logger = get_task_logger(__name__)
+
+DEFAULT_CRF = 20
+DEFAULT_PRESET = 'medium'
+DEFAULT_AUDIO_BITRATE = '128k'
+
+SCALERS = ('bilinear', 'bicubic', 'lanczos', 'spline', 'area')
+DEFAULT_SCALER = 'lanczos'
+DENOISE_FILTERS = ('hqdn3d', 'nlmeans')
+DEFAULT_SHAKINESS = 5
+DEFAULT_STABILIZE_ACCURACY = 15
+DEFAULT_STABILIZE_SMOOTHING = 15
+
+DEFAULT_CRF_CANDIDATES = (18, 23, 28, 33)
+MAX_CRF = 51
+DEFAULT_QUALITY_SAMPLES = 3
+DEFAULT_SAMPLE_SECONDS = 2.0
+COPYABLE_PIX_FMTS = ('yuv420p', 'yuvj420p')
+QUALITY_METRICS = {
+    'ssim': r'SSIM .*All:([\d.]+)',
+    'psnr': r'PSNR .*average:([\d.]+|inf)',
+}
+
+
+class FrameWriter:
+    """
+    Encode BGR frames to H.264 through a single ffmpeg process.
+
+    Frames are streamed as rawvideo over stdin, and the audio of
+    audio_source (if any) is muxed into the same output, so no intermediate
+    file or second encode is needed. AAC audio is stream-copied; anything an
+    MP4 cannot hold is re-encoded to AAC.
+    """
+
+    def __init__(self, output_path: str, width: int, height: int, fps: float,
+                 audio_source: Optional[str] = None,
+                 crf: int = DEFAULT_CRF,
+                 preset: str = DEFAULT_PRESET,
+                 threads: int = 0):
+        self.output_path = output_path
+
+        video = ffmpeg.input(
+            'pipe:',
+            format='rawvideo',
+            pix_fmt='bgr24',
+            s=f'{width}x{height}',
+            framerate=fps
+        ).video
+        streams = [video]
+        if audio_source:
+            streams.append(ffmpeg.input(audio_source)['a?'])
+
+        output_kwargs = {
+            'vcodec': 'libx264',
+            'pix_fmt': 'yuv420p',
+            'crf': crf,
+            'preset': preset,
+            'movflags': '+faststart',
+            # x264 thread pool size; 0 lets ffmpeg use every core
+            'threads': threads,
+        }
+        if audio_source:
+            output_kwargs.update(mp4_audio_options(audio_source))
+
+        stream = ffmpeg.output(*streams, output_path, **output_kwargs)
+        stream = stream.global_args('-loglevel', 'error', '-nostats').overwrite_output()
+        self.process = stream.run_async(pipe_stdin=True, pipe_stderr=True)
+
+    def write(self, frame: np.ndarray) -> None:
+        """Send one frame to the encoder."""
+        try:
+            self.process.stdin.write(np.ascontiguousarray(frame).data)
+        except BrokenPipeError:
+            # ffmpeg exited early; close() reports its error output
+            self.close()
+            raise
+
+    def close(self) -> None:
+        """Finish encoding and raise if ffmpeg failed."""
+        if self.process.stdin and not self.process.stdin.closed:
+            try:
+                self.process.stdin.close()
+            except BrokenPipeError:
+                pass
+        stderr = self.process.stderr.read() if self.process.stderr else b''
+        returncode = self.process.wait()
+        if returncode != 0:
+            message = stderr.decode('utf-8', errors='replace').strip()
+            raise RuntimeError(f"ffmpeg failed encoding {self.output_path}: {message}")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self.process.kill()
+            self.process.wait()
+        return False
+
+
+def plan_keyframe_segments(keyframe_times: List[float], fps: float, frame_count: int,
+                           parts: int) -> List[Tuple[int, int]]:
+    """
+    Split a video into about `parts` frame ranges that each start on a keyframe.
+
+    Args:
+        keyframe_times: Keyframe timestamps in seconds
+        fps: Frames per second of the video
+        frame_count: Total number of frames
+        parts: Desired number of segments
+
+    Returns:
+        List of (start_frame, end_frame) ranges, end exclusive, covering the video
+    """
+    keyframes = sorted({int(round(t * fps)) for t in keyframe_times if 0 < t * fps < frame_count})
+    starts = [0]
+    for i in range(1, parts):
+        target = frame_count * i / parts
+        if not keyframes:
+            break
+        nearest = min(keyframes, key=lambda k: abs(k - target))
+        if nearest > starts[-1]:
+            starts.append(nearest)
+
+    ends = starts[1:] + [frame_count]
+    return list(zip(starts, ends))
+
+
+def concat_segments(segment_paths: List[str], output_path: str,
+                    audio_source: Optional[str] = None) -> None:
+    """
+    Losslessly join encoded segments with the concat demuxer.
+
+    Args:
+        segment_paths: Segment files in playback order, encoded with identical settings
+        output_path: Path of the joined file
+        audio_source: Optional file whose audio is added to the output (see mp4_audio_options)
+    """
+    list_path = f"{output_path}.segments.txt"
+    with open(list_path, 'w') as f:
+        for path in segment_paths:
+            escaped = os.path.abspath(path).replace("'", "'\\''")
+            f.write(f"file '{escaped}'\n")
+
+    try:
+        streams = [ffmpeg.input(list_path, format='concat', safe=0).video]
+        output_kwargs = {'vcodec': 'copy', 'movflags': '+faststart'}
+        if audio_source:
+            streams.append(ffmpeg.input(audio_source)['a?'])
+            output_kwargs.update(mp4_audio_options(audio_source))
+        stream = ffmpeg.output(*streams, output_path, **output_kwargs)
+        ffmpeg.run(stream.global_args('-loglevel', 'error'), overwrite_output=True, capture_stderr=True)
+    finally:
+        os.remove(list_path)
+
+
+def detect_stabilization(video_path: str, transforms_path: str, shakiness: int = DEFAULT_SHAKINESS,
+                         accuracy: int = DEFAULT_STABILIZE_ACCURACY, threads: int = 0) -> str:
+    """
+    Run the vidstab motion analysis pass, writing its transforms file.
+
+    The file is written under a temporary name and renamed when complete, so
+    a cached transforms file is never a partial one.
+
+    Args:
+        video_path: Path to the video file
+        transforms_path: Where to store the transforms
+        shakiness: How shaky the video is, 1 (little) to 10 (very)
+        accuracy: Detection accuracy, shakiness to 15
+        threads: ffmpeg threads (0 lets ffmpeg decide)
+
+    Returns:
+        transforms_path
+    """
+    os.makedirs(os.path.dirname(transforms_path), exist_ok=True)
+    temp_path = f"{transforms_path}.{os.getpid()}.tmp"
+    stream = (
+        ffmpeg.input(video_path, threads=threads)
+        .video
+        .filter('vidstabdetect', result=temp_path, shakiness=shakiness, accuracy=max(accuracy, shakiness))
+        .output('-', format='null')
+        .global_args('-loglevel', 'error', '-nostats')
+    )
+    try:
+        ffmpeg.run(stream, capture_stderr=True)
+        os.replace(temp_path, transforms_path)
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+    return transforms_path
+
+
+def build_enhance_filters(video, width: Optional[int] = None, scaler: str = DEFAULT_SCALER,
+                          denoise: Optional[str] = None, transforms_path: Optional[str] = None,
+                          smoothing: int = DEFAULT_STABILIZE_SMOOTHING):
+    """
+    Chain the enhancement filters onto a video stream.
+
+    Stabilisation runs first, on the frames the transforms were measured on,
+    then denoising at the source resolution, then scaling.
+
+    Args:
+        video: ffmpeg-python video stream
+        width: Target width, height follows the aspect ratio (optional)
+        scaler: swscale resampler used for scaling
+        denoise: 'hqdn3d' (fast) or 'nlmeans' (slow, stronger), or None
+        transforms_path: vidstab transforms from detect_stabilization (optional)
+        smoothing: Frames on each side used to smooth the camera path
+
+    Returns:
+        The filtered stream
+    """
+    if scaler not in SCALERS:
+        raise ValueError(f"Unknown scaler '{scaler}', expected one of {SCALERS}")
+    if denoise not in (None,) + DENOISE_FILTERS:
+        raise ValueError(f"Unknown denoise filter '{denoise}', expected one of {DENOISE_FILTERS}")
+
+    if transforms_path:
+        video = video.filter('vidstabtransform', input=transforms_path, smoothing=smoothing)
+        # Resampling during stabilisation softens the picture slightly
+        video = video.filter('unsharp', 5, 5, 0.8, 3, 3, 0.4)
+    if denoise:
+        video = video.filter(denoise)
+    if width:
+        video = video.filter('scale', width, -2, flags=scaler)
+    return video
+
+
+def measure_quality(encoded_path: str, reference_path: str, start: float, duration: float,
+                    metric: str = 'ssim') -> float:
+    """
+    Compare an encoded sample with the same stretch of its source.
+
+    Args:
+        encoded_path: Encoded sample, starting at the sample's first frame
+        reference_path: Source video
+        start: Start of the sample in the source, in seconds
+        duration: Length of the sample in seconds
+        metric: 'ssim' (0-1) or 'psnr' (dB)
+
+    Returns:
+        The metric averaged over the sample
+    """
+    if metric not in QUALITY_METRICS:
+        raise ValueError(f"Unknown quality metric '{metric}', expected one of {tuple(QUALITY_METRICS)}")
+
+    encoded = ffmpeg.input(encoded_path).video
+    reference = ffmpeg.input(reference_path, ss=start, t=duration).video
+    stream = ffmpeg.filter([encoded, reference], metric).output('-', format='null').global_args('-nostats')
+    _, stderr = ffmpeg.run(stream, capture_stderr=True)
+
+    match = re.search(QUALITY_METRICS[metric], stderr.decode('utf-8', errors='replace'))
+    if not match:
+        raise RuntimeError(f"ffmpeg did not report {metric} for {encoded_path}")
+    return float(match.group(1))
+
+
+def sample_crf_curve(video_path: str, duration: float, crfs: Tuple[int, ...] = DEFAULT_CRF_CANDIDATES,
+                     sample_count: int = DEFAULT_QUALITY_SAMPLES,
+                     sample_seconds: float = DEFAULT_SAMPLE_SECONDS,
+                     preset: str = DEFAULT_PRESET, metric: str = 'ssim',
+                     threads: int = 0) -> List[Dict]:
+    """
+    Encode short samples of a video at several CRFs and measure size and quality.
+
+    Args:
+        video_path: Path to the video file
+        duration: Duration of the video in seconds
+        crfs: Candidate CRF values
+        sample_count: Number of samples spread across the video
+        sample_seconds: Length of each sample
+        preset: x264 preset, the same as the final encode will use
+        metric: Quality metric, 'ssim' or 'psnr'
+        threads: ffmpeg threads (0 lets ffmpeg decide)
+
+    Returns:
+        One dict per CRF, in the order given, with the video bytes per second
+        and the mean quality across samples
+    """
+    if duration <= sample_count * sample_seconds * 2:
+        # Short videos are measured whole
+        samples = [(0.0, duration)]
+    else:
+        # Skip the very start and end, where intros and outros often live
+        starts = np.linspace(0, duration - sample_seconds, sample_count + 2)[1:-1]
+        samples = [(float(start), sample_seconds) for start in starts]
+
+    curve = []
+    temp_dir = tempfile.mkdtemp(prefix='crf_search_')
+    try:
+        for crf in crfs:
+            total_bytes = 0
+            total_seconds = 0.0
+            scores = []
+            for i, (start, length) in enumerate(samples):
+                sample_path = os.path.join(temp_dir, f"crf{crf}_{i}.mp4")
+                stream = ffmpeg.input(video_path, ss=start, t=length).video.output(
+                    sample_path, vcodec='libx264', pix_fmt='yuv420p', crf=crf, preset=preset, threads=threads
+                )
+                ffmpeg.run(stream.global_args('-loglevel', 'error', '-nostats'),
+                           overwrite_output=True, capture_stderr=True)
+                total_bytes += os.path.getsize(sample_path)
+                total_seconds += length
+                scores.append(measure_quality(sample_path, video_path, start, length, metric))
+                os.remove(sample_path)
+
+            curve.append({
+                'crf': crf,
+                'bytes_per_second': total_bytes / max(total_seconds, 1e-6),
+                metric: float(np.mean(scores))
+            })
+    finally:
+        shutil.rmtree(temp_dir, ignore_errors=True)
+    return curve
+
+
+def interpolate_crf(curve: List[Dict], target_bytes_per_second: Optional[float] = None,
+                    target_quality: Optional[float] = None, metric: str = 'ssim') -> float:
+    """
+    Pick the CRF that meets a size target, a quality floor, or both.
+
+    Size is interpolated on a log scale, which is close to linear in CRF.
+    With both targets, the highest CRF meeting both is used; when they
+    conflict, the size target wins.
+
+    Args:
+        curve: Samples from sample_crf_curve
+        target_bytes_per_second: Video bytes per second the output may use (optional)
+        target_quality: Minimum quality score (optional)
+        metric: Quality metric the curve was measured with
+
+    Returns:
+        CRF; quality targets are clamped to the sampled range, size targets
+        are extrapolated beyond it
+    """
+    points = sorted(curve, key=lambda point: point['crf'])
+    crfs = np.array([point['crf'] for point in points], dtype=np.float64)
+
+    candidates = []
+    if target_bytes_per_second:
+        log_sizes = np.log([max(point['bytes_per_second'], 1.0) for point in points])
+        log_target = np.log(max(target_bytes_per_second, 1.0))
+        if log_target < log_sizes[-1] or log_target > log_sizes[0]:
+            # Outside the sampled range: extend the nearest end's slope
+            end = slice(-2, None) if log_target < log_sizes[-1] else slice(0, 2)
+            slope = (log_sizes[end][1] - log_sizes[end][0]) / (crfs[end][1] - crfs[end][0])
+            crf = crfs[end][0] + (log_target - log_sizes[end][0]) / slope
+        else:
+            # Both series fall as CRF rises, np.interp needs them ascending
+            crf = np.interp(log_target, log_sizes[::-1], crfs[::-1])
+        candidates.append(float(np.clip(crf, 0, MAX_CRF)))
+    if target_quality is not None:
+        scores = np.array([point[metric] for point in points])
+        candidates.append(float(np.interp(target_quality, scores[::-1], crfs[::-1])))
+    if not candidates:
+        raise ValueError("A target size or quality is required")
+
+    return max(candidates)
+
+
+def parse_bitrate(bitrate) -> int:
+    """Convert an ffmpeg bitrate such as '128k' or '2.5M' to bits per second."""
+    if isinstance(bitrate, (int, float)):
+        return int(bitrate)
+    value = str(bitrate).strip().lower()
+    multiplier = {'k': 1_000, 'm': 1_000_000}.get(value[-1:], 1)
+    if multiplier > 1:
+        value = value[:-1]
+    return int(float(value) * multiplier)
+
+
+def is_mp4_compatible(probe: Dict) -> Dict[str, bool]:
+    """
+    Check which streams of a probed file can be stream-copied into an H.264/AAC MP4.
+
+    Returns:
+        Dict with 'video' and 'audio' flags (audio is True when there is no audio)
+    """
+    streams = probe.get('streams', [])
+    video = next((s for s in streams if s.get('codec_type') == 'video'), None)
+    audio = [s for s in streams if s.get('codec_type') == 'audio']
+    return {
+        'video': bool(video) and video.get('codec_name') == 'h264' and video.get('pix_fmt') in COPYABLE_PIX_FMTS,
+        'audio': all(s.get('codec_name') == 'aac' for s in audio)
+    }
+
+
+def mp4_audio_options(audio_source: str, audio_bitrate: str = DEFAULT_AUDIO_BITRATE) -> Dict[str, str]:
+    """
+    Output options that put the audio of a source into an MP4.
+
+    AAC is stream-copied; other codecs (Vorbis, Opus, PCM, ...) would fail
+    at mux time and are re-encoded to AAC instead.
+
+    Args:
+        audio_source: File whose audio streams are muxed into the output
+        audio_bitrate: AAC bitrate used when the audio is re-encoded
+
+    Returns:
+        ffmpeg output keyword arguments for the audio
+    """
+    if is_mp4_compatible(probe_media(audio_source).raw)['audio']:
+        return {'acodec': 'copy'}
+    return {'acodec': 'aac', 'audio_bitrate': audio_bitrate}
+
+
+def choose_compress_path(probe: Dict, source_path: str, target_size_bytes: Optional[float],
+                         audio_bitrate: int) -> str:
+    """
+    Pick the cheapest operation that turns a source into an H.264/AAC MP4 within a size.
+
+    Args:
+        probe: ffprobe output for the source (streams and format)
+        source_path: Path of the source, whose extension tells MP4s apart from MOVs
+        target_size_bytes: Maximum output size; None means no size to meet
+        audio_bitrate: Bitrate an audio re-encode would use, in bits per second
+
+    Returns:
+        'link' (source is already suitable), 'remux' (copy streams into MP4),
+        'audio' (copy video, re-encode audio) or 'transcode'
+    """
+    if not target_size_bytes:
+        return 'transcode'
+
+    compatible = is_mp4_compatible(probe)
+    if not compatible['video']:
+        return 'transcode'
+
+    size = int(probe['format'].get('size', 0)) or os.path.getsize(source_path)
+    if compatible['audio'] and size <= target_size_bytes:
+        is_mp4 = 'mp4' in probe['format'].get('format_name', '') and source_path.lower().endswith('.mp4')
+        return 'link' if is_mp4 else 'remux'
+
+    # Keep the video if it fits once the audio is re-encoded at the target bitrate
+    duration = float(probe['format']['duration'])
+    streams = probe.get('streams', [])
+    video = next(s for s in streams if s.get('codec_type') == 'video')
+    has_audio = any(s.get('codec_type') == 'audio' for s in streams)
+    video_bitrate = int(video.get('bit_rate') or 0)
+    if not video_bitrate:
+        audio_bits = sum(int(s.get('bit_rate') or 0) for s in streams if s.get('codec_type') == 'audio')
+        video_bitrate = int(probe['format'].get('bit_rate') or 0) - audio_bits
+    if has_audio and video_bitrate > 0 and (video_bitrate + audio_bitrate) * duration / 8 <= target_size_bytes:
+        return 'audio'
+
+    return 'transcode'
@@ -0,0 +1,134 @@
+"""
+Threaded frame pipeline: reader -> N processing workers -> ordered writer.
+
+Decoding (cv2.VideoCapture.read), OpenCV processing and writing to the
+encoder pipe all release the GIL, so running them on separate threads lets
+them overlap without the memory cost of extra processes. Stages are joined
+by bounded queues, whose depth caps the number of frames in flight.
+"""
+
+import queue
+import threading
+from typing import Callable, List, Optional
+
+import numpy as np
+
+DEFAULT_QUEUE_DEPTH = 8
+
+_DONE = object()
+
+
+def run_frame_pipeline(read_frame: Callable[[], Optional[np.ndarray]],
+                       make_processor: Callable[[], Callable[[np.ndarray], List[np.ndarray]]],
+                       write_frame: Callable[[np.ndarray], None],
+                       workers: int = 2,
+                       queue_depth: int = DEFAULT_QUEUE_DEPTH,
+                       max_frames: Optional[int] = None,
+                       on_progress: Optional[Callable[[int], None]] = None,
+                       progress_interval: int = 30) -> int:
+    """
+    Run frames through reader, worker and writer stages concurrently.
+
+    Args:
+        read_frame: Returns the next frame, or None at the end of the input
+        make_processor: Called once per worker thread; returns a callable that
+            takes a frame and returns the frames ready for writing (in order)
+        write_frame: Consumes processed frames; always called from the calling thread
+        workers: Number of processing threads
+        queue_depth: Maximum number of frames waiting between two stages
+        max_frames: Stop reading after this many frames (optional)
+        on_progress: Called with the number of frames written every progress_interval frames
+        progress_interval: Frames between progress callbacks
+
+    Returns:
+        Number of frames read
+    """
+    workers = max(1, workers)
+    read_queue = queue.Queue(maxsize=queue_depth)
+    write_queue = queue.Queue(maxsize=queue_depth)
+    stop = threading.Event()
+    errors = []
+    frames_read = [0]
+
+    def put(target, item):
+        # Give up instead of blocking forever once another stage has failed
+        while not stop.is_set():
+            try:
+                target.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def reader():
+        try:
+            while not stop.is_set() and (max_frames is None or frames_read[0] < max_frames):
+                frame = read_frame()
+                if frame is None:
+                    break
+                if not put(read_queue, (frames_read[0], frame)):
+                    return
+                frames_read[0] += 1
+        except Exception as e:
+            errors.append(e)
+            stop.set()
+        finally:
+            for _ in range(workers):
+                put(read_queue, _DONE)
+
+    def worker():
+        try:
+            process = make_processor()
+            while not stop.is_set():
+                try:
+                    item = read_queue.get(timeout=0.1)
+                except queue.Empty:
+                    continue
+                if item is _DONE:
+                    break
+                index, frame = item
+                if not put(write_queue, (index, process(frame))):
+                    return
+        except Exception as e:
+            errors.append(e)
+            stop.set()
+        finally:
+            put(write_queue, _DONE)
+
+    threads = [threading.Thread(target=reader, name='frame-reader', daemon=True)]
+    threads += [threading.Thread(target=worker, name=f'frame-worker-{i}', daemon=True) for i in range(workers)]
+    for thread in threads:
+        thread.start()
+
+    # Ordered writer: results may arrive out of order from several workers
+    pending = {}
+    next_index = 0
+    finished_workers = 0
+    try:
+        while finished_workers < workers and not stop.is_set():
+            try:
+                item = write_queue.get(timeout=0.1)
+            except queue.Empty:
+                continue
+            if item is _DONE:
+                finished_workers += 1
+                continue
+
+            index, ready = item
+            pending[index] = ready
+            while next_index in pending:
+                for frame in pending.pop(next_index):
+                    write_frame(frame)
+                next_index += 1
+                if on_progress and next_index % progress_interval == 0:
+                    on_progress(next_index)
+    finally:
+        # Unblocks the other stages if the writer failed; a no-op otherwise
+        stop.set()
+        for thread in threads:
+            thread.join()
+
+    if errors:
+        raise errors[0]
+
+    return frames_read[0]
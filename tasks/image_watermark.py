@@ -0,0 +1,192 @@
+"""
+Batched watermark removal for still images.
+
+Images are grouped by size so that the regions (detected or supplied) and the
+compiled inpainting masks are shared by every image of the same layout.
+Decoding, inpainting and encoding run on a thread pool; Pillow's codecs and
+cv2.inpaint release the GIL, so the stages overlap across images. Images are
+decoded and saved with Pillow, which keeps their EXIF and ICC data intact.
+"""
+
+import os
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple
+
+import cv2
+import numpy as np
+from PIL import Image
+from celery.utils.log import get_task_logger
+
+from .watermark import (DEFAULT_ANALYSIS_WIDTH, DEFAULT_SAMPLE_COUNT, WatermarkEngine,
+                        detect_regions_in_frames)
+
+logger = get_task_logger(__name__)
+
+DEFAULT_IMAGE_WORKERS = 4
+DEFAULT_JPEG_QUALITY = 95
+
+
+def get_output_path(image_path: str, output_dir: Optional[str] = None) -> str:
+    """Output path for a processed image: <name>_processed<ext>, next to the input by default."""
+    directory, filename = os.path.split(image_path)
+    stem, ext = os.path.splitext(filename)
+    return os.path.join(output_dir or directory, f"{stem}_processed{ext}")
+
+
+def _read_size(image_path: str) -> Tuple[int, int]:
+    # Only the header is parsed here; pixel data is decoded later
+    with Image.open(image_path) as image:
+        return image.size
+
+
+def _load_analysis_sample(image_path: str, analysis_width: int) -> np.ndarray:
+    with Image.open(image_path) as image:
+        grey = np.asarray(image.convert('L'))
+    scale = min(1.0, analysis_width / grey.shape[1])
+    size = (max(1, int(round(grey.shape[1] * scale))), max(1, int(round(grey.shape[0] * scale))))
+    return cv2.resize(grey, size, interpolation=cv2.INTER_AREA)
+
+
+def detect_image_regions(image_paths: List[str], size: Tuple[int, int], pool: ThreadPoolExecutor,
+                         platform: Optional[str] = None,
+                         sample_count: int = DEFAULT_SAMPLE_COUNT,
+                         analysis_width: int = DEFAULT_ANALYSIS_WIDTH) -> List[Dict]:
+    """
+    Detect the watermark regions shared by a group of same-size images.
+
+    Args:
+        image_paths: Images with the same dimensions, e.g. downloads from one platform
+        size: Their (width, height)
+        pool: Thread pool used to decode the samples
+        platform: Platform name used to pick logo templates (optional)
+        sample_count: Maximum number of images sampled
+        analysis_width: Width the samples are downscaled to
+
+    Returns:
+        List of region dicts at full resolution
+    """
+    picks = np.unique(np.linspace(0, len(image_paths) - 1, min(sample_count, len(image_paths))).astype(int))
+    samples = list(pool.map(lambda i: _load_analysis_sample(image_paths[i], analysis_width), picks))
+    frames = np.stack(samples)
+    scale = size[0] / frames.shape[2]
+    return detect_regions_in_frames(frames, scale, size, platform=platform)
+
+
+def remove_image_watermarks(image_paths: List[str], regions: Optional[List[Dict]] = None,
+                            platform: Optional[str] = None,
+                            output_dir: Optional[str] = None,
+                            workers: int = DEFAULT_IMAGE_WORKERS,
+                            quality: int = DEFAULT_JPEG_QUALITY) -> Dict:
+    """
+    Remove watermarks from a batch of images.
+
+    Args:
+        image_paths: Paths of the images to process
+        regions: Regions shared by every image; detected per size group when empty or None
+        platform: Source platform, used to pick logo templates for detection (optional)
+        output_dir: Directory for the processed images (defaults to next to each input)
+        workers: Threads decoding, inpainting and encoding images
+        quality: JPEG/WebP quality of the outputs
+
+    Returns:
+        Dict with the processed images, failures and throughput figures
+    """
+    start_time = time.time()
+    if output_dir:
+        os.makedirs(output_dir, exist_ok=True)
+
+    results = []
+    failed = []
+    pixels = 0
+
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        # Group by size so each group shares its regions and compiled masks
+        groups = defaultdict(list)
+        for image_path, size in zip(image_paths, pool.map(_capture(_read_size), image_paths)):
+            if isinstance(size, Exception):
+                failed.append({'input_path': image_path, 'error': str(size)})
+            else:
+                groups[size].append(image_path)
+
+        for (width, height), paths in groups.items():
+            group_regions = regions
+            if not group_regions:
+                group_regions = detect_image_regions(paths, (width, height), pool, platform=platform)
+                logger.info(f"Detected {len(group_regions)} watermark regions for {len(paths)} "
+                            f"{width}x{height} images")
+
+            # Engines reuse their buffers, so each thread gets its own per group
+            local = threading.local()
+
+            def process(image_path, width=width, height=height, group_regions=group_regions, local=local):
+                if not hasattr(local, 'engine'):
+                    local.engine = WatermarkEngine(group_regions, width, height)
+                output_path = get_output_path(image_path, output_dir)
+                _process_image(image_path, output_path, local.engine, quality)
+                return output_path
+
+            for image_path, outcome in zip(paths, pool.map(_capture(process), paths)):
+                if isinstance(outcome, Exception):
+                    logger.error(f"Error processing image {image_path}: {str(outcome)}")
+                    failed.append({'input_path': image_path, 'error': str(outcome)})
+                else:
+                    results.append({
+                        'input_path': image_path,
+                        'output_path': outcome,
+                        'regions': group_regions
+                    })
+                    pixels += width * height
+
+    elapsed = time.time() - start_time
+    return {
+        'images': results,
+        'failed': failed,
+        'throughput': {
+            'images': len(results),
+            'seconds': round(elapsed, 3),
+            'images_per_second': round(len(results) / elapsed, 2) if elapsed > 0 else 0.0,
+            'megapixels_per_second': round(pixels / 1e6 / elapsed, 2) if elapsed > 0 else 0.0
+        }
+    }
+
+
+def _process_image(image_path: str, output_path: str, engine: WatermarkEngine, quality: int) -> None:
+    with Image.open(image_path) as image:
+        save_kwargs = {}
+        for key in ('exif', 'icc_profile', 'dpi'):
+            if key in image.info:
+                save_kwargs[key] = image.info[key]
+        image_format = image.format
+        mode = image.mode
+
+        # Inpaint the colour channels; an alpha channel is carried over untouched
+        rgb = np.array(image.convert('RGB'))
+        alpha = image.getchannel('A') if 'A' in image.getbands() else None
+
+    engine.process(rgb)
+
+    result = Image.fromarray(rgb)
+    if alpha is not None:
+        result.putalpha(alpha)
+    elif mode == 'L':
+        result = result.convert('L')
+    if result.mode != mode:
+        # The source's ICC profile describes its old colour space (e.g. CMYK), not the new one
+        save_kwargs.pop('icc_profile', None)
+
+    if image_format in ('JPEG', 'WEBP'):
+        save_kwargs['quality'] = quality
+    result.save(output_path, format=image_format, **save_kwargs)
+
+
+def _capture(func):
+    # Return exceptions instead of raising so one bad image does not abort the batch
+    def wrapper(*args):
+        try:
+            return func(*args)
+        except Exception as e:
+            return e
+    return wrapper
@@ -0,0 +1,82 @@
+"""
+Persistent cache of watermark regions and masks.
+
+Videos from the same platform at the same resolution carry their watermark in
+the same few places, so detected or user-drawn regions are kept in Redis keyed
+by (platform, width, height, layout signature). Masks are stored as
+zlib-compressed packed bitmaps and the least recently used entries are
+evicted once the cache grows past its size limit.
+"""
+
+import json
+import os
+import time
+import zlib
+from typing import Dict, List, Optional
+
+import numpy as np
+import redis
+from celery.utils.log import get_task_logger
+
+logger = get_task_logger(__name__)
+
+DEFAULT_MAX_ENTRIES = 500
+
+
+class WatermarkMaskCache:
+    """Redis-backed LRU cache of watermark regions and packed masks."""
+
+    def __init__(self, redis_client=None, max_entries: int = DEFAULT_MAX_ENTRIES):
+        self.redis = redis_client or redis.from_url(os.getenv('REDIS_URL', 'redis://localhost:6379/0'))
+        self.max_entries = max_entries
+        self.prefix = 'watermark_mask:'
+        self.lru_key = f"{self.prefix}lru"
+
+    def _get_key(self, platform: Optional[str], width: int, height: int, layout: str) -> str:
+        return f"{self.prefix}{(platform or 'unknown').lower()}:{width}x{height}:{layout}"
+
+    def get(self, platform: Optional[str], width: int, height: int, layout: str) -> Optional[Dict]:
+        """
+        Look up cached regions and mask.
+
+        Returns:
+            Dict with 'regions' and 'mask' (uint8 array, 255 = watermark), or None
+        """
+        try:
+            key = self._get_key(platform, width, height, layout)
+            entry = self.redis.hgetall(key)
+            if not entry:
+                return None
+
+            packed = np.frombuffer(zlib.decompress(entry[b'mask']), dtype=np.uint8)
+            mask = np.unpackbits(packed, count=width * height).reshape(height, width) * np.uint8(255)
+
+            self.redis.zadd(self.lru_key, {key: time.time()})
+            logger.info(f"Watermark mask cache hit for {key}")
+            return {
+                'regions': json.loads(entry[b'regions']),
+                'mask': mask
+            }
+        except Exception as e:
+            logger.warning(f"Failed to read watermark mask cache: {str(e)}")
+            return None
+
+    def put(self, platform: Optional[str], width: int, height: int, layout: str,
+            regions: List[Dict], mask: np.ndarray) -> None:
+        """Store regions and their full-frame mask, evicting the least recently used entries."""
+        try:
+            key = self._get_key(platform, width, height, layout)
+            packed = zlib.compress(np.packbits(mask > 0).tobytes())
+
+            pipe = self.redis.pipeline()
+            pipe.hset(key, mapping={'regions': json.dumps(regions), 'mask': packed})
+            pipe.zadd(self.lru_key, {key: time.time()})
+            pipe.execute()
+
+            overflow = self.redis.zcard(self.lru_key) - self.max_entries
+            if overflow > 0:
+                evicted = [k for k, _ in self.redis.zpopmin(self.lru_key, overflow)]
+                self.redis.delete(*evicted)
+                logger.info(f"Evicted {len(evicted)} watermark mask cache entries")
+        except Exception as e:
+            logger.warning(f"Failed to write watermark mask cache: {str(e)}")
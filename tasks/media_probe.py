@@ -0,0 +1,262 @@
+"""
+Cached ffprobe results shared by every module that inspects media files.
+
+A file is probed once per (path, size, mtime): results are kept in process
+and in a small SQLite database, so the splitter, the processing tasks and
+the routes all read duration, streams, codecs and dimensions without
+opening the container or initialising a decoder again. The keyframe index,
+which needs a scan over every packet, is only built when asked for and is
+cached alongside the rest.
+"""
+
+import json
+import os
+import sqlite3
+import tempfile
+import threading
+from collections import OrderedDict
+from fractions import Fraction
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import ffmpeg
+from celery.utils.log import get_task_logger
+
+logger = get_task_logger(__name__)
+
+PROBE_CACHE_DB = Path(os.getenv('PROBE_CACHE_DB', Path(tempfile.gettempdir()) / 'watermark_remover_cache' / 'media_probe.db'))
+
+MEMORY_CACHE_SIZE = 512  # Probes kept in process; older ones are re-read from SQLite
+
+_probes: 'OrderedDict[Tuple[str, int, int], MediaInfo]' = OrderedDict()
+_lock = threading.Lock()
+
+
+def _parse_int(value) -> Optional[int]:
+    try:
+        return int(float(value))
+    except (TypeError, ValueError):
+        return None
+
+
+def _parse_rate(value) -> float:
+    try:
+        return float(Fraction(value))
+    except (TypeError, ValueError, ZeroDivisionError):
+        return 0.0
+
+
+class MediaInfo:
+    """Typed view of an ffprobe result for one file."""
+
+    def __init__(self, path: str, probe: Dict, keyframe_times: Optional[List[float]] = None):
+        self.path = path
+        self.raw = probe
+        self.keyframe_times = keyframe_times
+
+        self.format = probe.get('format', {})
+        self.streams = probe.get('streams', [])
+        self.video = next((s for s in self.streams if s.get('codec_type') == 'video'), None)
+        self.audio = next((s for s in self.streams if s.get('codec_type') == 'audio'), None)
+
+    @property
+    def duration(self) -> float:
+        """Container duration in seconds, falling back to the video stream's."""
+        duration = self.format.get('duration') or (self.video or {}).get('duration')
+        try:
+            return float(duration)
+        except (TypeError, ValueError):
+            return 0.0
+
+    @property
+    def size_bytes(self) -> Optional[int]:
+        return _parse_int(self.format.get('size'))
+
+    @property
+    def bit_rate(self) -> Optional[int]:
+        """Overall bitrate in bits per second."""
+        return _parse_int(self.format.get('bit_rate'))
+
+    @property
+    def video_bit_rate(self) -> Optional[int]:
+        return _parse_int((self.video or {}).get('bit_rate'))
+
+    @property
+    def audio_bit_rate(self) -> Optional[int]:
+        return _parse_int((self.audio or {}).get('bit_rate'))
+
+    @property
+    def video_codec(self) -> Optional[str]:
+        return (self.video or {}).get('codec_name')
+
+    @property
+    def audio_codec(self) -> Optional[str]:
+        return (self.audio or {}).get('codec_name')
+
+    @property
+    def has_video(self) -> bool:
+        return self.video is not None
+
+    @property
+    def has_audio(self) -> bool:
+        return self.audio is not None
+
+    @property
+    def fps(self) -> float:
+        if not self.video:
+            return 0.0
+        return _parse_rate(self.video.get('avg_frame_rate')) or _parse_rate(self.video.get('r_frame_rate'))
+
+    @property
+    def frame_count(self) -> int:
+        if not self.video:
+            return 0
+        return _parse_int(self.video.get('nb_frames')) or int(round(self.duration * self.fps))
+
+    @property
+    def rotation(self) -> int:
+        """Display rotation in degrees (0, 90, 180 or 270)."""
+        if not self.video:
+            return 0
+        for side_data in self.video.get('side_data_list', []):
+            if 'rotation' in side_data:
+                return int(round(float(side_data['rotation']))) % 360
+        return int(self.video.get('tags', {}).get('rotate', 0)) % 360
+
+    @property
+    def width(self) -> int:
+        """Coded frame width."""
+        return int((self.video or {}).get('width', 0))
+
+    @property
+    def height(self) -> int:
+        """Coded frame height."""
+        return int((self.video or {}).get('height', 0))
+
+    @property
+    def display_size(self) -> Tuple[int, int]:
+        """(width, height) as the video is shown, after rotation."""
+        if self.rotation in (90, 270):
+            return self.height, self.width
+        return self.width, self.height
+
+
+def _connect() -> sqlite3.Connection:
+    PROBE_CACHE_DB.parent.mkdir(parents=True, exist_ok=True)
+    conn = sqlite3.connect(str(PROBE_CACHE_DB), timeout=30)
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS probes (
+            path TEXT PRIMARY KEY,
+            size INTEGER NOT NULL,
+            mtime_ns INTEGER NOT NULL,
+            probe TEXT NOT NULL,
+            keyframes TEXT
+        )
+    ''')
+    return conn
+
+
+def _load(identity: Tuple[str, int, int]) -> Optional[MediaInfo]:
+    path, size, mtime_ns = identity
+    try:
+        conn = _connect()
+        try:
+            row = conn.execute('SELECT probe, keyframes FROM probes WHERE path = ? AND size = ? AND mtime_ns = ?',
+                               (path, size, mtime_ns)).fetchone()
+        finally:
+            conn.close()
+    except sqlite3.Error as e:
+        logger.warning(f"Failed to read probe cache: {str(e)}")
+        return None
+    if not row:
+        return None
+    return MediaInfo(path, json.loads(row[0]), json.loads(row[1]) if row[1] else None)
+
+
+def _store(identity: Tuple[str, int, int], info: MediaInfo) -> None:
+    path, size, mtime_ns = identity
+    try:
+        conn = _connect()
+        try:
+            with conn:
+                conn.execute('INSERT OR REPLACE INTO probes (path, size, mtime_ns, probe, keyframes) '
+                             'VALUES (?, ?, ?, ?, ?)',
+                             (path, size, mtime_ns, json.dumps(info.raw),
+                              json.dumps(info.keyframe_times) if info.keyframe_times is not None else None))
+        finally:
+            conn.close()
+    except sqlite3.Error as e:
+        logger.warning(f"Failed to write probe cache: {str(e)}")
+
+
+def _remember(identity: Tuple[str, int, int], info: MediaInfo) -> None:
+    # Keep the most recently used probes in memory, evicting the oldest
+    with _lock:
+        _probes[identity] = info
+        _probes.move_to_end(identity)
+        while len(_probes) > MEMORY_CACHE_SIZE:
+            _probes.popitem(last=False)
+
+
+def _probe_keyframes(path: str) -> List[float]:
+    probe = ffmpeg.probe(
+        path,
+        select_streams='v:0',
+        show_packets=None,
+        show_entries='packet=pts_time,flags'
+    )
+    times = []
+    for packet in probe.get('packets', []):
+        if 'K' in packet.get('flags', '') and packet.get('pts_time') not in (None, 'N/A'):
+            times.append(float(packet['pts_time']))
+    return sorted(times)
+
+
+def probe_media(file_path: str, keyframes: bool = False) -> MediaInfo:
+    """
+    Probe a media file, at most once per (path, size, mtime).
+
+    Args:
+        file_path: Path to the media file
+        keyframes: Also build the keyframe index (scans every packet of the video stream)
+
+    Returns:
+        MediaInfo for the file
+
+    Raises:
+        FileNotFoundError: If the file does not exist
+        ffmpeg.Error: If ffprobe cannot read the file
+    """
+    path = os.path.abspath(file_path)
+    stat = os.stat(path)
+    identity = (path, stat.st_size, stat.st_mtime_ns)
+
+    with _lock:
+        info = _probes.get(identity)
+    if info is None:
+        info = _load(identity)
+    if info is not None and (not keyframes or info.keyframe_times is not None):
+        _remember(identity, info)
+        return info
+
+    if info is None:
+        info = MediaInfo(path, ffmpeg.probe(path))
+    if keyframes:
+        info.keyframe_times = _probe_keyframes(path) if info.has_video else []
+
+    _remember(identity, info)
+    _store(identity, info)
+    return info
+
+
+def get_keyframe_times(video_path: str) -> List[float]:
+    """
+    List the presentation times of the keyframes in the first video stream.
+
+    Args:
+        video_path: Path to the video file
+
+    Returns:
+        Sorted list of keyframe timestamps in seconds
+    """
+    return list(probe_media(video_path, keyframes=True).keyframe_times)
@@ -0,0 +1,225 @@
+"""
+Content-addressed cache of processed video outputs.
+
+A task result is keyed by the sha256 of its input file, the task name, its
+canonicalised parameters and the versions of the tools that produced it, so
+a duplicate submission can be answered by linking the cached artifact to the
+requested output path instead of re-encoding. Artifacts live in a cache
+directory on disk; their metadata and LRU order are kept in Redis, and the
+least recently used artifacts are evicted once the directory exceeds its
+disk budget.
+
+Input hashes are remembered per (path, size, mtime), so a file is only read
+for hashing once, normally when it is ingested.
+"""
+
+import hashlib
+import json
+import os
+import shutil
+import subprocess
+import tempfile
+import time
+from functools import lru_cache
+from pathlib import Path
+from typing import Dict, Optional
+
+import cv2
+import redis
+from celery.utils.log import get_task_logger
+
+logger = get_task_logger(__name__)
+
+RESULT_CACHE_DIR = Path(os.getenv('RESULT_CACHE_DIR', Path(tempfile.gettempdir()) / 'watermark_remover_cache' / 'results'))
+DEFAULT_MAX_BYTES = int(float(os.getenv('RESULT_CACHE_MAX_GB', '20')) * 1024 ** 3)
+HASH_CHUNK_SIZE = 4 * 1024 * 1024
+
+_file_hashes: Dict[tuple, str] = {}
+
+
+def _get_redis():
+    return redis.from_url(os.getenv('REDIS_URL', 'redis://localhost:6379/0'))
+
+
+def get_file_hash(file_path: str, redis_client=None) -> str:
+    """
+    sha256 of a file's contents, computed at most once per (path, size, mtime).
+
+    Known hashes are kept in process and in Redis, so files hashed at ingest
+    are not read again when a task needs their cache key.
+
+    Args:
+        file_path: Path to the file
+        redis_client: Redis client (optional, defaults to REDIS_URL)
+
+    Returns:
+        Hex sha256 digest
+    """
+    path = os.path.abspath(file_path)
+    stat = os.stat(path)
+    identity = (path, stat.st_size, stat.st_mtime_ns)
+    if identity in _file_hashes:
+        return _file_hashes[identity]
+
+    key = f"file_hash:{path}"
+    client = None
+    try:
+        client = redis_client or _get_redis()
+        stored = client.hgetall(key)
+        if stored and stored.get(b'identity', b'').decode() == f"{stat.st_size}:{stat.st_mtime_ns}":
+            digest = stored[b'sha256'].decode()
+            _file_hashes[identity] = digest
+            return digest
+    except Exception as e:
+        logger.warning(f"Failed to read file hash cache: {str(e)}")
+
+    sha256 = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b''):
+            sha256.update(chunk)
+    digest = sha256.hexdigest()
+    _file_hashes[identity] = digest
+
+    if client is not None:
+        try:
+            client.hset(key, mapping={'identity': f"{stat.st_size}:{stat.st_mtime_ns}", 'sha256': digest})
+        except Exception as e:
+            logger.warning(f"Failed to write file hash cache: {str(e)}")
+    return digest
+
+
+@lru_cache(maxsize=1)
+def get_tool_versions() -> Dict[str, str]:
+    """Versions of the tools whose output ends up in cached artifacts."""
+    try:
+        output = subprocess.run(['ffmpeg', '-version'], capture_output=True, text=True, timeout=10).stdout
+        ffmpeg_version = output.splitlines()[0] if output else 'unknown'
+    except (OSError, subprocess.SubprocessError):
+        ffmpeg_version = 'unknown'
+    return {'ffmpeg': ffmpeg_version, 'opencv': cv2.__version__}
+
+
+class ResultCache:
+    """Redis-indexed, disk-backed LRU cache of task output files."""
+
+    def __init__(self, redis_client=None, cache_dir: Path = RESULT_CACHE_DIR,
+                 max_bytes: int = DEFAULT_MAX_BYTES):
+        self.redis = redis_client or _get_redis()
+        self.cache_dir = Path(cache_dir)
+        self.max_bytes = max_bytes
+        self.prefix = 'result_cache:'
+        self.lru_key = f"{self.prefix}lru"
+        self.bytes_key = f"{self.prefix}bytes"
+
+    def make_key(self, input_hash: str, task_name: str, params: Dict) -> str:
+        """Cache key for a task run on an input with the given parameters."""
+        canonical = json.dumps({
+            'input': input_hash,
+            'task': task_name,
+            'params': params,
+            'tools': get_tool_versions()
+        }, sort_keys=True, separators=(',', ':'), default=str)
+        return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+
+    def fetch(self, key: str, output_path: str) -> Optional[Dict]:
+        """
+        Materialise a cached artifact at output_path.
+
+        Returns:
+            The cached task result with output_path filled in, or None on a miss
+        """
+        try:
+            entry = self.redis.hgetall(f"{self.prefix}{key}")
+            if not entry:
+                return None
+
+            artifact = entry[b'path'].decode()
+            if not os.path.exists(artifact):
+                self._remove(key)
+                return None
+
+            if os.path.abspath(artifact) != os.path.abspath(output_path):
+                os.makedirs(os.path.dirname(os.path.abspath(output_path)), exist_ok=True)
+                link_or_copy(artifact, output_path)
+
+            self.redis.zadd(self.lru_key, {key: time.time()})
+            logger.info(f"Result cache hit for {output_path}")
+            result = json.loads(entry[b'result'])
+            result['output_path'] = output_path
+            return result
+        except Exception as e:
+            logger.warning(f"Failed to read result cache: {str(e)}")
+            return None
+
+    def put(self, key: str, output_path: str, result: Dict) -> None:
+        """Store a finished task's output file and result, evicting least recently used artifacts."""
+        try:
+            self.cache_dir.mkdir(parents=True, exist_ok=True)
+            artifact = self.cache_dir / f"{key}{Path(output_path).suffix}"
+            # Replacing an entry must not count its size twice
+            self._remove(key)
+            link_or_copy(output_path, str(artifact))
+            size = artifact.stat().st_size
+
+            pipe = self.redis.pipeline()
+            pipe.hset(f"{self.prefix}{key}", mapping={
+                'path': str(artifact),
+                'size': size,
+                'result': json.dumps(result, default=str),
+                'created_at': time.time()
+            })
+            pipe.zadd(self.lru_key, {key: time.time()})
+            pipe.incrby(self.bytes_key, size)
+            pipe.execute()
+
+            self._evict()
+        except Exception as e:
+            logger.warning(f"Failed to write result cache: {str(e)}")
+
+    def _evict(self) -> None:
+        evicted = 0
+        while int(self.redis.get(self.bytes_key) or 0) > self.max_bytes:
+            oldest = self.redis.zpopmin(self.lru_key, 1)
+            if not oldest:
+                break
+            member = oldest[0][0]
+            self._remove(member.decode() if isinstance(member, bytes) else member)
+            evicted += 1
+        if evicted:
+            logger.info(f"Evicted {evicted} result cache entries")
+
+    def _remove(self, key: str) -> None:
+        entry_key = f"{self.prefix}{key}"
+        entry = self.redis.hgetall(entry_key)
+        pipe = self.redis.pipeline()
+        pipe.delete(entry_key)
+        pipe.zrem(self.lru_key, key)
+        if entry:
+            pipe.decrby(self.bytes_key, int(entry[b'size']))
+        pipe.execute()
+        if entry:
+            try:
+                os.remove(entry[b'path'].decode())
+            except FileNotFoundError:
+                pass
+
+
+def detach_output(output_path: str) -> None:
+    """
+    Remove a previous output before a task rewrites it.
+
+    Outputs served from the cache are hard links to the cached artifact, and
+    ffmpeg truncates existing files in place, so they must be unlinked first.
+    """
+    if os.path.lexists(output_path):
+        os.remove(output_path)
+
+
+def link_or_copy(source: str, destination: str) -> None:
+    """Hard-link a file to a new path, copying it when the paths are on different filesystems."""
+    if os.path.exists(destination):
+        os.remove(destination)
+    try:
+        os.link(source, destination)
+    except OSError:
+        shutil.copy2(source, destination)
@@ -0,0 +1,130 @@
+"""
+Per-node CPU thread budget shared by concurrent video jobs.
+
+Every ffmpeg/OpenCV job leases a number of threads before it starts and
+returns them when it finishes, so several Celery worker processes on the same
+machine split the cores between them instead of each assuming it has all of
+them. Leases are kept in a small JSON file guarded by an exclusive file lock;
+leases held by processes that died are reclaimed automatically.
+"""
+
+import fcntl
+import json
+import os
+import tempfile
+import time
+import uuid
+from contextlib import contextmanager
+from typing import Callable, Dict, Optional
+
+import cv2
+from celery.utils.log import get_task_logger
+
+logger = get_task_logger(__name__)
+
+TOTAL_THREADS = int(os.getenv('CPU_THREAD_BUDGET', os.cpu_count() or 1))
+LEASE_FILE = os.getenv('CPU_BUDGET_FILE', os.path.join(tempfile.gettempdir(), 'watermark_remover_cpu_budget.json'))
+DEFAULT_JOB_THREADS = int(os.getenv('DEFAULT_JOB_THREADS', 4))
+DEFAULT_WAIT_TIMEOUT = 300  # seconds before a job proceeds with a single thread
+POLL_INTERVAL = 0.5
+
+
+def _is_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+class ThreadBudget:
+    """Lease-file based counting semaphore over the node's CPU threads."""
+
+    def __init__(self, total: int = TOTAL_THREADS, lease_file: str = LEASE_FILE):
+        self.total = max(1, total)
+        self.lease_file = lease_file
+
+    def _update(self, change: Callable[[Dict], Optional[int]]) -> Optional[int]:
+        # Read, modify and write the leases under one exclusive lock
+        with open(self.lease_file, 'a+') as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                f.seek(0)
+                try:
+                    leases = json.loads(f.read() or '{}')
+                except ValueError:
+                    leases = {}
+                leases = {k: v for k, v in leases.items() if _is_alive(v['pid'])}
+
+                result = change(leases)
+
+                f.seek(0)
+                f.truncate()
+                json.dump(leases, f)
+                f.flush()
+                return result
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    def available(self) -> int:
+        """Threads not currently leased."""
+        return self._update(lambda leases: self.total - sum(v['threads'] for v in leases.values()))
+
+    def acquire(self, requested: int = DEFAULT_JOB_THREADS, timeout: float = DEFAULT_WAIT_TIMEOUT):
+        """
+        Lease up to `requested` threads, waiting while none are free.
+
+        Args:
+            requested: Threads the job would like
+            timeout: Seconds to wait for a free thread before proceeding with one anyway
+
+        Returns:
+            Tuple of (lease id, threads granted)
+        """
+        requested = max(1, min(requested, self.total))
+        lease_id = uuid.uuid4().hex
+        deadline = time.time() + timeout
+
+        def grant(leases):
+            free = self.total - sum(v['threads'] for v in leases.values())
+            if free < 1 and time.time() < deadline:
+                return None
+            threads = max(1, min(requested, free))
+            leases[lease_id] = {'pid': os.getpid(), 'threads': threads, 'since': time.time()}
+            return threads
+
+        while True:
+            threads = self._update(grant)
+            if threads is not None:
+                if threads < requested:
+                    logger.info(f"CPU budget granted {threads}/{requested} threads")
+                return lease_id, threads
+            time.sleep(POLL_INTERVAL)
+
+    def release(self, lease_id: str) -> None:
+        """Return a lease's threads to the budget."""
+        self._update(lambda leases: leases.pop(lease_id, None) and None)
+
+    @contextmanager
+    def lease(self, requested: Optional[int] = None, timeout: float = DEFAULT_WAIT_TIMEOUT):
+        """
+        Hold a thread lease for the duration of a job.
+
+        OpenCV's thread pool is sized to the lease while it is held.
+
+        Yields:
+            Number of threads the job may use
+        """
+        lease_id, threads = self.acquire(requested or DEFAULT_JOB_THREADS, timeout)
+        previous = cv2.getNumThreads()
+        cv2.setNumThreads(threads)
+        try:
+            yield threads
+        finally:
+            cv2.setNumThreads(previous)
+            self.release(lease_id)
+
+
+thread_budget = ThreadBudget()
@@ -2,27 +2,326 @@ from celery import shared_task
 from celery.utils.log import get_task_logger
 import cv2
 import numpy as np
-from moviepy.editor import VideoFileClip
 import os
 from pathlib import Path
 import ffmpeg
-from typing import List, Dict, Optional
+from typing import Callable, List, Dict, Optional, Tuple
 import time
+import multiprocessing
+from contextlib import nullcontext
+import queue
+from concurrent.futures import ProcessPoolExecutor
+
+from .checkpoint import JobCheckpoint, get_checkpoint_dir
+from .ffmpeg_utils import (DEFAULT_AUDIO_BITRATE, DEFAULT_PRESET, DEFAULT_SCALER, DEFAULT_SHAKINESS,
+                           FrameWriter, build_enhance_filters, choose_compress_path, concat_segments,
+                           detect_stabilization, interpolate_crf, is_mp4_compatible, mp4_audio_options,
+                           parse_bitrate, plan_keyframe_segments, sample_crf_curve)
+from .frame_pipeline import DEFAULT_QUEUE_DEPTH, run_frame_pipeline
+from .mask_cache import WatermarkMaskCache
+from .media_probe import get_keyframe_times, probe_media
+from .result_cache import RESULT_CACHE_DIR, ResultCache, detach_output, get_file_hash, link_or_copy
+from .thread_budget import DEFAULT_JOB_THREADS, thread_budget
+from .watermark import WatermarkEngine, detect_watermark_regions, layout_signature, regions_to_mask
 
 logger = get_task_logger(__name__)
 
+PROGRESS_INTERVAL_FRAMES = 30
+DEFAULT_PIPELINE_THREADS = 2
+DEFAULT_CHECKPOINT_INTERVAL = float(os.getenv('WATERMARK_CHECKPOINT_INTERVAL', 0))  # seconds per checkpointed segment, 0 = off
+DEFAULT_ENHANCE_THREADS = 4
+RESOLUTION_WIDTHS = {'720p': 1280, '1080p': 1920, '4k': 3840}
+COMPRESS_MODES = ('bitrate', 'quality')
+MIN_VIDEO_BITRATE = 100_000
+DEFAULT_LADDER = [
+    {'name': '1080p', 'height': 1080, 'video_bitrate': '5000k', 'audio_bitrate': '192k'},
+    {'name': '720p', 'height': 720, 'video_bitrate': '2500k', 'audio_bitrate': '128k'},
+    {'name': '480p', 'height': 480, 'video_bitrate': '1000k', 'audio_bitrate': '96k'},
+]
+STABILIZE_CACHE_DIR = Path(os.getenv('STABILIZE_CACHE_DIR', RESULT_CACHE_DIR.parent / 'vidstab'))
+
+
+def _run_watermark_pass(video, make_engine: Callable[[], WatermarkEngine], out: FrameWriter,
+                        max_frames: Optional[int] = None,
+                        on_progress: Optional[Callable[[int], None]] = None,
+                        threads: int = DEFAULT_PIPELINE_THREADS,
+                        queue_depth: int = DEFAULT_QUEUE_DEPTH) -> int:
+    """
+    Read frames from an open capture, remove the watermarks and encode them.
+
+    Args:
+        video: Open cv2.VideoCapture positioned at the first frame to process
+        make_engine: Builds a watermark engine for the video's frame size
+        out: Frame writer receiving the processed frames
+        max_frames: Stop after this many frames (optional, reads to the end otherwise)
+        on_progress: Called with the number of frames done every PROGRESS_INTERVAL_FRAMES
+        threads: Processing threads between the reader and writer threads;
+            0 runs every stage serially on the calling thread
+        queue_depth: Maximum frames queued between pipeline stages
+
+    Returns:
+        Number of frames read
+    """
+    engine = make_engine()
+
+    if threads < 1:
+        frame_number = 0
+        while max_frames is None or frame_number < max_frames:
+            ret, frame = video.read()
+            if not ret:
+                break
+
+            # Write the processed frames (the temporal method returns them delayed)
+            for processed in engine.push(frame):
+                out.write(processed)
+
+            frame_number += 1
+            if on_progress and frame_number % PROGRESS_INTERVAL_FRAMES == 0:
+                on_progress(frame_number)
+
+        for processed in engine.flush():
+            out.write(processed)
+        return frame_number
+
+    # Engines reuse their buffers, so each worker thread gets its own; the
+    # temporal method keeps a rolling window and must see every frame itself
+    engines = [engine]
+    spare = [engine]
+
+    def make_processor():
+        try:
+            worker_engine = spare.pop()
+        except IndexError:
+            worker_engine = make_engine()
+            engines.append(worker_engine)
+        return worker_engine.push
+
+    def read_frame():
+        ret, frame = video.read()
+        return frame if ret else None
+
+    frame_number = run_frame_pipeline(
+        read_frame,
+        make_processor,
+        out.write,
+        workers=1 if engine.method == 'temporal' else threads,
+        queue_depth=queue_depth,
+        max_frames=max_frames,
+        on_progress=on_progress,
+        progress_interval=PROGRESS_INTERVAL_FRAMES
+    )
+
+    for worker_engine in engines:
+        for processed in worker_engine.flush():
+            out.write(processed)
+
+    return frame_number
+
+
+def _remove_watermark_segment(video_path: str, regions: List[Dict], mask: Optional[np.ndarray],
+                              method: str, start_frame: int, end_frame: Optional[int],
+                              segment_path: str, index: int, progress_queue,
+                              threads: int = DEFAULT_PIPELINE_THREADS,
+                              queue_depth: int = DEFAULT_QUEUE_DEPTH,
+                              encoder_threads: int = 0) -> int:
+    """Process one keyframe-aligned segment into its own file; returns frames read."""
+    if encoder_threads:
+        # Pool workers start with OpenCV sized to every core; keep to the job's share
+        cv2.setNumThreads(encoder_threads)
+    video = cv2.VideoCapture(video_path)
+    if not video.isOpened():
+        raise ValueError(f"Could not open video file: {video_path}")
+
+    try:
+        fps = video.get(cv2.CAP_PROP_FPS)
+        width = int(video.get(cv2.CAP_PROP_FRAME_WIDTH))
+        height = int(video.get(cv2.CAP_PROP_FRAME_HEIGHT))
+        video.set(cv2.CAP_PROP_POS_FRAMES, start_frame)
+
+        max_frames = end_frame - start_frame if end_frame is not None else None
+        with FrameWriter(segment_path, width, height, fps, threads=encoder_threads) as out:
+            frames = _run_watermark_pass(
+                video,
+                lambda: WatermarkEngine(regions, width, height, method=method, mask=mask),
+                out,
+                max_frames=max_frames,
+                on_progress=lambda n: progress_queue.put((index, n)),
+                threads=threads,
+                queue_depth=queue_depth
+            )
+        progress_queue.put((index, frames))
+        return frames
+    finally:
+        video.release()
+
+
+class _SegmentProgress:
+    """Merges per-segment frame counts into the task's progress reporting."""
+
+    def __init__(self, task, frame_count: int, done: List[int]):
+        self.task = task
+        self.frame_count = max(frame_count, 1)
+        self.segment_progress = list(done)
+
+    def put(self, item: Tuple[int, int]) -> None:
+        index, frames = item
+        self.segment_progress[index] = frames
+        progress = min(100.0, sum(self.segment_progress) / self.frame_count * 100)
+        self.task.update_state(state='PROGRESS', meta={'progress': progress})
+
+
+def _effective_workers(workers: int) -> int:
+    """
+    Number of worker processes this process may actually start.
+
+    Pool children of Celery's default prefork pool are daemonic and cannot
+    have children of their own, so parallel segments need a pool such as
+    --pool threads or --pool solo; under prefork they run one after another.
+    """
+    if workers > 1 and multiprocessing.current_process().daemon:
+        logger.warning(f"Running in a daemonic worker process; processing segments "
+                       f"sequentially instead of with {workers} workers")
+        return 1
+    return workers
+
+
+def _remove_watermark_segmented(task, video_path: str, regions: List[Dict], mask: Optional[np.ndarray],
+                                output_path: str, method: str, segments: List[Tuple[int, int]],
+                                frame_count: int, workers: int, threads: int, queue_depth: int,
+                                encoder_threads: int = 0) -> None:
+    """
+    Process keyframe-aligned segments, then join them losslessly with the source audio.
+
+    Finished segments are recorded in a checkpoint next to the output, so a
+    retried or re-submitted job only processes the segments still missing.
+    """
+    stat = os.stat(video_path)
+    checkpoint = JobCheckpoint(get_checkpoint_dir(output_path), params={
+        'video_path': os.path.abspath(video_path),
+        'size': stat.st_size,
+        'mtime': stat.st_mtime,
+        'regions': regions,
+        'method': method
+    })
+    segments = checkpoint.start(segments)
+    pending = [i for i in range(len(segments)) if not checkpoint.is_complete(i)]
+
+    done = [end - start if checkpoint.is_complete(i) else 0 for i, (start, end) in enumerate(segments)]
+    progress = _SegmentProgress(task, frame_count, done)
+
+    def segment_args(i):
+        start_frame, end_frame = segments[i]
+        # The last segment runs to the end in case the frame count is approximate
+        if i == len(segments) - 1:
+            end_frame = None
+        return (video_path, regions, mask, method, start_frame, end_frame,
+                checkpoint.segment_path(i), i)
+
+    if workers > 1 and len(pending) > 1:
+        logger.info(f"Processing {len(pending)} of {len(segments)} segments in parallel")
+        with multiprocessing.Manager() as manager, ProcessPoolExecutor(
+            max_workers=min(workers, len(pending)),
+            mp_context=multiprocessing.get_context('spawn')
+        ) as pool:
+            progress_queue = manager.Queue()
+            futures = {
+                pool.submit(_remove_watermark_segment, *segment_args(i), progress_queue,
+                            threads, queue_depth, encoder_threads): i
+                for i in pending
+            }
+
+            while futures:
+                try:
+                    progress.put(progress_queue.get(timeout=1))
+                except queue.Empty:
+                    pass
+                for future in [f for f in futures if f.done()]:
+                    index = futures.pop(future)
+                    future.result()
+                    checkpoint.mark_complete(index)
+    else:
+        logger.info(f"Processing {len(pending)} of {len(segments)} segments")
+        for i in pending:
+            _remove_watermark_segment(*segment_args(i), progress, threads, queue_depth, encoder_threads)
+            checkpoint.mark_complete(i)
+
+    logger.info(f"Joining {len(segments)} segments into {output_path}")
+    concat_segments([checkpoint.segment_path(i) for i in range(len(segments))],
+                    output_path, audio_source=video_path)
+    checkpoint.cleanup()
+
+
+@shared_task(bind=True, name='tasks.video_processing.detect_watermarks')
+def detect_watermarks(self, video_path: str, platform: Optional[str] = None,
+                      sample_count: int = 24, analysis_width: int = 320) -> Dict:
+    """
+    Detect persistent watermark/overlay regions in a video.
+
+    Args:
+        video_path: Path to input video
+        platform: Source platform, used to pick logo templates (optional)
+        sample_count: Number of frames sampled across the video
+        analysis_width: Width the sampled frames are downscaled to
+
+    Returns:
+        Dict containing status and the detected regions
+    """
+    try:
+        logger.info(f"Detecting watermark regions in {video_path}")
+        start_time = time.time()
+
+        regions = detect_watermark_regions(
+            video_path,
+            platform=platform,
+            sample_count=sample_count,
+            analysis_width=analysis_width
+        )
+
+        logger.info(f"Found {len(regions)} watermark regions in {time.time() - start_time:.2f}s")
+        return {
+            'status': 'success',
+            'regions': regions
+        }
+
+    except Exception as e:
+        logger.error(f"Error detecting watermarks: {str(e)}")
+        raise self.retry(exc=e, countdown=5, max_retries=3)
+
+
 @shared_task(bind=True, name='tasks.video_processing.remove_watermark')
-def remove_watermark(self, video_path: str, regions: List[Dict], output_path: str) -> Dict:
+def remove_watermark(self, video_path: str, regions: Optional[List[Dict]], output_path: str,
+                     method: str = 'telea', workers: int = 1,
+                     platform: Optional[str] = None,
+                     threads: int = DEFAULT_PIPELINE_THREADS,
+                     queue_depth: int = DEFAULT_QUEUE_DEPTH,
+                     checkpoint_interval: float = DEFAULT_CHECKPOINT_INTERVAL,
+                     input_hash: Optional[str] = None) -> Dict:
     """
     Remove watermarks from specified regions in a video.
 
     Args:
         video_path: Path to input video
-        regions: List of dictionaries containing x, y, width, height for watermark regions
+        regions: List of dictionaries containing x, y, width, height for watermark regions;
+            when empty or None they are taken from the mask cache or detected automatically
         output_path: Path to save processed video
+        method: Fill method, 'telea' (spatial inpainting) or 'temporal'
+            (fill from neighbouring frames, best for static logos)
+        workers: Number of processes; above 1 the video is split at keyframes
+            and the segments are processed in parallel. This needs a Celery pool
+            whose processes may start children (--pool threads or --pool solo);
+            in prefork pool children the segments are processed sequentially
+        platform: Source platform, used for automatic detection and as mask cache key (optional)
+        threads: Processing threads overlapping with the decode and encode threads
+            (per worker process); 0 runs decode, processing and encode serially
+        queue_depth: Maximum frames buffered between pipeline stages, bounding memory use
+        checkpoint_interval: Seconds of video per checkpointed segment; videos longer
+            than this are processed segment by segment and a retry resumes from the
+            last completed segment (0, the default, disables checkpointing). Segments
+            start at a frame index, so this suits constant frame rate sources
+        input_hash: sha256 of the input recorded at ingest (optional, computed if missing)
 
     Returns:
-        Dict containing status and output path
+        Dict containing status, output path and the regions processed
     """
     try:
         logger.info(f"Starting watermark removal for {video_path}")
@@ -30,6 +329,18 @@ def remove_watermark(self, video_path: str, regions: List[Dict], output_path: st
         # Create output directory if it doesn't exist
         os.makedirs(os.path.dirname(output_path), exist_ok=True)
 
+        # Identical input and parameters produce an identical output
+        result_cache = ResultCache()
+        cache_key = result_cache.make_key(
+            input_hash or get_file_hash(video_path),
+            'remove_watermark',
+            {'regions': regions, 'method': method, 'platform': platform}
+        )
+        cached = result_cache.fetch(cache_key, output_path)
+        if cached:
+            return cached
+        detach_output(output_path)
+
         # Load video
         video = cv2.VideoCapture(video_path)
         if not video.isOpened():
@@ -41,84 +352,95 @@ def remove_watermark(self, video_path: str, regions: List[Dict], output_path: st
         width = int(video.get(cv2.CAP_PROP_FRAME_WIDTH))
         height = int(video.get(cv2.CAP_PROP_FRAME_HEIGHT))
 
-        # Create video writer
-        fourcc = cv2.VideoWriter_fourcc(*'mp4v')
-        temp_output = output_path.replace('.mp4', '_temp.mp4')
-        out = cv2.VideoWriter(temp_output, fourcc, fps, (width, height))
-
-        frame_number = 0
-        while True:
-            ret, frame = video.read()
-            if not ret:
-                break
-
-            # Process each region
-            for region in regions:
-                x, y = region['x'], region['y']
-                w, h = region['width'], region['height']
-
-                # Ensure coordinates are within frame bounds
-                x = max(0, min(x, width - 1))
-                y = max(0, min(y, height - 1))
-                w = min(w, width - x)
-                h = min(h, height - y)
-
-                # Extract region
-                roi = frame[y:y+h, x:x+w]
-
-                # Apply inpainting mask
-                mask = np.ones(roi.shape[:2], dtype=np.uint8) * 255
-
-                # Inpaint the region
-                roi_inpainted = cv2.inpaint(roi, mask, 3, cv2.INPAINT_TELEA)
-
-                # Replace the region in the frame
-                frame[y:y+h, x:x+w] = roi_inpainted
-
-            # Write the processed frame
-            out.write(frame)
-
-            # Update progress
-            frame_number += 1
-            if frame_number % 30 == 0:  # Update progress every 30 frames
-                progress = (frame_number / frame_count) * 100
-                self.update_state(state='PROGRESS', meta={'progress': progress})
-
-        # Release resources
-        video.release()
-        out.release()
-
-        # Convert to H.264 with proper encoding
-        logger.info("Converting to H.264 format")
-        stream = ffmpeg.input(temp_output)
-        stream = ffmpeg.output(stream, output_path, vcodec='libx264', acodec='aac')
-        ffmpeg.run(stream, overwrite_output=True)
-
-        # Clean up temporary file
-        os.remove(temp_output)
+        # Reuse regions and masks known for this platform layout, or detect them
+        mask = None
+        if not regions or platform:
+            mask_cache = WatermarkMaskCache()
+            layout = layout_signature(video_path)
+            if not regions:
+                cached = mask_cache.get(platform, width, height, layout)
+                if cached:
+                    regions, mask = cached['regions'], cached['mask']
+                else:
+                    regions = detect_watermark_regions(video_path, platform=platform)
+                    logger.info(f"Detected {len(regions)} watermark regions")
+                    mask = regions_to_mask(regions, width, height)
+                    mask_cache.put(platform, width, height, layout, regions, mask)
+            else:
+                mask_cache.put(platform, width, height, layout, regions, regions_to_mask(regions, width, height))
+
+        # Split at keyframes for parallel workers and for resumable checkpoints
+        workers = _effective_workers(workers)
+        parts = workers
+        if checkpoint_interval > 0 and fps > 0:
+            parts = max(parts, int(np.ceil(frame_count / (fps * checkpoint_interval))))
+
+        segments = []
+        if parts > 1:
+            segments = plan_keyframe_segments(get_keyframe_times(video_path), fps, frame_count, parts)
+
+        # Lease CPU threads from the node's budget; each worker process gets an
+        # equal share for its processing threads and its x264 encoder
+        with thread_budget.lease(workers * (threads + 2)) as cpu_threads:
+            share = max(1, cpu_threads // workers)
+            threads = min(threads, share)
+            if len(segments) > 1:
+                video.release()
+                _remove_watermark_segmented(self, video_path, regions, mask, output_path, method,
+                                            segments, frame_count, workers, threads, queue_depth,
+                                            encoder_threads=share)
+            else:
+                def report_progress(frame_number):
+                    progress = (frame_number / frame_count) * 100
+                    self.update_state(state='PROGRESS', meta={'progress': progress})
+
+                # Stream frames straight into one H.264 encode with the source audio
+                with FrameWriter(output_path, width, height, fps, audio_source=video_path,
+                                 threads=share) as out:
+                    # Regions are compiled into masks and buffers once per engine
+                    _run_watermark_pass(
+                        video,
+                        lambda: WatermarkEngine(regions, width, height, method=method, mask=mask),
+                        out,
+                        on_progress=report_progress,
+                        threads=threads,
+                        queue_depth=queue_depth
+                    )
+
+                # Release resources
+                video.release()
 
         logger.info(f"Watermark removal completed for {video_path}")
-        return {
+        result = {
             'status': 'success',
-            'output_path': output_path
+            'output_path': output_path,
+            'regions': regions
         }
+        result_cache.put(cache_key, output_path, result)
+        return result
 
     except Exception as e:
         logger.error(f"Error processing video: {str(e)}")
         raise self.retry(exc=e, countdown=5, max_retries=3)
 
 @shared_task(bind=True, name='tasks.video_processing.enhance_video')
-def enhance_video(self, video_path: str, options: Dict) -> Dict:
+def enhance_video(self, video_path: str, options: Dict, input_hash: Optional[str] = None) -> Dict:
     """
     Enhance video quality with specified options.
 
+    All enhancements run as one ffmpeg filtergraph in a single encode; the
+    stabilisation analysis pass is cached per input and reused.
+
     Args:
         video_path: Path to input video
         options: Dictionary containing enhancement options
             - resolution: Target resolution (e.g., "1080p")
             - bitrate: Target bitrate
-            - denoise: Boolean for noise reduction
+            - denoise: Boolean for noise reduction, or the filter to use ('hqdn3d' or 'nlmeans')
             - stabilize: Boolean for video stabilization
+            - scaler: Resampler used for scaling (e.g., "lanczos", "bicubic")
+            - threads: Encoder and filter threads
+        input_hash: sha256 of the input recorded at ingest (optional, computed if missing)
 
     Returns:
         Dict containing status and output path
@@ -128,98 +450,310 @@ def enhance_video(self, video_path: str, options: Dict) -> Dict:
 
         output_path = video_path.replace('.mp4', '_enhanced.mp4')
 
-        # Load video
-        clip = VideoFileClip(video_path)
-
-        # Apply enhancements based on options
-        if options.get('denoise'):
-            logger.info("Applying noise reduction")
-            # Implement denoising logic
-
-        if options.get('stabilize'):
-            logger.info("Applying video stabilization")
-            # Implement stabilization logic
-
-        # Set output resolution
-        resolution = options.get('resolution', '1080p')
-        width = {'720p': 1280, '1080p': 1920, '4k': 3840}.get(resolution)
-        if width:
-            clip = clip.resize(width=width)
-
-        # Set output bitrate
-        bitrate = options.get('bitrate', '5000k')
-
-        # Write enhanced video
-        clip.write_videofile(
-            output_path,
-            codec='libx264',
-            audio_codec='aac',
-            bitrate=bitrate,
-            threads=4,
-            logger=None
-        )
-
-        clip.close()
+        input_hash = input_hash or get_file_hash(video_path)
+        result_cache = ResultCache()
+        cache_key = result_cache.make_key(input_hash, 'enhance_video', options)
+        cached = result_cache.fetch(cache_key, output_path)
+        if cached:
+            return cached
+        detach_output(output_path)
+
+        # Lease CPU threads from the node's budget for both ffmpeg passes
+        with thread_budget.lease(int(options.get('threads', DEFAULT_ENHANCE_THREADS))) as threads:
+            # Stabilization pass 1: motion analysis, cached per input
+            transforms_path = None
+            if options.get('stabilize'):
+                transforms_path = str(STABILIZE_CACHE_DIR / f"{input_hash}_s{DEFAULT_SHAKINESS}.trf")
+                if os.path.exists(transforms_path):
+                    logger.info("Reusing cached stabilization transforms")
+                else:
+                    logger.info("Analysing camera motion for stabilization")
+                    detect_stabilization(video_path, transforms_path, threads=threads)
+
+            denoise = options.get('denoise')
+            if denoise is True:
+                denoise = 'hqdn3d'
+            if denoise:
+                logger.info(f"Applying noise reduction ({denoise})")
+
+            # Set output resolution
+            resolution = options.get('resolution', '1080p')
+            width = RESOLUTION_WIDTHS.get(resolution)
+
+            # Set output bitrate
+            bitrate = options.get('bitrate', '5000k')
+
+            source = ffmpeg.input(video_path)
+            video = build_enhance_filters(
+                source.video,
+                width=width,
+                scaler=options.get('scaler', DEFAULT_SCALER),
+                denoise=denoise or None,
+                transforms_path=transforms_path
+            )
+
+            # Write enhanced video, copying the audio untouched when MP4 can hold it
+            stream = ffmpeg.output(
+                video,
+                source['a?'],
+                output_path,
+                vcodec='libx264',
+                pix_fmt='yuv420p',
+                video_bitrate=bitrate,
+                threads=threads,
+                movflags='+faststart',
+                **mp4_audio_options(video_path)
+            )
+            stream = stream.global_args('-loglevel', 'error', '-nostats', '-filter_threads', str(threads))
+            ffmpeg.run(stream, overwrite_output=True, capture_stderr=True)
 
         logger.info(f"Video enhancement completed for {video_path}")
-        return {
+        result = {
             'status': 'success',
             'output_path': output_path
         }
+        result_cache.put(cache_key, output_path, result)
+        return result
 
     except Exception as e:
         logger.error(f"Error enhancing video: {str(e)}")
         raise self.retry(exc=e, countdown=5, max_retries=3)
 
 @shared_task(bind=True, name='tasks.video_processing.compress_video')
-def compress_video(self, video_path: str, target_size_mb: float) -> Dict:
+def compress_video(self, video_path: str, target_size_mb: Optional[float] = None,
+                   input_hash: Optional[str] = None,
+                   mode: str = 'bitrate',
+                   target_quality: Optional[float] = None,
+                   quality_metric: str = 'ssim',
+                   audio_bitrate: str = DEFAULT_AUDIO_BITRATE) -> Dict:
     """
     Compress video to target size while maintaining quality.
 
     Args:
         video_path: Path to input video
-        target_size_mb: Target size in megabytes
+        target_size_mb: Target size in megabytes, audio included
+        input_hash: sha256 of the input recorded at ingest (optional, computed if missing)
+        mode: 'bitrate' encodes at the average bitrate that fits the target size;
+            'quality' encodes short samples at several CRFs and picks the CRF that
+            meets target_size_mb and/or target_quality, then encodes once
+        target_quality: Minimum quality score in 'quality' mode (e.g. 0.97 SSIM or 40 dB PSNR)
+        quality_metric: 'ssim' or 'psnr'
+        audio_bitrate: AAC bitrate of the output
 
     Returns:
-        Dict containing status and output path
+        Dict containing status, output path, the encoding settings used and the
+        path taken: 'link', 'remux' or 'audio' when the source's H.264 video
+        already fits and can be stream-copied, otherwise 'transcode'
     """
     try:
         logger.info(f"Starting video compression for {video_path}")
 
-        output_path = video_path.replace('.mp4', '_compressed.mp4')
-        target_size_bytes = target_size_mb * 1024 * 1024
-
-        # Get video duration
-        probe = ffmpeg.probe(video_path)
-        duration = float(probe['streams'][0]['duration'])
-
-        # Calculate target bitrate
-        target_bitrate = int((target_size_bytes * 8) / duration)
-
-        # Compress video
-        stream = ffmpeg.input(video_path)
-        stream = ffmpeg.output(
-            stream,
-            output_path,
-            vcodec='libx264',
-            acodec='aac',
-            b=f'{target_bitrate}',
-            maxrate=f'{target_bitrate*1.5}',
-            bufsize=f'{target_bitrate*2}'
-        )
-
-        ffmpeg.run(stream, overwrite_output=True)
+        if mode not in COMPRESS_MODES:
+            raise ValueError(f"Unknown compression mode '{mode}', expected one of {COMPRESS_MODES}")
+        if not target_size_mb and (mode == 'bitrate' or target_quality is None):
+            raise ValueError("target_size_mb is required unless a target_quality is given in quality mode")
+
+        output_path = f"{os.path.splitext(video_path)[0]}_compressed.mp4"
+        target_size_bytes = target_size_mb * 1024 * 1024 if target_size_mb else None
+
+        result_cache = ResultCache()
+        cache_key = result_cache.make_key(input_hash or get_file_hash(video_path), 'compress_video', {
+            'target_size_mb': target_size_mb,
+            'mode': mode,
+            'target_quality': target_quality,
+            'quality_metric': quality_metric,
+            'audio_bitrate': audio_bitrate
+        })
+        cached = result_cache.fetch(cache_key, output_path)
+        if cached:
+            return cached
+        detach_output(output_path)
+
+        # Get video duration; the audio track takes its share of the size budget
+        info = probe_media(video_path)
+        probe = info.raw
+        duration = info.duration
+        audio_bits_per_second = parse_bitrate(audio_bitrate) if info.has_audio else 0
+        video_bytes_per_second = None
+        if target_size_bytes:
+            video_bytes_per_second = target_size_bytes / duration - audio_bits_per_second / 8
+
+        # Stream-copy whatever already fits instead of re-encoding it
+        path = choose_compress_path(probe, video_path, target_size_bytes, parse_bitrate(audio_bitrate))
+        logger.info(f"Compression path for {video_path}: {path}")
+        settings = {'mode': mode, 'path': path}
+
+        if path == 'link':
+            link_or_copy(video_path, output_path)
+        else:
+            # Stream copies barely use the CPU; only encodes draw on the thread budget
+            with (thread_budget.lease() if path == 'transcode' else nullcontext(0)) as threads:
+                output_kwargs = {'movflags': '+faststart'}
+                if path == 'remux':
+                    output_kwargs.update(vcodec='copy', acodec='copy')
+                elif path == 'audio':
+                    output_kwargs.update(vcodec='copy', acodec='aac', audio_bitrate=audio_bitrate)
+                else:
+                    output_kwargs.update(vcodec='libx264', pix_fmt='yuv420p', preset=DEFAULT_PRESET,
+                                         threads=threads)
+                    if info.has_audio:
+                        output_kwargs.update(acodec='aac', audio_bitrate=audio_bitrate)
+
+                    if mode == 'quality':
+                        curve = sample_crf_curve(video_path, duration, metric=quality_metric,
+                                                 threads=threads)
+                        crf = interpolate_crf(curve, target_bytes_per_second=video_bytes_per_second,
+                                              target_quality=target_quality, metric=quality_metric)
+                        logger.info(f"Selected CRF {crf:.1f} from {len(curve)} sampled encodes")
+                        output_kwargs['crf'] = round(crf, 1)
+                        settings.update(crf=round(crf, 1), samples=curve)
+                    else:
+                        # Calculate target bitrate
+                        target_bitrate = int(video_bytes_per_second * 8)
+                        if target_bitrate < MIN_VIDEO_BITRATE:
+                            logger.warning(f"Target size leaves {target_bitrate} bps for video, "
+                                           f"using {MIN_VIDEO_BITRATE}")
+                            target_bitrate = MIN_VIDEO_BITRATE
+                        output_kwargs.update(
+                            video_bitrate=target_bitrate,
+                            maxrate=int(target_bitrate * 1.5),
+                            bufsize=int(target_bitrate * 2)
+                        )
+                        settings['video_bitrate'] = target_bitrate
+
+                # Compress video
+                source = ffmpeg.input(video_path)
+                stream = ffmpeg.output(source.video, source['a?'], output_path, **output_kwargs)
+                ffmpeg.run(stream.global_args('-loglevel', 'error', '-nostats'), overwrite_output=True,
+                           capture_stderr=True)
 
         logger.info(f"Video compression completed for {video_path}")
-        return {
+        result = {
             'status': 'success',
-            'output_path': output_path
+            'output_path': output_path,
+            'size_mb': round(os.path.getsize(output_path) / (1024 * 1024), 3),
+            **settings
         }
+        result_cache.put(cache_key, output_path, result)
+        return result
 
     except Exception as e:
         logger.error(f"Error compressing video: {str(e)}")
         raise self.retry(exc=e, countdown=5, max_retries=3)
 
+@shared_task(bind=True, name='tasks.video_processing.transcode_ladder')
+def transcode_ladder(self, video_path: str, renditions: Optional[List[Dict]] = None,
+                     output_dir: Optional[str] = None) -> Dict:
+    """
+    Encode several renditions of a video from a single decode.
+
+    The decoded frames are fanned out with ffmpeg's split filter, so the
+    source is decoded once however many renditions are produced.
+
+    Args:
+        video_path: Path to input video
+        renditions: List of dictionaries describing each output (defaults to DEFAULT_LADDER)
+            - name: Rendition name, used in the output filename (e.g., "720p")
+            - height: Target height; sources are never upscaled
+            - video_bitrate: Target video bitrate (e.g., "2500k"); uses crf when omitted
+            - crf: Constant rate factor when no bitrate is given
+            - audio_bitrate: AAC bitrate (e.g., "128k")
+        output_dir: Directory for the renditions (defaults to next to the input)
+
+    Returns:
+        Dict containing status and, per rendition, its output path, size, bitrate
+        and path ('remux' when the source already fits the rendition, else 'transcode')
+    """
+    try:
+        renditions = renditions or DEFAULT_LADDER
+        logger.info(f"Starting {len(renditions)}-rendition transcode for {video_path}")
+        start_time = time.time()
+
+        output_dir = output_dir or os.path.dirname(video_path)
+        os.makedirs(output_dir, exist_ok=True)
+        stem = Path(video_path).stem
+
+        # Renditions the source already satisfies are stream-copied, not encoded
+        source_info = probe_media(video_path)
+        compatible = is_mp4_compatible(source_info.raw)
+        source_bitrate = source_info.video_bit_rate or source_info.bit_rate or 0
+
+        def can_copy(rendition):
+            return (compatible['video'] and compatible['audio']
+                    and source_info.height <= int(rendition['height'])
+                    and bool(rendition.get('video_bitrate'))
+                    and 0 < source_bitrate <= parse_bitrate(rendition['video_bitrate']))
+
+        output_paths = []
+        paths = []
+        encodes = []
+        for rendition in renditions:
+            output_path = os.path.join(output_dir, f"{stem}_{rendition['name']}.mp4")
+            detach_output(output_path)
+            output_paths.append(output_path)
+            if can_copy(rendition):
+                paths.append('remux')
+                stream = ffmpeg.output(ffmpeg.input(video_path), output_path, c='copy', movflags='+faststart')
+                ffmpeg.run(stream.global_args('-loglevel', 'error', '-nostats'), overwrite_output=True,
+                           capture_stderr=True)
+            else:
+                paths.append('transcode')
+                encodes.append((rendition, output_path))
+
+        if encodes:
+            # The encodes share one lease from the node's thread budget
+            with thread_budget.lease(max(DEFAULT_JOB_THREADS, len(encodes))) as cpu_threads:
+                share = max(1, cpu_threads // len(encodes))
+                source = ffmpeg.input(video_path)
+                branches = source.video.filter_multi_output('split', len(encodes))
+
+                outputs = []
+                for i, (rendition, output_path) in enumerate(encodes):
+                    # min() keeps smaller sources at their own height
+                    video = branches.stream(i).filter('scale', -2, f"min(ih,{int(rendition['height'])})",
+                                                      flags=DEFAULT_SCALER)
+                    output_kwargs = {
+                        'vcodec': 'libx264',
+                        'pix_fmt': 'yuv420p',
+                        'preset': rendition.get('preset', 'medium'),
+                        'acodec': 'aac',
+                        'audio_bitrate': rendition.get('audio_bitrate', '128k'),
+                        'movflags': '+faststart',
+                        'threads': share
+                    }
+                    if rendition.get('video_bitrate'):
+                        output_kwargs['video_bitrate'] = rendition['video_bitrate']
+                    else:
+                        output_kwargs['crf'] = rendition.get('crf', 23)
+                    outputs.append(ffmpeg.output(video, source['a?'], output_path, **output_kwargs))
+
+                stream = ffmpeg.merge_outputs(*outputs).global_args('-loglevel', 'error', '-nostats')
+                ffmpeg.run(stream, overwrite_output=True, capture_stderr=True)
+
+        results = []
+        for rendition, output_path, path in zip(renditions, output_paths, paths):
+            output = probe_media(output_path)
+            results.append({
+                'name': rendition['name'],
+                'output_path': output_path,
+                'path': path,
+                'width': output.width,
+                'height': output.height,
+                'size_bytes': os.path.getsize(output_path),
+                'bitrate': output.bit_rate
+            })
+
+        logger.info(f"Transcoded {len(renditions)} renditions of {video_path} "
+                    f"in {time.time() - start_time:.2f}s")
+        return {
+            'status': 'success',
+            'renditions': results
+        }
+
+    except Exception as e:
+        logger.error(f"Error transcoding video: {str(e)}")
+        raise self.retry(exc=e, countdown=5, max_retries=3)
+
 @shared_task(name='tasks.video_processing.cleanup_processed_files')
 def cleanup_processed_files(max_age_hours: int = 24) -> None:
     """
@@ -0,0 +1,474 @@
+"""
+Watermark removal engine.
+
+The caller-supplied watermark regions are compiled once per job into clamped
+ROIs, inpainting masks and padded context windows with preallocated buffers,
+so the per-frame work is reduced to the fill step itself.
+
+Two fill methods are available:
+    - telea: per-frame spatial inpainting (cv2.INPAINT_TELEA)
+    - temporal: fills each region from a rolling window of neighbouring frames,
+      falling back to spatial inpainting only for pixels never uncovered
+
+Regions can also be found automatically with detect_watermark_regions(),
+which looks for persistent overlays in a sparse, low-resolution sample of
+the video.
+"""
+
+from collections import deque
+import os
+from pathlib import Path
+import cv2
+import numpy as np
+from typing import Dict, List, Optional, Tuple
+
+# Pixels of surrounding frame given to the inpainter around each region
+DEFAULT_CONTEXT_PADDING = 8
+DEFAULT_INPAINT_RADIUS = 3
+
+WATERMARK_METHODS = ('telea', 'temporal')
+DEFAULT_TEMPORAL_WINDOW = 15  # Frames, centred on the frame being filled
+DEFAULT_VISIBILITY_THRESHOLD = 24  # Max channel deviation from the watermark to count as uncovered
+COVERED_EDGE_RATIO = 0.5  # Fraction of the watermark's outline a frame must show to count as covered
+MIN_WATERMARK_EDGE_PIXELS = 8  # Fewer persistent edge pixels give no usable outline
+
+# Detection settings
+DEFAULT_SAMPLE_COUNT = 24
+DEFAULT_ANALYSIS_WIDTH = 320
+DEFAULT_EDGE_PERSISTENCE = 0.5  # Fraction of sampled frames a pixel must be an edge in
+DEFAULT_STATIC_STD = 12.0  # Max temporal std-dev (0-255 grey levels) of an overlay pixel
+DEFAULT_TEMPLATE_THRESHOLD = 0.7
+MAX_REGION_AREA_RATIO = 0.15  # Larger persistent areas are static scenery, not overlays
+MIN_OUTLINE_RATIO = 0.2  # Persistent edge pixels per pixel of region perimeter
+DEFAULT_MIN_CONFIDENCE = 0.25
+MIN_PERSISTENCE_SAMPLES = 3  # Fewer samples cannot tell overlays from content
+TEMPLATE_DIR = Path(os.getenv('WATERMARK_TEMPLATE_DIR', Path(__file__).resolve().parent.parent / 'static' / 'watermark_templates'))
+
+
+class CompiledRegion:
+    """A watermark region clamped to the frame, with its mask and buffers."""
+
+    __slots__ = ('x', 'y', 'width', 'height', 'window', 'roi', 'inner', 'mask', 'src', 'dst',
+                 'history', 'edge_history', 'fill_mask')
+
+    def __init__(self, x: int, y: int, width: int, height: int,
+                 frame_width: int, frame_height: int, padding: int,
+                 frame_mask: Optional[np.ndarray] = None):
+        self.x, self.y, self.width, self.height = x, y, width, height
+
+        # Padded context window, clamped to the frame
+        left = max(0, x - padding)
+        top = max(0, y - padding)
+        right = min(frame_width, x + width + padding)
+        bottom = min(frame_height, y + height + padding)
+
+        self.window = (slice(top, bottom), slice(left, right))
+        self.roi = (slice(y, y + height), slice(x, x + width))
+        self.inner = (slice(y - top, y - top + height), slice(x - left, x - left + width))
+
+        # Only the watermark itself is masked; the padding is known context.
+        # A precomputed frame mask narrows it down to the logo's pixels.
+        self.mask = np.zeros((bottom - top, right - left), dtype=np.uint8)
+        if frame_mask is not None:
+            self.mask[self.inner] = np.where(frame_mask[self.roi] > 0, 255, 0)
+        else:
+            self.mask[self.inner] = 255
+
+        self.src = np.empty((bottom - top, right - left, 3), dtype=np.uint8)
+        self.dst = np.empty_like(self.src)
+
+        # Allocated by the temporal method only
+        self.history = None
+        self.edge_history = None
+        self.fill_mask = None
+
+    def as_dict(self) -> Dict:
+        return {'x': self.x, 'y': self.y, 'width': self.width, 'height': self.height}
+
+
+def compile_regions(regions: List[Dict], frame_width: int, frame_height: int,
+                    padding: int = DEFAULT_CONTEXT_PADDING,
+                    frame_mask: Optional[np.ndarray] = None) -> List[CompiledRegion]:
+    """
+    Clamp watermark regions to the frame and build their masks and buffers.
+
+    Args:
+        regions: List of dictionaries containing x, y, width, height for watermark regions
+        frame_width: Width of the video frames
+        frame_height: Height of the video frames
+        padding: Context padding around each region in pixels
+        frame_mask: Full-frame mask of watermark pixels (optional, regions are
+            masked whole otherwise)
+
+    Returns:
+        List of compiled regions; regions that fall outside the frame are dropped
+    """
+    compiled = []
+    for region in regions:
+        x = max(0, min(int(region['x']), frame_width - 1))
+        y = max(0, min(int(region['y']), frame_height - 1))
+        w = min(int(region['width']), frame_width - x)
+        h = min(int(region['height']), frame_height - y)
+        if w <= 0 or h <= 0:
+            continue
+        compiled.append(CompiledRegion(x, y, w, h, frame_width, frame_height, padding, frame_mask))
+    return compiled
+
+
+def regions_to_mask(regions: List[Dict], frame_width: int, frame_height: int) -> np.ndarray:
+    """Rasterise watermark regions into a full-frame uint8 mask (255 = watermark)."""
+    mask = np.zeros((frame_height, frame_width), dtype=np.uint8)
+    for region in compile_regions(regions, frame_width, frame_height, padding=0):
+        mask[region.roi] = 255
+    return mask
+
+
+class WatermarkEngine:
+    """
+    Per-job watermark remover operating on BGR frames.
+
+    Frames are fed with push() and come back in order, possibly delayed: the
+    temporal method holds back half its window as lookahead, so flush() must
+    be called once the input is exhausted.
+    """
+
+    def __init__(self, regions: List[Dict], frame_width: int, frame_height: int,
+                 method: str = 'telea',
+                 padding: int = DEFAULT_CONTEXT_PADDING,
+                 inpaint_radius: int = DEFAULT_INPAINT_RADIUS,
+                 temporal_window: int = DEFAULT_TEMPORAL_WINDOW,
+                 visibility_threshold: int = DEFAULT_VISIBILITY_THRESHOLD,
+                 mask: Optional[np.ndarray] = None):
+        if method not in WATERMARK_METHODS:
+            raise ValueError(f"Unsupported watermark removal method: {method}")
+
+        self.frame_width = frame_width
+        self.frame_height = frame_height
+        self.method = method
+        self.inpaint_radius = inpaint_radius
+        self.regions = compile_regions(regions, frame_width, frame_height, padding, frame_mask=mask)
+
+        # Rolling window state for the temporal method
+        self.radius = max(0, temporal_window // 2)
+        self.window_size = 2 * self.radius + 1
+        self.visibility_threshold = visibility_threshold
+        self._pending = deque()
+        self._slot_index = np.full(self.window_size, -1, dtype=np.int64)
+        self._pushed = 0
+        self._emitted = 0
+
+        if method == 'temporal':
+            for region in self.regions:
+                region.history = np.empty((self.window_size, region.height, region.width, 3), dtype=np.uint8)
+                region.edge_history = np.zeros((self.window_size, region.height, region.width), dtype=bool)
+                region.fill_mask = np.zeros_like(region.mask)
+
+    def process(self, frame: np.ndarray) -> np.ndarray:
+        """Spatially inpaint every compiled region of a frame in place and return it."""
+        for region in self.regions:
+            np.copyto(region.src, frame[region.window])
+            cv2.inpaint(region.src, region.mask, self.inpaint_radius, cv2.INPAINT_TELEA, dst=region.dst)
+            frame[region.roi] = region.dst[region.inner]
+        return frame
+
+    def push(self, frame: np.ndarray) -> List[np.ndarray]:
+        """Feed the next frame and return the frames that are ready, in order."""
+        if self.method != 'temporal':
+            return [self.process(frame)]
+
+        slot = self._pushed % self.window_size
+        for region in self.regions:
+            region.history[slot] = frame[region.roi]
+            region.edge_history[slot] = cv2.Canny(cv2.cvtColor(region.history[slot], cv2.COLOR_BGR2GRAY), 50, 150) > 0
+        self._slot_index[slot] = self._pushed
+        self._pending.append(frame)
+        self._pushed += 1
+
+        ready = []
+        while self._emitted + self.radius < self._pushed:
+            ready.append(self._emit_temporal())
+        return ready
+
+    def flush(self) -> List[np.ndarray]:
+        """Return the frames still held back as lookahead."""
+        ready = []
+        while self._emitted < self._pushed:
+            ready.append(self._emit_temporal())
+        return ready
+
+    def _emit_temporal(self) -> np.ndarray:
+        """Fill the oldest pending frame from its neighbours in the window."""
+        current = self._emitted
+        frame = self._pending.popleft()
+        self._emitted += 1
+
+        valid = (self._slot_index >= 0) & (self._slot_index >= current - self.radius)
+        distance = np.abs(self._slot_index[valid] - current).astype(np.float32)
+        # The frame being filled is never its own source
+        own = self._slot_index[valid] == current
+
+        for region in self.regions:
+            samples = region.history if valid.all() else region.history[valid]
+            edges = region.edge_history if valid.all() else region.edge_history[valid]
+
+            # The watermark's outline stays put while the content moves, even
+            # when the logo is semi-transparent; samples that show it are covered
+            outline = edges.mean(axis=0) >= DEFAULT_EDGE_PERSISTENCE
+            covered = np.zeros(len(samples), dtype=bool)
+            if np.count_nonzero(outline) >= MIN_WATERMARK_EDGE_PIXELS:
+                covered = (edges & outline).sum(axis=(1, 2)) >= COVERED_EDGE_RATIO * np.count_nonzero(outline)
+
+            # An opaque watermark dominates the temporal median; samples that
+            # deviate from it show the content underneath
+            reference = np.median(samples, axis=0).astype(np.int16)
+            deviation = np.abs(samples.astype(np.int16) - reference).max(axis=-1)
+            visible = (deviation > self.visibility_threshold) & ~(covered | own)[:, None, None]
+
+            # Best visible pixel: the uncovered sample nearest in time
+            nearest = np.where(visible, distance[:, None, None], np.inf).argmin(axis=0)
+            filled = np.take_along_axis(samples, nearest[None, :, :, None], axis=0)[0]
+            frame[region.roi] = filled
+
+            never_visible = ~visible.any(axis=0)
+            if never_visible.any():
+                region.fill_mask[region.inner] = never_visible * np.uint8(255)
+                np.copyto(region.src, frame[region.window])
+                cv2.inpaint(region.src, region.fill_mask, self.inpaint_radius, cv2.INPAINT_TELEA, dst=region.dst)
+                frame[region.roi] = region.dst[region.inner]
+
+        return frame
+
+
+def sample_frames(video_path: str, sample_count: int = DEFAULT_SAMPLE_COUNT,
+                  analysis_width: int = DEFAULT_ANALYSIS_WIDTH):
+    """
+    Read frames spread evenly across a video, downscaled and in greyscale.
+
+    Args:
+        video_path: Path to the video file
+        sample_count: Number of frames to sample
+        analysis_width: Width to downscale the frames to
+
+    Returns:
+        Tuple of (uint8 array of shape (n, h, w), scale factor back to full resolution,
+        (full width, full height))
+    """
+    video = cv2.VideoCapture(video_path)
+    if not video.isOpened():
+        raise ValueError(f"Could not open video file: {video_path}")
+
+    try:
+        frame_count = int(video.get(cv2.CAP_PROP_FRAME_COUNT))
+        width = int(video.get(cv2.CAP_PROP_FRAME_WIDTH))
+        height = int(video.get(cv2.CAP_PROP_FRAME_HEIGHT))
+
+        scale = min(1.0, analysis_width / width) if width else 1.0
+        size = (max(1, int(round(width * scale))), max(1, int(round(height * scale))))
+
+        # Skip the very start and end, where intros and outros often live
+        positions = np.linspace(0, max(frame_count - 1, 0), sample_count + 2)[1:-1].astype(int)
+        samples = []
+        for position in np.unique(positions):
+            video.set(cv2.CAP_PROP_POS_FRAMES, int(position))
+            ret, frame = video.read()
+            if not ret:
+                continue
+            grey = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+            samples.append(cv2.resize(grey, size, interpolation=cv2.INTER_AREA))
+
+        if not samples:
+            raise ValueError(f"Could not read any frames from {video_path}")
+
+        return np.stack(samples), 1.0 / scale, (width, height)
+    finally:
+        video.release()
+
+
+def layout_signature(video_path: str, sample_count: int = 6, grid: int = 16) -> str:
+    """
+    Cheap fingerprint of where a video's static overlays sit.
+
+    A handful of tiny frames is reduced to a grid of cells that stay static;
+    videos from the same platform template share the same pattern.
+
+    Args:
+        video_path: Path to the video file
+        sample_count: Number of frames to sample
+        grid: Cells per side of the signature grid
+
+    Returns:
+        Hex string identifying the overlay layout
+    """
+    frames, _, _ = sample_frames(video_path, sample_count, analysis_width=grid * 4)
+    static = frames.std(axis=0) <= DEFAULT_STATIC_STD
+    cells = cv2.resize(static.astype(np.uint8) * 255, (grid, grid), interpolation=cv2.INTER_AREA) > 127
+    return np.packbits(cells).tobytes().hex()
+
+
+def find_persistent_regions(frames: np.ndarray,
+                            edge_persistence: float = DEFAULT_EDGE_PERSISTENCE,
+                            static_std: float = DEFAULT_STATIC_STD) -> List[Dict]:
+    """
+    Find overlay-like regions: edges that stay put while the picture changes.
+
+    Args:
+        frames: Greyscale frames of shape (n, h, w)
+        edge_persistence: Minimum fraction of frames a pixel must be an edge in
+        static_std: Maximum temporal standard deviation of an overlay pixel
+
+    Returns:
+        List of region dicts in the frames' coordinates, with a confidence score
+    """
+    height, width = frames.shape[1:]
+
+    # Per-pixel temporal statistics over the whole sample at once
+    std = frames.std(axis=0)
+    edges = np.stack([cv2.Canny(frame, 50, 150) for frame in frames]) > 0
+    persistence = edges.mean(axis=0)
+
+    # Overlays stay put while the picture moves
+    static = (std <= static_std).astype(np.uint8)
+    persistent_edges = persistence >= edge_persistence
+
+    # An overlay's outline can fall on the moving side of its border after
+    # downscaling, so edges only need to touch a static pixel
+    near_static = cv2.dilate(static, np.ones((3, 3), np.uint8)) > 0
+    candidates = ((static > 0) | (persistent_edges & near_static)).astype(np.uint8)
+
+    # Merge the strokes of a logo or handle into one blob
+    kernel = cv2.getStructuringElement(cv2.MORPH_RECT, (max(3, width // 40), max(3, height // 40)))
+    blobs = cv2.morphologyEx(candidates, cv2.MORPH_CLOSE, kernel)
+
+    count, _, stats, _ = cv2.connectedComponentsWithStats(blobs, connectivity=8)
+    regions = []
+    for label in range(1, count):
+        x, y, w, h, area = stats[label]
+        if area < 16 or w * h > MAX_REGION_AREA_RATIO * width * height:
+            continue
+
+        # Flat static areas (letterboxing, frozen backgrounds) have no outline
+        outline = np.count_nonzero(persistent_edges[max(0, y - 1):y + h + 1, max(0, x - 1):x + w + 1])
+        edge_ratio = outline / (2 * (w + h))
+        if edge_ratio < MIN_OUTLINE_RATIO:
+            continue
+
+        static_ratio = np.count_nonzero(candidates[y:y + h, x:x + w]) / (w * h)
+        regions.append({
+            'x': int(x), 'y': int(y), 'width': int(w), 'height': int(h),
+            'confidence': round(float(static_ratio * min(1.0, edge_ratio)), 3),
+            'source': 'persistence'
+        })
+    return regions
+
+
+def match_templates(frame: np.ndarray, template_paths: List[Path], scale: float,
+                    threshold: float = DEFAULT_TEMPLATE_THRESHOLD) -> List[Dict]:
+    """
+    Locate known logos in a greyscale frame by normalised template matching.
+
+    Args:
+        frame: Greyscale analysis frame
+        template_paths: Logo images, at the video's full resolution
+        scale: Factor from analysis to full resolution
+        threshold: Minimum normalised correlation score
+
+    Returns:
+        List of region dicts in the frame's coordinates
+    """
+    regions = []
+    for template_path in template_paths:
+        template = cv2.imread(str(template_path), cv2.IMREAD_GRAYSCALE)
+        if template is None:
+            continue
+        template = cv2.resize(template, None, fx=1.0 / scale, fy=1.0 / scale, interpolation=cv2.INTER_AREA)
+        h, w = template.shape
+        if h > frame.shape[0] or w > frame.shape[1] or h < 4 or w < 4:
+            continue
+
+        scores = cv2.matchTemplate(frame, template, cv2.TM_CCOEFF_NORMED)
+        _, best, _, (x, y) = cv2.minMaxLoc(scores)
+        if best >= threshold:
+            regions.append({
+                'x': int(x), 'y': int(y), 'width': int(w), 'height': int(h),
+                'confidence': round(float(best), 3),
+                'source': f"template:{template_path.stem}"
+            })
+    return regions
+
+
+def get_template_paths(platform: Optional[str] = None) -> List[Path]:
+    """List logo templates, optionally only those named after a platform."""
+    if not TEMPLATE_DIR.is_dir():
+        return []
+    pattern = f"{platform.lower()}*" if platform else '*'
+    return sorted(p for p in TEMPLATE_DIR.glob(pattern) if p.suffix.lower() in ('.png', '.jpg', '.jpeg'))
+
+
+def detect_regions_in_frames(frames: np.ndarray, scale: float, size: Tuple[int, int],
+                             platform: Optional[str] = None,
+                             use_templates: bool = True,
+                             min_confidence: float = DEFAULT_MIN_CONFIDENCE,
+                             padding: int = 4) -> List[Dict]:
+    """
+    Detect watermark regions in a stack of downscaled greyscale samples.
+
+    Args:
+        frames: Greyscale samples of shape (n, h, w) sharing one layout
+        scale: Factor from analysis to full resolution
+        size: Full-resolution (width, height)
+        platform: Platform name used to pick logo templates (optional)
+        use_templates: Whether to also match known platform logos
+        min_confidence: Regions scoring below this are discarded
+        padding: Margin in full-resolution pixels added around each region
+
+    Returns:
+        List of region dicts (x, y, width, height, confidence, source) at full
+        resolution, sorted by confidence
+    """
+    width, height = size
+
+    # Persistence needs the picture to change around the overlay
+    regions = find_persistent_regions(frames) if len(frames) >= MIN_PERSISTENCE_SAMPLES else []
+    if use_templates:
+        template_paths = get_template_paths(platform)
+        if template_paths:
+            regions.extend(match_templates(np.median(frames, axis=0).astype(np.uint8), template_paths, scale))
+
+    full_resolution = []
+    for region in regions:
+        if region['confidence'] < min_confidence:
+            continue
+        x = max(0, int(region['x'] * scale) - padding)
+        y = max(0, int(region['y'] * scale) - padding)
+        right = min(width, int(np.ceil((region['x'] + region['width']) * scale)) + padding)
+        bottom = min(height, int(np.ceil((region['y'] + region['height']) * scale)) + padding)
+        full_resolution.append(dict(region, x=x, y=y, width=right - x, height=bottom - y))
+
+    return sorted(full_resolution, key=lambda r: r['confidence'], reverse=True)
+
+
+def detect_watermark_regions(video_path: str, platform: Optional[str] = None,
+                             sample_count: int = DEFAULT_SAMPLE_COUNT,
+                             analysis_width: int = DEFAULT_ANALYSIS_WIDTH,
+                             use_templates: bool = True,
+                             min_confidence: float = DEFAULT_MIN_CONFIDENCE,
+                             padding: int = 4) -> List[Dict]:
+    """
+    Detect watermark regions in a video from a sparse low-resolution sample.
+
+    Args:
+        video_path: Path to the video file
+        platform: Platform name used to pick logo templates (optional)
+        sample_count: Number of frames to sample across the video
+        analysis_width: Width the samples are downscaled to
+        use_templates: Whether to also match known platform logos
+        min_confidence: Regions scoring below this are discarded
+        padding: Margin in full-resolution pixels added around each region
+
+    Returns:
+        List of region dicts (x, y, width, height, confidence, source) at full
+        resolution, ready to pass to remove_watermark
+    """
+    frames, scale, size = sample_frames(video_path, sample_count, analysis_width)
+    return detect_regions_in_frames(frames, scale, size, platform=platform, use_templates=use_templates,
+                                    min_confidence=min_confidence, padding=padding)
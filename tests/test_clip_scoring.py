@@ -0,0 +1,88 @@
+"""
+Tests for highlight scoring of planned clips.
+"""
+
+import subprocess
+import sys
+from pathlib import Path
+
+import numpy as np
+import pytest
+from unittest.mock import MagicMock, patch
+from content_pipeline.splitter import score_segments, select_top_clips
+from content_pipeline.splitter.splitter import ENVELOPE_RATE, SCENE_ANALYSIS_FPS
+
+TEST_VIDEO_PATH = "test_video.mp4"
+MAIN_SCRIPT = Path(__file__).resolve().parents[1] / "content_pipeline" / "main.py"
+TEST_SEGMENTS = [
+    {"index": 1, "start_time": 0.0, "end_time": 10.0},
+    {"index": 2, "start_time": 10.0, "end_time": 20.0},
+    {"index": 3, "start_time": 20.0, "end_time": 30.0}
+]
+
+
+@pytest.fixture
+def mock_signals():
+    """Patch the persisted analysis of a 30-second test video."""
+    envelope = np.full(30 * ENVELOPE_RATE, 0.1, dtype=np.float16)
+    envelope[20 * ENVELOPE_RATE:] = 0.8  # Loud final clip
+    scene_scores = np.zeros(30 * SCENE_ANALYSIS_FPS, dtype=np.float16)
+    scene_scores[[60, 70, 80]] = 0.9  # Busy middle clip
+    faces = np.zeros(30, dtype=np.float16)
+    faces[10:30] = 1.0  # Faces in the second half
+
+    with patch('content_pipeline.splitter.scoring.probe_media', return_value=MagicMock(has_audio=True)), \
+            patch('content_pipeline.splitter.scoring.load_audio_envelope', return_value=envelope), \
+            patch('content_pipeline.splitter.scoring.load_scene_scores', return_value=scene_scores), \
+            patch('content_pipeline.splitter.scoring.load_face_presence', return_value=faces) as mock_faces:
+        yield mock_faces
+
+
+def test_score_segments_ranks_on_all_signals(mock_signals):
+    """Test that each signal is measured per clip and combined into one score."""
+    scored = score_segments(TEST_VIDEO_PATH, TEST_SEGMENTS)
+
+    assert [clip["index"] for clip in scored] == [1, 2, 3]
+    assert scored[1]["signals"]["scene_density"] == pytest.approx(0.3)
+    assert scored[0]["signals"]["face_presence"] == 0.0
+    assert scored[2]["signals"]["audio_energy"] == pytest.approx(0.8, abs=1e-3)
+    assert scored[0]["score"] < scored[1]["score"] < scored[2]["score"]
+    assert scored[2]["score"] <= 1.0
+
+
+def test_score_segments_skips_unweighted_signals(mock_signals):
+    """Test that a signal with a weight of 0 is not computed."""
+    scored = score_segments(TEST_VIDEO_PATH, TEST_SEGMENTS, weights={"face_presence": 0})
+
+    mock_signals.assert_not_called()
+    assert all(clip["signals"]["face_presence"] == 0.0 for clip in scored)
+
+
+def test_select_top_clips_keeps_timeline_order():
+    """Test that the best clips are kept in the order they appear in the video."""
+    scored = [dict(segment, score=score) for segment, score in zip(TEST_SEGMENTS, [0.2, 0.9, 0.5])]
+
+    assert [clip["index"] for clip in select_top_clips(scored, 2)] == [2, 3]
+    assert select_top_clips(scored, 0) == []
+
+
+def run_main(*args, cwd):
+    """Run the pipeline CLI the way users invoke it."""
+    return subprocess.run([sys.executable, str(MAIN_SCRIPT), *args], cwd=cwd, capture_output=True, text=True)
+
+
+def test_main_top_k_flag(tmp_path):
+    """Test that the CLI starts and parses --top-k through its real imports."""
+    pytest.importorskip("dotenv")
+
+    help_result = run_main("--help", cwd=tmp_path)
+    invalid_result = run_main("--video", "in.mp4", "--top-k", "two", cwd=tmp_path)
+    missing_result = run_main("--video", str(tmp_path / "missing.mp4"), "--output", str(tmp_path / "out"),
+                              "--top-k", "2", cwd=tmp_path)
+
+    assert help_result.returncode == 0, help_result.stderr
+    assert "--top-k" in help_result.stdout
+    assert invalid_result.returncode == 2
+    assert "argument --top-k: invalid int value" in invalid_result.stderr
+    assert missing_result.returncode == 0, missing_result.stderr
+    assert "Video upload failed" in missing_result.stderr
@@ -0,0 +1,118 @@
+"""
+Tests for the ffmpeg command builders.
+"""
+
+import subprocess
+from unittest.mock import MagicMock, patch
+
+import ffmpeg
+import numpy as np
+import pytest
+
+from tasks.ffmpeg_utils import (FrameWriter, build_enhance_filters, choose_compress_path, interpolate_crf,
+                                mp4_audio_options, parse_bitrate)
+
+
+def test_build_enhance_filters_order():
+    """Test that stabilisation, denoising and scaling are chained in one filtergraph."""
+    video = build_enhance_filters(ffmpeg.input('in.mp4').video, width=1280, scaler='bicubic',
+                                  denoise='hqdn3d', transforms_path='in.trf')
+
+    args = ffmpeg.output(video, 'out.mp4').get_args()
+    graph = args[args.index('-filter_complex') + 1]
+
+    assert graph.index('vidstabtransform') < graph.index('hqdn3d') < graph.index('scale')
+    assert 'scale=1280:-2:flags=bicubic' in graph
+
+
+def test_build_enhance_filters_rejects_unknown_options():
+    """Test that unsupported scalers and denoise filters raise errors."""
+    with pytest.raises(ValueError):
+        build_enhance_filters(ffmpeg.input('in.mp4').video, scaler='nearest-ish')
+    with pytest.raises(ValueError):
+        build_enhance_filters(ffmpeg.input('in.mp4').video, denoise='median')
+
+
+@pytest.fixture
+def crf_curve():
+    """Sampled sizes and SSIM scores that fall as the CRF rises."""
+    return [
+        {'crf': 18, 'bytes_per_second': 400000, 'ssim': 0.99},
+        {'crf': 23, 'bytes_per_second': 200000, 'ssim': 0.98},
+        {'crf': 28, 'bytes_per_second': 100000, 'ssim': 0.96},
+    ]
+
+
+def test_interpolate_crf_for_size(crf_curve):
+    """Test that a size target is interpolated on a log scale and extrapolated past the samples."""
+    assert interpolate_crf(crf_curve, target_bytes_per_second=200000) == pytest.approx(23)
+    assert interpolate_crf(crf_curve, target_bytes_per_second=141421) == pytest.approx(25.5, abs=0.01)
+    assert interpolate_crf(crf_curve, target_bytes_per_second=50000) == pytest.approx(33)
+
+
+def test_interpolate_crf_size_wins_over_quality(crf_curve):
+    """Test that the higher CRF is chosen when both targets are given."""
+    assert interpolate_crf(crf_curve, target_quality=0.98) == pytest.approx(23)
+    assert interpolate_crf(crf_curve, target_bytes_per_second=100000, target_quality=0.98) == pytest.approx(28)
+    with pytest.raises(ValueError):
+        interpolate_crf(crf_curve)
+
+
+def test_parse_bitrate():
+    """Test that ffmpeg-style bitrates are converted to bits per second."""
+    assert parse_bitrate('128k') == 128000
+    assert parse_bitrate('2.5M') == 2500000
+    assert parse_bitrate(96000) == 96000
+
+
+def make_probe(video_codec='h264', audio_codec='aac', size=1_000_000, duration=10.0,
+               video_bitrate=700_000, audio_bitrate=100_000):
+    """Build a minimal ffprobe result."""
+    streams = [{'codec_type': 'video', 'codec_name': video_codec, 'pix_fmt': 'yuv420p',
+                'bit_rate': str(video_bitrate)}]
+    if audio_codec:
+        streams.append({'codec_type': 'audio', 'codec_name': audio_codec, 'bit_rate': str(audio_bitrate)})
+    return {
+        'streams': streams,
+        'format': {'format_name': 'mov,mp4,m4a,3gp,3g2,mj2', 'size': str(size), 'duration': str(duration),
+                   'bit_rate': str(video_bitrate + audio_bitrate)}
+    }
+
+
+def test_choose_compress_path():
+    """Test that the cheapest valid operation is chosen for the source."""
+    target = 2_000_000
+
+    assert choose_compress_path(make_probe(), 'in.mp4', target, 128000) == 'link'
+    assert choose_compress_path(make_probe(), 'in.mov', target, 128000) == 'remux'
+    assert choose_compress_path(make_probe(audio_codec='opus'), 'in.mp4', target, 128000) == 'audio'
+    assert choose_compress_path(make_probe(size=3_000_000, audio_bitrate=1_500_000), 'in.mp4',
+                                target, 128000) == 'audio'
+    assert choose_compress_path(make_probe(video_codec='vp9'), 'in.mp4', target, 128000) == 'transcode'
+    assert choose_compress_path(make_probe(size=3_000_000, video_bitrate=2_000_000), 'in.mp4',
+                                target, 128000) == 'transcode'
+    assert choose_compress_path(make_probe(), 'in.mp4', None, 128000) == 'transcode'
+
+
+def test_mp4_audio_options():
+    """Test that AAC audio is copied and anything else is re-encoded to AAC."""
+    with patch('tasks.ffmpeg_utils.probe_media', return_value=MagicMock(raw=make_probe())):
+        assert mp4_audio_options('in.mp4') == {'acodec': 'copy'}
+    with patch('tasks.ffmpeg_utils.probe_media', return_value=MagicMock(raw=make_probe(audio_codec='vorbis'))):
+        assert mp4_audio_options('in.webm', '96k') == {'acodec': 'aac', 'audio_bitrate': '96k'}
+
+
+def test_frame_writer_reencodes_pcm_audio(tmp_path):
+    """Test that audio an MP4 cannot carry is muxed as AAC."""
+    audio_source = str(tmp_path / "source.mkv")
+    subprocess.run(['ffmpeg', '-v', 'error', '-y', '-f', 'lavfi', '-i', 'sine=frequency=440:duration=1',
+                    '-c:a', 'pcm_s16le', audio_source], check=True)
+    output_path = str(tmp_path / "out.mp4")
+
+    with patch('tasks.ffmpeg_utils.probe_media', return_value=MagicMock(raw=make_probe(audio_codec='pcm_s16le'))):
+        with FrameWriter(output_path, 64, 48, 25, audio_source=audio_source, preset='ultrafast') as out:
+            for _ in range(25):
+                out.write(np.zeros((48, 64, 3), dtype=np.uint8))
+
+    info = subprocess.run(['ffmpeg', '-hide_banner', '-i', output_path], capture_output=True, text=True).stderr
+    assert 'Audio: aac' in info
@@ -0,0 +1,98 @@
+"""
+Tests for the cached media probe.
+"""
+
+from collections import OrderedDict
+from unittest.mock import patch
+
+import pytest
+
+import tasks.media_probe as media_probe
+from tasks.media_probe import MediaInfo, probe_media
+
+
+@pytest.fixture
+def probe_cache(tmp_path, monkeypatch):
+    """Use an empty probe database and in-process cache."""
+    monkeypatch.setattr(media_probe, 'PROBE_CACHE_DB', tmp_path / 'probe.db')
+    monkeypatch.setattr(media_probe, '_probes', OrderedDict())
+    return tmp_path
+
+
+FFPROBE_RESULT = {
+    'streams': [
+        {'codec_type': 'video', 'codec_name': 'h264', 'width': 1920, 'height': 1080,
+         'avg_frame_rate': '30000/1001', 'bit_rate': '4000000', 'nb_frames': '300',
+         'side_data_list': [{'side_data_type': 'Display Matrix', 'rotation': -90}]},
+        {'codec_type': 'audio', 'codec_name': 'aac', 'bit_rate': '128000'}
+    ],
+    'format': {'duration': '10.01', 'size': '5000000', 'bit_rate': '4128000'}
+}
+
+
+def test_media_info_fields():
+    """Test that the typed fields are read from the ffprobe result."""
+    info = MediaInfo('video.mp4', FFPROBE_RESULT)
+
+    assert info.duration == pytest.approx(10.01)
+    assert info.fps == pytest.approx(29.97, abs=0.01)
+    assert info.frame_count == 300
+    assert (info.video_codec, info.audio_codec) == ('h264', 'aac')
+    assert (info.video_bit_rate, info.audio_bit_rate, info.bit_rate) == (4000000, 128000, 4128000)
+    assert info.rotation == 270
+    assert (info.width, info.height) == (1920, 1080)
+    assert info.display_size == (1080, 1920)
+
+
+def test_probe_media_runs_ffprobe_once(probe_cache):
+    """Test that a file is probed once, then served from memory and from SQLite."""
+    path = probe_cache / 'video.mp4'
+    path.write_bytes(b'frames')
+
+    with patch('tasks.media_probe.ffmpeg.probe', return_value=FFPROBE_RESULT) as mock_probe:
+        first = probe_media(str(path))
+        second = probe_media(str(path))
+        media_probe._probes.clear()
+        third = probe_media(str(path))
+
+    mock_probe.assert_called_once()
+    assert first is second
+    assert third.raw == FFPROBE_RESULT
+
+
+def test_probe_media_keyframes_added_on_demand(probe_cache):
+    """Test that the keyframe index is only scanned when asked for and then cached."""
+    path = probe_cache / 'video.mp4'
+    path.write_bytes(b'frames')
+    packets = {'packets': [{'pts_time': '2.0', 'flags': 'K_'}, {'pts_time': '0.0', 'flags': 'K_'},
+                           {'pts_time': '1.0', 'flags': '__'}]}
+
+    with patch('tasks.media_probe.ffmpeg.probe', side_effect=[FFPROBE_RESULT, packets]) as mock_probe:
+        assert probe_media(str(path)).keyframe_times is None
+        assert probe_media(str(path), keyframes=True).keyframe_times == [0.0, 2.0]
+        media_probe._probes.clear()
+        assert probe_media(str(path), keyframes=True).keyframe_times == [0.0, 2.0]
+
+    assert mock_probe.call_count == 2
+
+
+def test_probe_media_memory_cache_is_bounded(probe_cache, monkeypatch):
+    """Test that only the most recently used probes are kept in process."""
+    monkeypatch.setattr(media_probe, 'MEMORY_CACHE_SIZE', 2)
+    paths = []
+    for name in ('a', 'b', 'c'):
+        path = probe_cache / f'{name}.mp4'
+        path.write_bytes(b'frames')
+        paths.append(str(path))
+
+    with patch('tasks.media_probe.ffmpeg.probe', return_value=FFPROBE_RESULT) as mock_probe:
+        probe_media(paths[0])
+        probe_media(paths[1])
+        probe_media(paths[0])
+        probe_media(paths[2])
+        # The evicted probe is served from SQLite
+        probe_media(paths[1])
+
+    assert mock_probe.call_count == 3
+    assert len(media_probe._probes) == 2
+    assert [identity[0] for identity in media_probe._probes] == [paths[2], paths[1]]
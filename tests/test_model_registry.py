@@ -0,0 +1,59 @@
+"""
+Tests for the process-wide model registry.
+"""
+
+import pytest
+from unittest.mock import MagicMock, patch
+from content_pipeline.text_generator.model_registry import ModelRegistry
+
+GB = 1024 ** 3
+
+
+@pytest.fixture
+def registry():
+    """A registry with one fake model and plenty of free memory."""
+    registry = ModelRegistry(idle_seconds=60, min_available_mb=512)
+    registry.loader = MagicMock(side_effect=lambda: object())
+    registry.register('blip', registry.loader)
+    with patch.object(ModelRegistry, '_start_sweeper'), \
+            patch('content_pipeline.text_generator.model_registry.psutil.virtual_memory',
+                  return_value=MagicMock(available=8 * GB)) as mock_memory:
+        registry.memory = mock_memory
+        yield registry
+
+
+def test_model_is_loaded_once_and_shared(registry):
+    """Test that the model is loaded on first use and reused afterwards."""
+    assert not registry.is_loaded('blip')
+
+    with registry.use('blip') as first:
+        pass
+    with registry.use('blip') as second:
+        pass
+
+    registry.loader.assert_called_once()
+    assert first is second
+
+
+def test_idle_model_is_unloaded(registry):
+    """Test that a model is unloaded once idle for longer than idle_seconds, and reloaded on demand."""
+    registry.warm_up('blip')
+    last_used = registry._entries['blip'].last_used
+
+    assert registry.evict_idle(now=last_used + 30) == 0
+    assert registry.evict_idle(now=last_used + 61) == 1
+    assert not registry.is_loaded('blip')
+
+    with registry.use('blip'):
+        pass
+    assert registry.loader.call_count == 2
+
+
+def test_low_memory_unloads_models_not_in_use(registry):
+    """Test that low memory unloads models early, but never one that is in use."""
+    registry.memory.return_value = MagicMock(available=256 * 1024 ** 2)
+
+    with registry.use('blip'):
+        assert registry.evict_idle() == 0
+        assert registry.is_loaded('blip')
+    assert registry.evict_idle() == 1
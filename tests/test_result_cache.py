@@ -0,0 +1,45 @@
+"""
+Tests for the content-addressed result cache.
+"""
+
+import hashlib
+from unittest.mock import MagicMock
+
+from tasks.result_cache import ResultCache, get_file_hash
+
+
+def test_make_key_ignores_param_order():
+    """Test that the cache key depends on parameter values, not their order."""
+    cache = ResultCache(redis_client=MagicMock())
+
+    key = cache.make_key('abc', 'enhance_video', {'denoise': True, 'resolution': '1080p'})
+
+    assert key == cache.make_key('abc', 'enhance_video', {'resolution': '1080p', 'denoise': True})
+    assert key != cache.make_key('abc', 'enhance_video', {'resolution': '720p', 'denoise': True})
+    assert key != cache.make_key('abc', 'compress_video', {'denoise': True, 'resolution': '1080p'})
+    assert key != cache.make_key('abd', 'enhance_video', {'denoise': True, 'resolution': '1080p'})
+
+
+def test_get_file_hash_reads_file_once(tmp_path):
+    """Test that a file is hashed once and then served from memory."""
+    path = tmp_path / 'video.mp4'
+    path.write_bytes(b'frames')
+    redis_client = MagicMock()
+    redis_client.hgetall.return_value = {}
+
+    first = get_file_hash(str(path), redis_client=redis_client)
+    second = get_file_hash(str(path), redis_client=redis_client)
+
+    assert first == second
+    assert first == hashlib.sha256(b'frames').hexdigest()
+    redis_client.hset.assert_called_once()
+
+
+def test_fetch_miss_returns_none(tmp_path):
+    """Test that an unknown key is a miss and leaves the output untouched."""
+    redis_client = MagicMock()
+    redis_client.hgetall.return_value = {}
+    cache = ResultCache(redis_client=redis_client, cache_dir=tmp_path)
+
+    assert cache.fetch('missing', str(tmp_path / 'out.mp4')) is None
+    assert not (tmp_path / 'out.mp4').exists()
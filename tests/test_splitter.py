@@ -3,11 +3,21 @@ Tests for the video splitter functionality.
 """
 
 import os
+import subprocess
+import sys
+from contextlib import nullcontext
+import cv2
 import pytest
 import numpy as np
 from pathlib import Path
 from unittest.mock import MagicMock, patch
-from content_pipeline.splitter import split_video, detect_silence, get_video_info
+from content_pipeline.splitter import split_video, detect_silence, get_video_info, plan_split
+from tasks.media_probe import MediaInfo
+import content_pipeline.splitter.splitter as content_splitter
+from content_pipeline.splitter.splitter import (ANALYSIS_SAMPLE_RATE, find_silent_runs, load_audio_envelope,
+                                                compute_scene_scores, export_segments, select_scene_cuts,
+                                                snap_to_keyframes, SCENE_ANALYSIS_FPS, cut_clip_copy,
+                                                prune_analysis_cache)
 
 # Test Constants
 TEST_VIDEO_PATH = "test_video.mp4"
@@ -15,27 +25,34 @@ TEST_OUTPUT_DIR = "test_output"
 TEST_DURATION = 120.0  # 2 minutes
 TEST_FPS = 30
 TEST_SIZE = (1920, 1080)
+CONTENT_PIPELINE_DIR = Path(__file__).resolve().parents[1] / "content_pipeline"
+
+
+def make_media_info(audio=True, keyframe_times=None):
+    """Build the probe result of a test video."""
+    streams = [{'codec_type': 'video', 'codec_name': 'h264', 'width': TEST_SIZE[0], 'height': TEST_SIZE[1],
+                'avg_frame_rate': f"{TEST_FPS}/1"}]
+    if audio:
+        streams.append({'codec_type': 'audio', 'codec_name': 'aac'})
+    return MediaInfo(TEST_VIDEO_PATH, {'streams': streams, 'format': {'duration': str(TEST_DURATION)}},
+                     keyframe_times)
 
 
 @pytest.fixture
-def mock_video_clip():
-    """Create a mock VideoFileClip for testing."""
-    with patch('content_pipeline.splitter.splitter.VideoFileClip') as mock_clip:
-        # Configure the mock clip
-        instance = mock_clip.return_value.__enter__.return_value
-        instance.duration = TEST_DURATION
-        instance.fps = TEST_FPS
-        instance.size = TEST_SIZE
-        
-        # Mock audio property
-        mock_audio = MagicMock()
-        mock_audio.to_soundarray.return_value = np.zeros(int(TEST_DURATION * 22000))
-        instance.audio = mock_audio
-        
-        yield mock_clip
+def mock_probe():
+    """Patch the media probe to describe a test video with audio."""
+    with patch('content_pipeline.splitter.splitter.probe_media', return_value=make_media_info()) as mock:
+        yield mock
+
+
+@pytest.fixture
+def mock_export_segments():
+    """Patch the single-pass ffmpeg export used in encode mode."""
+    with patch('content_pipeline.splitter.splitter.export_segments') as mock_export:
+        yield mock_export
 
 
-def test_get_video_info(mock_video_clip):
+def test_get_video_info(mock_probe):
     """Test getting video information."""
     info = get_video_info(TEST_VIDEO_PATH)
     
@@ -46,11 +63,10 @@ def test_get_video_info(mock_video_clip):
     assert info["audio"] is True
 
 
-def test_get_video_info_no_audio(mock_video_clip):
+def test_get_video_info_no_audio(mock_probe):
     """Test getting video information for a video without audio."""
     # Configure mock to have no audio
-    instance = mock_video_clip.return_value.__enter__.return_value
-    instance.audio = None
+    mock_probe.return_value = make_media_info(audio=False)
     
     info = get_video_info(TEST_VIDEO_PATH)
     
@@ -60,36 +76,36 @@ def test_get_video_info_no_audio(mock_video_clip):
 
 def test_get_video_info_error():
     """Test error handling when getting video information."""
-    with patch('content_pipeline.splitter.splitter.VideoFileClip', side_effect=Exception("Test error")):
+    with patch('content_pipeline.splitter.splitter.probe_media', side_effect=Exception("Test error")):
         with pytest.raises(Exception) as exc_info:
             get_video_info(TEST_VIDEO_PATH)
         assert "Test error" in str(exc_info.value)
 
 
-def test_detect_silence(mock_video_clip):
+def test_detect_silence(mock_probe):
     """Test silence detection in video."""
     # Create mock audio data with known silent sections
-    audio_length = int(TEST_DURATION * 22000)
-    audio_data = np.ones(audio_length)
+    sample_rate = ANALYSIS_SAMPLE_RATE
+    audio_length = int(TEST_DURATION * sample_rate)
+    audio_data = np.ones(audio_length, dtype=np.float32)
     
     # Add two silent sections
-    silence_start1 = int(0.5 * 22000)  # 0.5s
-    silence_end1 = int(1.5 * 22000)    # 1.5s
-    silence_start2 = int(3.0 * 22000)  # 3.0s
-    silence_end2 = int(4.0 * 22000)    # 4.0s
+    silence_start1 = int(0.5 * sample_rate)  # 0.5s
+    silence_end1 = int(1.5 * sample_rate)    # 1.5s
+    silence_start2 = int(3.0 * sample_rate)  # 3.0s
+    silence_end2 = int(4.0 * sample_rate)    # 4.0s
     
     audio_data[silence_start1:silence_end1] = 0
     audio_data[silence_start2:silence_end2] = 0
     
-    # Configure mock to return our test audio data
-    instance = mock_video_clip.return_value.__enter__.return_value
-    instance.audio.to_soundarray.return_value = audio_data
-    
-    silence_segments = detect_silence(
-        TEST_VIDEO_PATH,
-        threshold=0.1,
-        min_silence_duration=0.5
-    )
+    # Stream the test audio in blocks, the way ffmpeg delivers it
+    blocks = np.array_split(audio_data, 37)
+    with patch('content_pipeline.splitter.splitter.read_audio_blocks', return_value=iter(blocks)):
+        silence_segments = detect_silence(
+            TEST_VIDEO_PATH,
+            threshold=0.1,
+            min_silence_duration=0.5
+        )
     
     assert len(silence_segments) == 2
     assert pytest.approx(silence_segments[0][0], 0.1) == 0.5
@@ -98,21 +114,67 @@ def test_detect_silence(mock_video_clip):
     assert pytest.approx(silence_segments[1][1], 0.1) == 4.0
 
 
-def test_detect_silence_no_audio(mock_video_clip):
+def test_detect_silence_no_audio(mock_probe):
     """Test silence detection for video without audio."""
-    instance = mock_video_clip.return_value.__enter__.return_value
-    instance.audio = None
-    
-    silence_segments = detect_silence(TEST_VIDEO_PATH)
+    mock_probe.return_value = make_media_info(audio=False)
+    with patch('content_pipeline.splitter.splitter.read_audio_blocks') as mock_read:
+        silence_segments = detect_silence(TEST_VIDEO_PATH)
     assert len(silence_segments) == 0
+    mock_read.assert_not_called()
+
+
+def test_find_silent_runs_at_edges():
+    """Test that silent runs touching the start or end of the audio are found."""
+    envelope = np.array([0.0] * 60 + [1.0] * 100 + [0.0] * 40, dtype=np.float32)
+
+    segments = find_silent_runs(envelope, threshold=0.1, min_silence_duration=0.5)
+
+    assert segments == [(0.0, 0.6)]
+    assert find_silent_runs(envelope, threshold=0.1, min_silence_duration=0.3) == [(0.0, 0.6), (1.6, 2.0)]
+
+
+@pytest.fixture
+def analysis_cache(tmp_path):
+    """Point the analysis cache at a temporary directory."""
+    cache_dir = tmp_path / "analysis"
+    with patch('content_pipeline.splitter.splitter.ANALYSIS_CACHE_DIR', cache_dir), \
+            patch('content_pipeline.splitter.splitter.get_file_hash', side_effect=lambda path: Path(path).name):
+        yield cache_dir
+
+
+def test_audio_envelope_is_persisted(tmp_path, analysis_cache):
+    """Test that the envelope is computed once per source and memory-mapped afterwards."""
+    video_path = tmp_path / "video.mp4"
+    video_path.write_bytes(b"frames")
+    audio_data = np.concatenate((np.ones(ANALYSIS_SAMPLE_RATE), np.zeros(ANALYSIS_SAMPLE_RATE))).astype(np.float32)
+
+    with patch('content_pipeline.splitter.splitter.read_audio_blocks', return_value=iter([audio_data])) as mock_read:
+        first = load_audio_envelope(str(video_path))
+        second = load_audio_envelope(str(video_path))
+
+    mock_read.assert_called_once()
+    assert isinstance(second, np.memmap)
+    assert second.dtype == np.float16
+    assert [path.name for path in analysis_cache.glob("*.npy")] == ["video.mp4.envelope.npy"]
+    np.testing.assert_array_equal(first, second)
+    assert find_silent_runs(second, threshold=0.1, min_silence_duration=0.5) == [(1.0, 2.0)]
+
+
+def test_analysis_cache_evicts_least_recently_used(analysis_cache):
+    """Test that the analysis cache keeps to its disk budget, dropping the oldest files first."""
+    analysis_cache.mkdir()
+    for i, name in enumerate(["old", "used", "new"]):
+        path = analysis_cache / f"{name}.envelope.npy"
+        path.write_bytes(b"0" * 100)
+        os.utime(path, (1000 + i, 1000 + i))
+    os.utime(analysis_cache / "used.envelope.npy", (2000, 2000))
+
+    assert prune_analysis_cache(max_bytes=250) == 1
+    assert sorted(path.name for path in analysis_cache.glob("*.npy")) == ["new.envelope.npy", "used.envelope.npy"]
 
 
-def test_split_video_duration_based(mock_video_clip):
+def test_split_video_duration_based(mock_probe, mock_export_segments):
     """Test splitting video based on duration."""
-    # Mock the subclip and write_videofile methods
-    instance = mock_video_clip.return_value.__enter__.return_value
-    instance.subclip.return_value.write_videofile = MagicMock()
-    
     result = split_video(
         video_path=TEST_VIDEO_PATH,
         output_dir=TEST_OUTPUT_DIR,
@@ -130,9 +192,13 @@ def test_split_video_duration_based(mock_video_clip):
         assert clip["end_time"] == (i + 1) * 30.0
         assert clip["index"] == i + 1
         assert clip["path"].endswith(f"clip_{i+1:03d}.mp4")
+    
+    # All clips are written by one ffmpeg pass
+    mock_export_segments.assert_called_once()
+    assert list(mock_export_segments.call_args.args[3]) == [0, 30.0, 60.0, 90.0, 120.0]
 
 
-def test_split_video_silence_based(mock_video_clip):
+def test_split_video_silence_based(mock_probe, mock_export_segments):
     """Test splitting video based on silence detection."""
     # Mock silence detection to return specific split points
     with patch('content_pipeline.splitter.splitter.detect_silence') as mock_detect:
@@ -142,10 +208,6 @@ def test_split_video_silence_based(mock_video_clip):
             (90.0, 91.0)   # Split around 90.5s
         ]
         
-        # Mock the subclip and write_videofile methods
-        instance = mock_video_clip.return_value.__enter__.return_value
-        instance.subclip.return_value.write_videofile = MagicMock()
-        
         result = split_video(
             video_path=TEST_VIDEO_PATH,
             output_dir=TEST_OUTPUT_DIR,
@@ -163,7 +225,7 @@ def test_split_video_silence_based(mock_video_clip):
             assert clip["index"] == i + 1
 
 
-def test_split_video_min_duration_filter(mock_video_clip):
+def test_split_video_min_duration_filter(mock_probe, mock_export_segments):
     """Test that clips shorter than min_clip_duration are filtered out."""
     # Mock silence detection to return split points that would create some short clips
     with patch('content_pipeline.splitter.splitter.detect_silence') as mock_detect:
@@ -174,10 +236,6 @@ def test_split_video_min_duration_filter(mock_video_clip):
             (60.0, 60.5)    # Would create a 30-second clip (keep)
         ]
         
-        # Mock the subclip and write_videofile methods
-        instance = mock_video_clip.return_value.__enter__.return_value
-        instance.subclip.return_value.write_videofile = MagicMock()
-        
         result = split_video(
             video_path=TEST_VIDEO_PATH,
             output_dir=TEST_OUTPUT_DIR,
@@ -193,10 +251,10 @@ def test_split_video_min_duration_filter(mock_video_clip):
             assert clip["duration"] >= 5.0
 
 
-def test_split_video_error_handling(mock_video_clip):
+def test_split_video_error_handling(mock_probe):
     """Test error handling during video splitting."""
-    # Mock VideoFileClip to raise an exception
-    mock_video_clip.side_effect = Exception("Test error")
+    # Mock the probe to raise an exception
+    mock_probe.side_effect = Exception("Test error")
     
     result = split_video(TEST_VIDEO_PATH)
     
@@ -205,22 +263,231 @@ def test_split_video_error_handling(mock_video_clip):
     assert "Test error" in result["error"]
 
 
-def test_split_video_output_directory_creation():
+def test_split_video_output_directory_creation(mock_export_segments):
     """Test that the output directory is created if it doesn't exist."""
     with patch('os.makedirs') as mock_makedirs:
-        with patch('content_pipeline.splitter.splitter.VideoFileClip') as mock_clip:
-            # Configure the mock clip
-            instance = mock_clip.return_value.__enter__.return_value
-            instance.duration = TEST_DURATION
-            instance.fps = TEST_FPS
-            instance.size = TEST_SIZE
-            instance.audio = None
-            instance.subclip.return_value.write_videofile = MagicMock()
-            
+        with patch('content_pipeline.splitter.splitter.probe_media', return_value=make_media_info(audio=False)):
             split_video(
                 video_path=TEST_VIDEO_PATH,
                 output_dir=TEST_OUTPUT_DIR
             )
             
             # Verify that makedirs was called with the output directory
-            mock_makedirs.assert_called_with(TEST_OUTPUT_DIR, exist_ok=True) 
\ No newline at end of file
+            mock_makedirs.assert_called_with(TEST_OUTPUT_DIR, exist_ok=True) 
+
+
+def test_snap_to_keyframes():
+    """Test that inner split points move to the nearest keyframe within the tolerance."""
+    keyframes = [0.0, 2.0, 4.0, 6.0, 8.0, 10.0, 14.0]
+    
+    assert snap_to_keyframes([0, 3.9, 6.8, 12.0, 20.0], keyframes, tolerance=1.0) == [0, 4.0, 6.0, 12.0, 20.0]
+    # Points snapping to the same keyframe are merged
+    assert snap_to_keyframes([0, 3.9, 4.2, 20.0], keyframes, tolerance=1.0) == [0, 4.0, 20.0]
+    assert snap_to_keyframes([0, 3.9, 20.0], [], tolerance=1.0) == [0, 3.9, 20.0]
+
+
+def test_split_video_copy_mode(mock_probe, mock_export_segments):
+    """Test that copy mode cuts on keyframes without re-encoding."""
+    mock_probe.return_value = make_media_info(keyframe_times=[i * 4.0 for i in range(31)])
+    with patch('content_pipeline.splitter.splitter.cut_clip_copy') as mock_cut:
+        result = split_video(
+            video_path=TEST_VIDEO_PATH,
+            output_dir=TEST_OUTPUT_DIR,
+            max_clip_duration=30,
+            mode="copy"
+        )
+    
+    assert result["success"] is True
+    assert [clip["start_time"] for clip in result["clips"]] == [0, 28.0, 60.0, 88.0]
+    assert mock_cut.call_count == 4
+    assert mock_cut.call_args.kwargs["video_codec"] == "h264"
+    mock_export_segments.assert_not_called()
+
+
+def test_split_video_rejects_unknown_mode(mock_probe):
+    """Test that an unsupported split mode is reported as an error."""
+    result = split_video(TEST_VIDEO_PATH, output_dir=TEST_OUTPUT_DIR, mode="fast")
+    
+    assert result["success"] is False
+    assert "Unsupported split mode" in result["error"]
+
+
+def test_export_segments_forces_keyframes_at_split_points(tmp_path):
+    """Test that one ffmpeg run cuts every clip at the split points."""
+    def fake_ffmpeg(args):
+        for i in range(3):
+            (tmp_path / f"video_clip_{i+1:03d}.mp4").write_bytes(b"")
+
+    with patch('content_pipeline.splitter.splitter._run_ffmpeg', side_effect=fake_ffmpeg) as mock_run, \
+            patch('content_pipeline.splitter.splitter.thread_budget.lease',
+                  return_value=nullcontext(3)) as mock_lease:
+        paths = export_segments(TEST_VIDEO_PATH, str(tmp_path), "video", [0, 30.5, 60.5, 90.0])
+
+    args = mock_run.call_args.args[0]
+    assert mock_run.call_count == 1
+    mock_lease.assert_called_once()
+    assert args[args.index('-threads') + 1] == 3
+    assert args[args.index('-force_key_frames') + 1] == "30.500000,60.500000"
+    assert args[args.index('-segment_times') + 1] == "30.500000,60.500000"
+    assert [os.path.basename(path) for path in paths] == [f"video_clip_{i:03d}.mp4" for i in (1, 2, 3)]
+
+
+def test_split_video_parallel_export(mock_probe, mock_export_segments):
+    """Test that workers > 1 exports the clips through the process pool in order."""
+    with patch('content_pipeline.splitter.splitter.export_clips_parallel') as mock_parallel:
+        result = split_video(
+            video_path=TEST_VIDEO_PATH,
+            output_dir=TEST_OUTPUT_DIR,
+            max_clip_duration=30,
+            workers=4
+        )
+    
+    assert result["success"] is True
+    mock_export_segments.assert_not_called()
+    output_paths = mock_parallel.call_args.args[1]
+    assert output_paths == [clip["path"] for clip in result["clips"]]
+    assert mock_parallel.call_args.args[3] == 4
+
+
+def test_split_video_exports_selected_clips(mock_probe, mock_export_segments):
+    """Test that only the requested clips are encoded, keeping their planned index."""
+    with patch('content_pipeline.splitter.splitter.encode_clip') as mock_encode:
+        result = split_video(
+            video_path=TEST_VIDEO_PATH,
+            output_dir=TEST_OUTPUT_DIR,
+            max_clip_duration=30,
+            clip_indices=[4, 2]
+        )
+    
+    assert result["success"] is True
+    mock_export_segments.assert_not_called()
+    assert [clip["index"] for clip in result["clips"]] == [2, 4]
+    assert [call.args[2:4] for call in mock_encode.call_args_list] == [(30.0, 60.0), (90.0, 120.0)]
+    assert result["clips"][1]["path"].endswith("clip_004.mp4")
+
+
+def test_compute_scene_scores_across_batches():
+    """Test that a colour change scores high even when it falls between batches."""
+    red = np.zeros((4, 9, 16, 3), dtype=np.uint8)
+    red[..., 0] = 255
+    blue = np.zeros((4, 9, 16, 3), dtype=np.uint8)
+    blue[..., 2] = 255
+    
+    scores = compute_scene_scores([red, blue[:2], blue[2:]])
+    
+    assert len(scores) == 8
+    assert scores[4] == pytest.approx(1.0)
+    assert np.all(np.delete(scores, 4) == 0)
+
+
+def test_select_scene_cuts_respects_clip_limits():
+    """Test that scene cuts keep clips between the minimum and maximum duration."""
+    scores = np.zeros(125, dtype=np.float32)  # 25 seconds at 5 fps
+    scores[[25, 60, 80, 95]] = 0.9  # Scene changes at 5, 12, 16 and 19 seconds
+    
+    assert select_scene_cuts(scores, 25.0, fps=5, min_clip_duration=2, max_clip_duration=60) == \
+        [0.0, 5.0, 12.0, 16.0, 19.0, 25.0]
+    # 16 is dropped because it would leave a 4-second clip
+    assert select_scene_cuts(scores, 25.0, fps=5, min_clip_duration=5, max_clip_duration=60) == \
+        [0.0, 5.0, 12.0, 19.0, 25.0]
+    # Long shots are cut at the maximum duration
+    cuts = select_scene_cuts(np.zeros(125, dtype=np.float32), 25.0, fps=5, min_clip_duration=1, max_clip_duration=10)
+    assert cuts == [0.0, 10.0, 20.0, 25.0]
+
+
+def make_scene_scores(cut_times):
+    """Build scene scores for the test video with hard cuts at the given times."""
+    scores = np.zeros(int(TEST_DURATION * SCENE_ANALYSIS_FPS), dtype=np.float32)
+    for cut_time in cut_times:
+        scores[int(cut_time * SCENE_ANALYSIS_FPS)] = 0.9
+    return scores
+
+
+def test_split_video_scene_based(mock_probe, mock_export_segments):
+    """Test that scene-based splitting cuts on the detected scene changes."""
+    with patch('content_pipeline.splitter.splitter.load_scene_scores',
+               return_value=make_scene_scores([42.0, 80.0])):
+        result = split_video(
+            video_path=TEST_VIDEO_PATH,
+            output_dir=TEST_OUTPUT_DIR,
+            split_on_scenes=True
+        )
+    
+    assert result["success"] is True
+    assert [clip["start_time"] for clip in result["clips"]] == [0.0, 42.0, 80.0]
+
+
+def test_plan_split_reports_reasons_without_writing(mock_probe, tmp_path):
+    """Test that a split plan explains each cut and writes nothing."""
+    output_dir = tmp_path / "clips"
+    with patch('content_pipeline.splitter.splitter.load_scene_scores',
+               return_value=make_scene_scores([10.0])), \
+            patch('content_pipeline.splitter.splitter.export_segments') as mock_export:
+        plan = plan_split(TEST_VIDEO_PATH, split_on_scenes=True)
+
+    assert plan["success"] is True
+    assert [clip["start_time"] for clip in plan["clips"]] == [0.0, 10.0, 70.0]
+    assert [clip["reason"] for clip in plan["clips"]] == ["scene", "max_duration", "end"]
+    assert plan["clips"][1]["duration"] == 60.0
+    mock_export.assert_not_called()
+    assert not output_dir.exists()
+
+
+@pytest.fixture
+def gop_video(tmp_path):
+    """A four-second 25 fps H.264/AAC video with a keyframe every second."""
+    video_path = tmp_path / "gop.mp4"
+    subprocess.run([
+        'ffmpeg', '-v', 'error', '-y',
+        '-f', 'lavfi', '-i', 'testsrc=size=160x120:rate=25:duration=4',
+        '-f', 'lavfi', '-i', 'sine=frequency=440:duration=4',
+        '-c:v', 'libx264', '-g', '25', '-keyint_min', '25', '-sc_threshold', '0',
+        '-c:a', 'aac', '-shortest', str(video_path)
+    ], check=True)
+    return str(video_path)
+
+
+def count_frames(video_path):
+    """Count the frames of a video by decoding it."""
+    video = cv2.VideoCapture(video_path)
+    frames = 0
+    while video.grab():
+        frames += 1
+    video.release()
+    return frames
+
+
+@pytest.mark.parametrize("start_time, end_time, copied", [(1.0, 3.0, True), (1.4, 3.0, False), (1.0, 2.5, False)])
+def test_cut_clip_copy(gop_video, tmp_path, start_time, end_time, copied):
+    """Test that clips between keyframes are copied and others are re-encoded exactly."""
+    output_path = str(tmp_path / "clip.mp4")
+    with patch('content_pipeline.splitter.splitter.encode_clip',
+               wraps=content_splitter.encode_clip) as mock_encode, \
+            patch('content_pipeline.splitter.splitter.probe_media', return_value=MagicMock(duration=4.0)):
+        cut_clip_copy(gop_video, output_path, start_time, end_time, [0.0, 1.0, 2.0, 3.0],
+                      video_codec='h264', audio_codec='aac')
+    
+    assert mock_encode.called is not copied
+    assert count_frames(output_path) == pytest.approx((end_time - start_time) * 25, abs=1)
+
+
+def test_splitter_imports_from_pipeline_entry_point(tmp_path):
+    """Test that the splitter imports as a top-level package after main.py's path setup."""
+    main_path = CONTENT_PIPELINE_DIR / "main.py"
+    main_source = main_path.read_text()
+    path_setup = main_source[:main_source.index("\n", main_source.index("sys.path.insert"))]
+    # The script directory comes first on the path, as when running `python content_pipeline/main.py`
+    code = "\n".join([
+        "import sys",
+        f"sys.path[0] = {str(CONTENT_PIPELINE_DIR)!r}",
+        f"__file__ = {str(main_path)!r}",
+        path_setup,
+        "import splitter",
+        "print(splitter.plan_split.__module__)",
+    ])
+
+    result = subprocess.run([sys.executable, "-c", code], cwd=tmp_path, capture_output=True, text=True,
+                            env={**os.environ, "PYTHONPATH": ""})
+
+    assert result.returncode == 0, result.stderr
+    assert result.stdout.strip() == "splitter.splitter"
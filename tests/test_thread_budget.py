@@ -0,0 +1,45 @@
+"""
+Tests for the per-node CPU thread budget.
+"""
+
+import json
+
+from tasks.thread_budget import ThreadBudget
+
+
+def test_leases_share_the_budget(tmp_path):
+    """Test that concurrent leases never exceed the node's threads."""
+    budget = ThreadBudget(total=6, lease_file=str(tmp_path / 'leases.json'))
+
+    first_id, first = budget.acquire(4)
+    second_id, second = budget.acquire(4)
+
+    assert (first, second) == (4, 2)
+    assert budget.available() == 0
+
+    budget.release(first_id)
+    assert budget.available() == 4
+    budget.release(second_id)
+    assert budget.available() == 6
+
+
+def test_waits_then_proceeds_with_one_thread(tmp_path):
+    """Test that a job proceeds with a single thread once the wait times out."""
+    budget = ThreadBudget(total=2, lease_file=str(tmp_path / 'leases.json'))
+    budget.acquire(2)
+
+    _, threads = budget.acquire(3, timeout=0)
+
+    assert threads == 1
+
+
+def test_reclaims_leases_of_dead_processes(tmp_path):
+    """Test that leases left behind by crashed workers are released."""
+    lease_file = tmp_path / 'leases.json'
+    lease_file.write_text(json.dumps({'stale': {'pid': 2 ** 22 + 1, 'threads': 8, 'since': 0}}))
+    budget = ThreadBudget(total=8, lease_file=str(lease_file))
+
+    with budget.lease(3) as threads:
+        assert threads == 3
+        assert budget.available() == 5
+    assert budget.available() == 8
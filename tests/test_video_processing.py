@@ -0,0 +1,58 @@
+"""
+Tests for the video processing tasks.
+"""
+
+import subprocess
+from contextlib import nullcontext
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+from tasks.media_probe import MediaInfo
+from tasks.video_processing import _effective_workers, compress_video
+
+
+@pytest.fixture
+def source_video(tmp_path):
+    """A two-second test video with an AAC audio track."""
+    video_path = tmp_path / "source.mp4"
+    subprocess.run([
+        'ffmpeg', '-v', 'error', '-y',
+        '-f', 'lavfi', '-i', 'testsrc=size=160x120:rate=25:duration=2',
+        '-f', 'lavfi', '-i', 'sine=frequency=440:duration=2',
+        '-c:v', 'libx264', '-c:a', 'aac', '-shortest', str(video_path)
+    ], check=True)
+    return str(video_path)
+
+
+def test_compress_video_transcode(source_video):
+    """Test that the transcode path encodes video and audio to the target bitrate."""
+    info = MediaInfo(source_video, {
+        'format': {'duration': '2.0'},
+        'streams': [{'codec_type': 'video', 'codec_name': 'h264', 'width': 160, 'height': 120},
+                    {'codec_type': 'audio', 'codec_name': 'aac'}]
+    })
+    result_cache = MagicMock()
+    result_cache.fetch.return_value = None
+
+    with patch('tasks.video_processing.ResultCache', return_value=result_cache), \
+            patch('tasks.video_processing.probe_media', return_value=info), \
+            patch('tasks.video_processing.choose_compress_path', return_value='transcode'), \
+            patch('tasks.video_processing.thread_budget.lease', return_value=nullcontext(1)), \
+            patch('tasks.video_processing.compress_video.retry', side_effect=lambda exc, **kwargs: exc):
+        result = compress_video.apply(args=(source_video,), kwargs={'target_size_mb': 0.05,
+                                                                    'input_hash': 'abc'}).get()
+
+    assert result['status'] == 'success'
+    assert result['path'] == 'transcode'
+    assert result['video_bitrate'] > 0
+    assert result['size_mb'] > 0
+    result_cache.put.assert_called_once()
+
+
+def test_effective_workers_in_daemonic_process():
+    """Test that parallel segments fall back to one process inside prefork pool children."""
+    with patch('tasks.video_processing.multiprocessing.current_process', return_value=MagicMock(daemon=True)):
+        assert _effective_workers(4) == 1
+    with patch('tasks.video_processing.multiprocessing.current_process', return_value=MagicMock(daemon=False)):
+        assert _effective_workers(4) == 4
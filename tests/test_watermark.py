@@ -0,0 +1,304 @@
+"""
+Tests for the watermark removal engine.
+"""
+
+import time
+
+import numpy as np
+import pytest
+from PIL import Image
+
+from tasks.checkpoint import JobCheckpoint
+from tasks.ffmpeg_utils import plan_keyframe_segments
+from tasks.frame_pipeline import run_frame_pipeline
+from tasks.image_watermark import remove_image_watermarks
+from tasks.watermark import WatermarkEngine, compile_regions, find_persistent_regions, regions_to_mask
+
+FRAME_WIDTH = 160
+FRAME_HEIGHT = 90
+
+
+@pytest.fixture
+def watermarked_frame():
+    """Create a gradient frame with a solid white 'logo' box."""
+    ramp = np.linspace(0, 200, FRAME_WIDTH, dtype=np.uint8)
+    frame = np.repeat(np.repeat(ramp[np.newaxis, :, np.newaxis], FRAME_HEIGHT, axis=0), 3, axis=2)
+    frame[10:20, 120:150] = 255
+    return frame
+
+
+def test_compile_regions_clamps_to_frame():
+    """Test that regions are clamped to the frame and empty ones dropped."""
+    regions = [
+        {'x': 150, 'y': 80, 'width': 50, 'height': 50},
+        {'x': -10, 'y': 0, 'width': 20, 'height': 10},
+        {'x': 10, 'y': 10, 'width': 0, 'height': 10},
+    ]
+
+    compiled = compile_regions(regions, FRAME_WIDTH, FRAME_HEIGHT, padding=4)
+
+    assert [r.as_dict() for r in compiled] == [
+        {'x': 150, 'y': 80, 'width': 10, 'height': 10},
+        {'x': 0, 'y': 0, 'width': 20, 'height': 10},
+    ]
+    # Mask covers only the region inside the padded window
+    assert compiled[0].mask.shape == (14, 14)
+    assert int(compiled[0].mask.sum()) == 10 * 10 * 255
+
+
+def test_engine_only_touches_regions(watermarked_frame):
+    """Test that pixels outside the watermark regions are left unchanged."""
+    original = watermarked_frame.copy()
+    engine = WatermarkEngine([{'x': 120, 'y': 10, 'width': 30, 'height': 10}], FRAME_WIDTH, FRAME_HEIGHT)
+
+    result = engine.process(watermarked_frame)
+
+    assert result is watermarked_frame
+    outside = np.ones(original.shape[:2], dtype=bool)
+    outside[10:20, 120:150] = False
+    assert np.array_equal(result[outside], original[outside])
+
+
+def test_engine_fills_from_context(watermarked_frame):
+    """Test that the watermark is replaced with surrounding content."""
+    engine = WatermarkEngine([{'x': 120, 'y': 10, 'width': 30, 'height': 10}], FRAME_WIDTH, FRAME_HEIGHT)
+
+    # Run twice to make sure the preallocated buffers are reusable
+    engine.process(watermarked_frame.copy())
+    result = engine.process(watermarked_frame)
+
+    assert result[10:20, 120:150].max() < 255
+
+
+def test_temporal_fills_from_uncovered_frames():
+    """Test that the temporal method fills a region from frames where it is uncovered."""
+    region = {'x': 40, 'y': 30, 'width': 20, 'height': 10}
+    engine = WatermarkEngine([region], FRAME_WIDTH, FRAME_HEIGHT, method='temporal', temporal_window=9)
+
+    frames = []
+    for i in range(12):
+        frame = np.full((FRAME_HEIGHT, FRAME_WIDTH, 3), 60, dtype=np.uint8)
+        # The logo blinks off for the first and last two frames
+        if 2 <= i < 10:
+            frame[30:40, 40:60] = 255
+        frames.append(frame)
+
+    output = []
+    for frame in frames:
+        output.extend(engine.push(frame))
+    output.extend(engine.flush())
+
+    assert len(output) == len(frames)
+    assert all(out is frame for out, frame in zip(output, frames))
+    # Frames within reach of an uncovered frame get the real background back
+    for i in (2, 3, 8, 9):
+        assert np.all(output[i][30:40, 40:60] == 60)
+
+
+def test_temporal_falls_back_to_inpainting(watermarked_frame):
+    """Test that pixels never uncovered in the window are spatially inpainted."""
+    engine = WatermarkEngine([{'x': 120, 'y': 10, 'width': 30, 'height': 10}], FRAME_WIDTH, FRAME_HEIGHT,
+                             method='temporal', temporal_window=5)
+
+    output = []
+    for _ in range(6):
+        output.extend(engine.push(watermarked_frame.copy()))
+    output.extend(engine.flush())
+
+    assert len(output) == 6
+    assert all(frame[10:20, 120:150].max() < 255 for frame in output)
+
+
+def test_temporal_removes_semi_transparent_logo():
+    """Test that an always-present, alpha-blended logo over moving content is not passed through."""
+    region = {'x': 56, 'y': 26, 'width': 48, 'height': 28}
+    logo = np.zeros((FRAME_HEIGHT, FRAME_WIDTH), dtype=bool)
+    logo[30:50, 60:100] = True
+    logo[34:46, 64:96] = False  # Hollow box with a bar through it, like a wordmark
+    logo[39:41, 64:96] = True
+    engine = WatermarkEngine([region], FRAME_WIDTH, FRAME_HEIGHT, method='temporal', temporal_window=9)
+
+    clean_frames, frames = [], []
+    for i in range(12):
+        # Content pans to the right underneath the logo
+        ramp = ((np.arange(FRAME_WIDTH) * 3 + i * 11) % 160).astype(np.uint8)
+        clean = np.repeat(np.repeat(ramp[np.newaxis, :, np.newaxis], FRAME_HEIGHT, axis=0), 3, axis=2)
+        frame = clean.copy()
+        frame[logo] = (0.5 * frame[logo] + 0.5 * 255).astype(np.uint8)
+        clean_frames.append(clean)
+        frames.append(frame)
+
+    watermarked_error = [np.abs(frame[logo].astype(int) - clean[logo]).mean()
+                         for frame, clean in zip(frames, clean_frames)]
+    output = []
+    for frame in [frame.copy() for frame in frames]:
+        output.extend(engine.push(frame))
+    output.extend(engine.flush())
+
+    for out, clean, error in zip(output, clean_frames, watermarked_error):
+        assert np.abs(out[logo].astype(int) - clean[logo]).mean() < 0.5 * error
+
+
+def test_engine_rejects_unknown_method():
+    """Test that an unsupported method raises an error."""
+    with pytest.raises(ValueError):
+        WatermarkEngine([], FRAME_WIDTH, FRAME_HEIGHT, method='blur')
+
+
+def test_plan_keyframe_segments():
+    """Test that parallel segments start on the keyframes nearest an even split."""
+    keyframes = [0.0, 2.0, 4.0, 6.0, 8.0, 10.0]
+
+    segments = plan_keyframe_segments(keyframes, fps=30, frame_count=360, parts=3)
+
+    assert segments == [(0, 120), (120, 240), (240, 360)]
+
+
+def test_plan_keyframe_segments_sparse_keyframes():
+    """Test that segments are merged when there are fewer keyframes than parts."""
+    segments = plan_keyframe_segments([0.0, 5.0], fps=30, frame_count=300, parts=4)
+
+    assert segments == [(0, 150), (150, 300)]
+    assert plan_keyframe_segments([0.0], fps=30, frame_count=300, parts=4) == [(0, 300)]
+
+
+def test_checkpoint_resumes_completed_segments(tmp_path):
+    """Test that a re-submitted job keeps its completed segments and plan."""
+    params = {'video_path': '/videos/in.mp4', 'regions': [{'x': 1, 'y': 2, 'width': 3, 'height': 4}]}
+    checkpoint = JobCheckpoint(str(tmp_path / 'ckpt'), params)
+    checkpoint.start([(0, 60), (60, 120), (120, 180)])
+    open(checkpoint.segment_path(0), 'wb').close()
+    checkpoint.mark_complete(0)
+
+    resumed = JobCheckpoint(str(tmp_path / 'ckpt'), params)
+    segments = resumed.start([(0, 90), (90, 180)])
+
+    assert segments == [(0, 60), (60, 120), (120, 180)]
+    assert resumed.resumed
+    assert resumed.is_complete(0) and not resumed.is_complete(1)
+    assert resumed.last_completed_frame == 60
+
+
+def test_checkpoint_discards_other_jobs(tmp_path):
+    """Test that a checkpoint written with different parameters is not reused."""
+    checkpoint = JobCheckpoint(str(tmp_path / 'ckpt'), {'method': 'telea'})
+    checkpoint.start([(0, 60), (60, 120)])
+    open(checkpoint.segment_path(0), 'wb').close()
+    checkpoint.mark_complete(0)
+
+    other = JobCheckpoint(str(tmp_path / 'ckpt'), {'method': 'temporal'})
+    other.start([(0, 120)])
+
+    assert not other.resumed
+    assert other.segments == [(0, 120)]
+    assert not (tmp_path / 'ckpt' / 'segment_0000.mp4').exists()
+
+
+def test_find_persistent_regions():
+    """Test that a static overlay on moving content is detected."""
+    rng = np.random.default_rng(0)
+    frames = rng.integers(0, 256, size=(12, FRAME_HEIGHT, FRAME_WIDTH), dtype=np.uint8)
+    # Static 'logo': a bright box with a dark stroke through it
+    frames[:, 10:30, 110:150] = 230
+    frames[:, 18:22, 115:145] = 20
+
+    regions = find_persistent_regions(frames)
+
+    assert len(regions) == 1
+    region = regions[0]
+    assert region['x'] <= 110 and region['x'] + region['width'] >= 150
+    assert region['y'] <= 10 and region['y'] + region['height'] >= 30
+    assert region['source'] == 'persistence'
+
+
+def test_find_persistent_regions_ignores_static_scene():
+    """Test that a completely static picture does not produce regions."""
+    frames = np.repeat(np.linspace(0, 255, FRAME_WIDTH, dtype=np.uint8)[np.newaxis, np.newaxis, :], 8, axis=0)
+    frames = np.repeat(frames, FRAME_HEIGHT, axis=1)
+
+    assert find_persistent_regions(frames) == []
+
+
+def test_compile_regions_with_frame_mask():
+    """Test that a precomputed frame mask narrows each region's inpainting mask."""
+    frame_mask = regions_to_mask([{'x': 20, 'y': 20, 'width': 5, 'height': 5}], FRAME_WIDTH, FRAME_HEIGHT)
+
+    compiled = compile_regions([{'x': 10, 'y': 10, 'width': 30, 'height': 30}], FRAME_WIDTH, FRAME_HEIGHT,
+                               padding=2, frame_mask=frame_mask)
+
+    assert frame_mask.sum() == 25 * 255
+    assert int(compiled[0].mask.sum()) == 25 * 255
+    assert compiled[0].mask[12:17, 12:17].all()
+
+
+def test_frame_pipeline_keeps_order():
+    """Test that frames processed by several threads are written in input order."""
+    frames = iter([np.full((2, 2), i, dtype=np.uint8) for i in range(50)])
+    written = []
+
+    def make_processor():
+        def process(frame):
+            # Uneven work so results complete out of order
+            time.sleep(0.001 * (int(frame[0, 0]) % 3))
+            return [frame]
+        return process
+
+    count = run_frame_pipeline(lambda: next(frames, None), make_processor, written.append,
+                               workers=4, queue_depth=3)
+
+    assert count == 50
+    assert [int(frame[0, 0]) for frame in written] == list(range(50))
+
+
+def test_frame_pipeline_propagates_errors():
+    """Test that a failing worker stops the pipeline and re-raises."""
+    frames = iter([np.zeros((2, 2), dtype=np.uint8)] * 20)
+
+    def make_processor():
+        def process(frame):
+            raise RuntimeError("inpaint failed")
+        return process
+
+    with pytest.raises(RuntimeError, match="inpaint failed"):
+        run_frame_pipeline(lambda: next(frames, None), make_processor, lambda frame: None, workers=2)
+
+
+def test_remove_image_watermarks_batch(tmp_path, watermarked_frame):
+    """Test that a batch of images is inpainted, keeps EXIF and reports failures."""
+    exif = Image.Exif()
+    exif[0x010f] = 'TestCam'
+    paths = []
+    for i in range(3):
+        path = str(tmp_path / f"image_{i}.jpg")
+        Image.fromarray(watermarked_frame).save(path, exif=exif, quality=100)
+        paths.append(path)
+    broken = tmp_path / 'broken.jpg'
+    broken.write_bytes(b'not an image')
+    paths.append(str(broken))
+
+    result = remove_image_watermarks(paths, regions=[{'x': 120, 'y': 10, 'width': 30, 'height': 10}],
+                                     output_dir=str(tmp_path / 'out'), workers=2)
+
+    assert [item['input_path'] for item in result['images']] == paths[:3]
+    assert result['failed'][0]['input_path'] == str(broken)
+    assert result['throughput']['images'] == 3
+    with Image.open(result['images'][0]['output_path']) as output:
+        assert output.getexif()[0x010f] == 'TestCam'
+        assert np.asarray(output)[12:18, 125:145].max() < 240
+
+
+def test_remove_image_watermarks_drops_stale_icc_profile(tmp_path, watermarked_frame):
+    """Test that an image converted to RGB is not saved with its old colour space's ICC profile."""
+    paths = []
+    for mode in ('CMYK', 'RGB'):
+        path = str(tmp_path / f"{mode.lower()}.jpg")
+        Image.fromarray(watermarked_frame).convert(mode).save(path, icc_profile=f'{mode} profile'.encode())
+        paths.append(path)
+
+    result = remove_image_watermarks(paths, regions=[{'x': 120, 'y': 10, 'width': 30, 'height': 10}],
+                                     output_dir=str(tmp_path / 'out'))
+
+    cmyk, rgb = (Image.open(item['output_path']) for item in result['images'])
+    with cmyk, rgb:
+        assert cmyk.mode == 'RGB' and 'icc_profile' not in cmyk.info
+        assert rgb.info['icc_profile'] == b'RGB profile'